@@ -0,0 +1,8 @@
+from django.urls import include, path
+from .urls import urlpatterns as wsgi_urlpatterns
+
+# ROOT_URLCONF for ASGI requests (LittleLemonAPI.middleware.ASGIURLConfMiddleware)
+urlpatterns = [
+    path('api/', include('LittleLemonAPI.async_urls')),
+    *wsgi_urlpatterns,
+]
@@ -0,0 +1,79 @@
+"""Database settings read from the environment.
+
+DATABASE_ENGINE          'sqlite' (default) or 'postgresql'
+DATABASE_NAME            file path for sqlite, database name for postgresql
+DATABASE_USER / DATABASE_PASSWORD / DATABASE_HOST / DATABASE_PORT
+DATABASE_CONN_MAX_AGE    seconds a connection is reused across requests (default 60)
+DATABASE_POOL_SIZE       postgresql only: size of a psycopg connection pool
+                         (needs Django 5.1+ and psycopg[pool]); 0 disables it
+SQLITE_JOURNAL_MODE      default 'wal', so readers never block the writer
+SQLITE_SYNCHRONOUS       default 'normal', safe with WAL and far fewer fsyncs
+SQLITE_BUSY_TIMEOUT      milliseconds a writer waits for the lock (default 5000)
+SQLITE_TRANSACTION_MODE  default 'IMMEDIATE': transactions take the write lock at BEGIN
+DATABASE_TEST_NAME       sqlite test database file (default littlelemon-test-<pid>.sqlite3
+                         in the temp directory, so runs on one host don't share it); a file,
+                         unlike Django's shared in-memory database, lets concurrent tests
+                         wait on busy_timeout
+"""
+import os
+import tempfile
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _env(name, default=None):
+    return os.environ.get(name, default)
+
+
+def _env_int(name, default):
+    value = _env(name, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImproperlyConfigured(f'{name} must be an integer, not {value!r}') from None
+
+
+def database_settings(base_dir):
+    engine = _env('DATABASE_ENGINE', 'sqlite')
+    conn_max_age = _env_int('DATABASE_CONN_MAX_AGE', 60)
+    if engine == 'sqlite':
+        return {
+            # Django 5.1 supports transaction_mode itself; before that LittleLemon.sqlite_backend adds it
+            'ENGINE': 'django.db.backends.sqlite3' if django.VERSION >= (5, 1) else 'LittleLemon.sqlite_backend',
+            'NAME': _env('DATABASE_NAME', base_dir / 'db.sqlite3'),
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': conn_max_age > 0,
+            'OPTIONS': {'transaction_mode': _env('SQLITE_TRANSACTION_MODE', 'IMMEDIATE')},
+            'TEST': {'NAME': _env('DATABASE_TEST_NAME', os.path.join(tempfile.gettempdir(), f'littlelemon-test-{os.getpid()}.sqlite3'))},
+        }
+    if engine not in ('postgresql', 'postgres'):
+        raise ImproperlyConfigured(f'DATABASE_ENGINE must be sqlite or postgresql, not {engine!r}')
+
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': _env('DATABASE_NAME', 'littlelemon'),
+        'USER': _env('DATABASE_USER', ''),
+        'PASSWORD': _env('DATABASE_PASSWORD', ''),
+        'HOST': _env('DATABASE_HOST', ''),
+        'PORT': _env('DATABASE_PORT', ''),
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_max_age > 0,
+        'OPTIONS': {},
+    }
+    pool_size = _env_int('DATABASE_POOL_SIZE', 0)
+    if pool_size:
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured('DATABASE_POOL_SIZE needs Django 5.1 or later; use DATABASE_CONN_MAX_AGE instead')
+        # the pool hands connections back after every request, so persistent connections are off
+        config['OPTIONS']['pool'] = {'min_size': 1, 'max_size': pool_size}
+        config['CONN_MAX_AGE'] = 0
+        config['CONN_HEALTH_CHECKS'] = False
+    return config
+
+
+def sqlite_pragmas():
+    return {
+        'journal_mode': _env('SQLITE_JOURNAL_MODE', 'wal'),
+        'synchronous': _env('SQLITE_SYNCHRONOUS', 'normal'),
+        'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT', 5000),
+    }
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
+from .database import database_settings, sqlite_pragmas
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.middleware.MetricsMiddleware',
+    'LittleLemonAPI.middleware.ASGIURLConfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +59,8 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'LittleLemon.urls'
+# requests served by asgi.py use this instead; it swaps in async views for the read endpoints
+ASGI_URLCONF = 'LittleLemon.asgi_urls'
 
 TEMPLATES = [
     {
@@ -78,13 +84,14 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# configured through DATABASE_* environment variables, see LittleLemon/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(BASE_DIR),
 }
 
+# PRAGMAs run on every new SQLite connection (SQLITE_* environment variables)
+SQLITE_PRAGMAS = sqlite_pragmas()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -127,14 +134,31 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-REST_FRAMEWORK = {
-    'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+# 'production' still serves the browsable API and XML, but imports them the first time
+# a client asks for text/html or application/xml
+API_PROFILE = os.environ.get('API_PROFILE', 'development')
+RENDERER_CLASSES = {
+    'development': [
+        'LittleLemonAPI.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
         'rest_framework_xml.renderers.XMLRenderer',
     ],
+    'production': [
+        'LittleLemonAPI.renderers.FastJSONRenderer',
+        'LittleLemonAPI.renderers.LazyBrowsableAPIRenderer',
+        'LittleLemonAPI.renderers.LazyXMLRenderer',
+    ],
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': RENDERER_CLASSES[API_PROFILE],
+    'DEFAULT_PARSER_CLASSES': [
+        'LittleLemonAPI.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_THROTTLE_RATES': {
@@ -153,3 +177,75 @@ REST_FRAMEWORK = {
 DJOSER = {
     "USER_ID_FIELD": "username",
 }
+
+# seconds a user's resolved groups are reused before hitting auth_user_groups again
+ROLE_CACHE_TTL = 60
+# most users whose groups are kept; the least recently seen are dropped first
+ROLE_CACHE_MAX_ENTRIES = 10000
+
+# token -> user snapshot reuse by CachedTokenAuthentication: seconds and most tokens kept
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_MAX_ENTRIES = 10000
+
+# how OrdersView.create picks a delivery crew member: 'random', 'round_robin',
+# 'least_outstanding' or a dotted path to a strategy class
+DISPATCH_STRATEGY = 'random'
+# seconds before the in-memory pending counts are reloaded; who is on the crew
+# is checked on every assignment
+DISPATCH_ROSTER_TTL = 300
+
+# serialized menu/category responses; BACKEND is 'lru' (entries per process, version in
+# the database, reread every VERSION_TTL seconds) or a CACHES alias shared by every worker
+MENU_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 256,
+    'VERSION_TTL': 1,
+}
+
+# serve menu, cart and order listings through the read-only values() serializers
+FAST_SERIALIZERS = False
+
+# rows fetched per database round trip by ?stream=1 / NDJSON listings
+STREAM_CHUNK_SIZE = 2000
+
+# seconds a COUNT(*) is reused by keyset pages requested with count=approx
+COUNT_CACHE_TTL = 60
+
+# fixed-window throttle counters shared by all workers: BACKEND 'sqlite' keeps them
+# in the PATH file (one host), any other value names a CACHES alias
+THROTTLE_STORE = {
+    'BACKEND': 'sqlite',
+    'PATH': BASE_DIR / 'throttle.sqlite3',
+}
+
+# outbox events (see LittleLemonAPI.events): attempts before an event is marked dead,
+# seconds before the first retry (doubling after each failure), and seconds a worker
+# holds a claimed batch before another worker may take it
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 5
+OUTBOX_LEASE = 300
+
+# POST /api/orders and /api/cart with an Idempotency-Key header: seconds a
+# response is replayed to retries, seconds a running request holds its key before a
+# retry may take over, and seconds a concurrent duplicate waits for it before a 409
+IDEMPOTENCY_KEY_TTL = 86400
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT = 10
+
+# most orders one POST /api/orders/queue may move to a new status
+CREW_STATUS_MAX_ORDERS = 500
+
+# most operations one batch POST /api/cart may apply
+CART_MAX_OPERATIONS = 100
+
+# longest date range /api/reports answers from the daily rollups
+REPORT_MAX_DAYS = 366
+
+# most ?search= matches returned, best first; responses say `truncated` when there were more
+SEARCH_MAX_RESULTS = 200
+
+# per-process request metrics; set METRICS_DIR when running several workers so
+# /api/metrics and `manage.py dumpmetrics` can merge every live worker's snapshot
+# (files left by workers that have exited are deleted when metrics are collected)
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 10
@@ -0,0 +1,23 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """The stock sqlite3 backend plus the OPTIONS['transaction_mode'] of Django 5.1.
+
+    With the default deferred BEGIN a transaction that reads before it writes
+    (checkout, add to cart) can't upgrade its lock once another connection
+    has written, and SQLite fails it with "database is locked" without
+    waiting out busy_timeout. BEGIN IMMEDIATE takes the write lock up front,
+    so concurrent writers queue instead.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute('BEGIN')
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -5,5 +5,13 @@ from . import models
 admin.site.register(models.Category)
 admin.site.register(models.MenuItems)
 admin.site.register(models.Cart)
+admin.site.register(models.CartSummary)
+admin.site.register(models.MenuVersion)
 admin.site.register(models.Order)
-admin.site.register(models.OrderItem)
\ No newline at end of file
+admin.site.register(models.OrderItem)
+admin.site.register(models.OutboxEvent)
+admin.site.register(models.IdempotencyKey)
+admin.site.register(models.DailySales)
+admin.site.register(models.DailyMenuItemSales)
+admin.site.register(models.DailyCategorySales)
+admin.site.register(models.DailyCrewDeliveries)
\ No newline at end of file
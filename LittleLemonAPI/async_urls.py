@@ -0,0 +1,16 @@
+from django.urls import path
+from . import async_views, urls
+
+# the API routes served under ASGI: the read-heavy endpoints get async views
+ASYNC_VIEWS = {
+    'category': async_views.CategoryView,
+    'menu-items': async_views.MenuItemsView,
+    'menu-items/<int:pk>': async_views.SingleItemView,
+    'orders': async_views.OrdersView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[str(pattern.pattern)].as_view())
+    if str(pattern.pattern) in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,172 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator
+from django.http import HttpResponse
+from rest_framework.exceptions import NotAcceptable, Throttled
+from rest_framework.request import Request
+from . import views
+from .authentication import CachedTokenAuthentication
+from .fast_serializers import CategoryFastSerializer, MenuItemFastSerializer, OrderFastSerializer
+from .filters import MenuItemFilter
+from .menu_cache import acached_response
+from .models import Category, MenuItems, Order
+from .pagination import CustomPagination
+from .roles import DELIVERY_CREW, MANAGER, aget_roles
+
+
+class AsyncReadView:
+    """GET answered on the event loop; everything else is the sync DRF view.
+
+    Only the common case runs here: a JSON response for an authenticated
+    user whose query string uses `async_params`. Anything else (other
+    methods, formats, search, cursors, streams, errors from authentication)
+    is handed to `sync_view_class` unchanged, so both paths return the
+    same responses.
+    """
+    sync_view_class = None
+    async_params = frozenset()
+
+    @classmethod
+    def as_view(cls):
+        sync_view = sync_to_async(cls.sync_view_class.as_view())
+        allow = ', '.join(cls.sync_view_class().allowed_methods)
+
+        async def view(request, *args, **kwargs):
+            self = cls()
+            user = await self.authenticate(request) if self.can_serve(request) and self.negotiate(request) else None
+            if user is None:
+                return await sync_view(request, *args, **kwargs)
+            request.user = user
+            throttled = await self.check_throttles(request)
+            response = throttled or await self.get(request, *args, **kwargs)
+            response['Allow'] = allow
+            response['Vary'] = 'Accept'
+            return response
+        view.csrf_exempt = True
+        view.view_class = cls
+        return view
+
+    def can_serve(self, request):
+        return request.method == 'GET' and set(request.GET) <= self.async_params
+
+    def negotiate(self, request):
+        # the sync view's own content negotiation, so both paths pick the same
+        # renderer and honour the same media type parameters (e.g. indent=4)
+        view_class = self.sync_view_class
+        try:
+            self.renderer, self.accepted_media_type = view_class.content_negotiation_class().select_renderer(
+                Request(request), [renderer() for renderer in view_class.renderer_classes])
+        except NotAcceptable:
+            return False
+        return self.renderer.format == 'json'
+
+    async def authenticate(self, request):
+        # the CachedTokenAuthentication/SessionAuthentication happy paths; failures take the sync path
+        header = request.headers.get('Authorization', '').split()
+        if header:
+            if len(header) != 2 or header[0].lower() != 'token':
+                return None
+            credentials = await CachedTokenAuthentication().aauthenticate_credentials(header[1])
+            user = credentials[0] if credentials is not None else None
+        else:
+            user = await request.auser()
+        return user if user is not None and user.is_active and user.is_authenticated else None
+
+    async def check_throttles(self, request):
+        drf_request = Request(request)
+        drf_request.user = request.user
+        waits = []
+        for throttle_class in self.sync_view_class.throttle_classes:
+            throttle = throttle_class()
+            if not await throttle.aallow_request(drf_request, self):
+                waits.append(throttle.wait())
+        if not waits:
+            return None
+        exc = Throttled(max(waits))
+        response = self.render({'detail': exc.detail}, status=exc.status_code)
+        response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    def render(self, data, status=200):
+        body = self.renderer.render(data, self.accepted_media_type, {})
+        return HttpResponse(body, content_type=self.renderer.media_type, status=status)
+
+    async def rows(self, queryset, fast_serializer_class):
+        # async for fetches the rows in one thread hop. Not aiterator(): on Django 5.0 it
+        # runs the query on the event loop for values_list() spanning a relation.
+        plan = fast_serializer_class.compile()[1]
+        return [fast_serializer_class._build(row, plan) async for row in fast_serializer_class.rows(queryset)]
+
+    async def paginate(self, request, queryset, fast_serializer_class):
+        # CustomPagination, with the COUNT and the page read through the async ORM
+        pagination = CustomPagination()
+        pagination.request = Request(request)
+        paginator = Paginator(queryset, pagination.get_page_size(pagination.request))
+        paginator.count = await queryset.acount()
+        page_number = request.GET.get(pagination.page_query_param, 1)
+        if page_number in pagination.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            pagination.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            detail = pagination.invalid_page_message.format(page_number=page_number, message=str(exc))
+            return {'detail': detail}, 404
+        return {
+            'count': paginator.count,
+            'next': pagination.get_next_link(),
+            'previous': pagination.get_previous_link(),
+            'results': await self.rows(pagination.page.object_list, fast_serializer_class),
+        }, 200
+
+
+class CategoryView(AsyncReadView):
+    sync_view_class = views.CategoryView
+    async_params = frozenset({'page', 'perpage'})
+
+    async def get(self, request):
+        return await acached_response(request, self.render, self.list)
+
+    async def list(self, request):
+        return await self.paginate(request, Category.objects.all(), CategoryFastSerializer)
+
+
+class MenuItemsView(AsyncReadView):
+    sync_view_class = views.MenuItemsView
+    async_params = frozenset({'page', 'perpage', 'price', 'price__lt', 'price__gt', 'featured'})
+
+    async def get(self, request):
+        return await acached_response(request, self.render, self.list)
+
+    async def list(self, request):
+        filterset = MenuItemFilter(request.GET, queryset=MenuItems.objects.all(), request=request)
+        if not filterset.is_valid():
+            return {field: list(errors) for field, errors in filterset.errors.items()}, 400
+        return await self.paginate(request, filterset.qs, MenuItemFastSerializer)
+
+
+class SingleItemView(AsyncReadView):
+    sync_view_class = views.SingleItemView
+
+    async def get(self, request, pk):
+        return await acached_response(request, self.render, self.retrieve, pk)
+
+    async def retrieve(self, request, pk):
+        items = await self.rows(MenuItems.objects.filter(pk=pk), MenuItemFastSerializer)
+        if not items:
+            return {'detail': 'No MenuItems matches the given query.'}, 404
+        return items[0], 200
+
+
+class OrdersView(AsyncReadView):
+    sync_view_class = views.OrdersView
+    async_params = frozenset({'page', 'perpage'})
+
+    async def get(self, request):
+        roles = await aget_roles(request.user)
+        if MANAGER in roles:
+            data, status = await self.paginate(request, Order.objects.all(), OrderFastSerializer)
+            return self.render(data, status)
+        if DELIVERY_CREW in roles:
+            orders = Order.objects.filter(delivery_crew=request.user)
+        else:
+            orders = Order.objects.filter(user=request.user)
+        return self.render(await self.rows(orders.order_by('-date', '-id'), OrderFastSerializer))
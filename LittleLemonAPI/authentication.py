@@ -0,0 +1,138 @@
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from . import roles
+from .menu_cache import LRUCache
+from .metrics import registry
+
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields]
+TOKEN_FIELDS = [field.attname for field in Token._meta.concrete_fields]
+USER_ID = USER_FIELDS.index(User._meta.pk.attname)
+
+
+class TokenCache(LRUCache):
+    """token key -> (expiry, user field values, token created, roles), indexed by user id.
+
+    Every user save drops that user's tokens; the index makes that a lookup
+    instead of a scan of the whole cache.
+    """
+
+    def __init__(self, max_entries):
+        super().__init__(max_entries)
+        self.by_user = {}
+
+    def _unindex(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        user_id = entry[1][USER_ID]
+        keys = self.by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_user[user_id]
+
+    def set(self, key, value):
+        with self.lock:
+            self._unindex(key)
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.by_user.setdefault(value[1][USER_ID], set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._unindex(next(iter(self.entries)))
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            self._unindex(key)
+            return self.entries.pop(key, default)
+
+    def pop_user(self, user_id):
+        with self.lock:
+            for key in self.by_user.pop(user_id, ()):
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_user.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenCache(getattr(settings, 'TOKEN_CACHE_MAX_ENTRIES', 10000))
+    return _cache
+
+
+def _lookup(key):
+    entry = get_token_cache().get(key)
+    if entry is None or entry[0] <= time.monotonic():
+        registry.inc('littlelemon_token_cache_requests_total', result='miss')
+        return None
+    _, values, created, user_roles = entry
+    # fresh instances per request, so nothing one request sets on request.user leaks into another
+    user = User.from_db('default', USER_FIELDS, values)
+    token = Token.from_db('default', TOKEN_FIELDS, [key, user.pk, created])
+    token.user = user
+    # a miss runs the token query, and the groups query too unless the role cache has them
+    saved = 1 if roles._cached(user) is not None else 2
+    user._roles = user_roles
+    registry.inc('littlelemon_token_cache_requests_total', result='hit')
+    registry.inc('littlelemon_token_cache_saved_queries_total', saved)
+    return user, token
+
+
+def _remember(token, user_roles):
+    ttl = getattr(settings, 'TOKEN_CACHE_TTL', 60)
+    values = [getattr(token.user, name) for name in USER_FIELDS]
+    get_token_cache().set(token.key, (time.monotonic() + ttl, values, token.created, user_roles))
+
+
+def invalidate_token(key):
+    get_token_cache().pop(key)
+
+
+def invalidate_user(user_id=None):
+    # drop every cached token of one user (or of everyone)
+    if user_id is None:
+        get_token_cache().clear()
+    else:
+        get_token_cache().pop_user(user_id)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that remembers token -> user (and the user's roles) for TOKEN_CACHE_TTL.
+
+    Logging out, deleting a token, saving a user or changing their groups
+    drops the entries in this process (see signals.py); other workers see
+    the change once their entry expires.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = _lookup(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        _remember(token, roles.get_roles(user))
+        return user, token
+
+    async def aauthenticate_credentials(self, key):
+        # for the async views: (user, token), or None where the sync class would raise
+        cached = _lookup(key)
+        if cached is not None:
+            return cached
+        token = await Token.objects.select_related('user').filter(key=key).afirst()
+        if token is None or not token.user.is_active:
+            return None
+        _remember(token, await roles.aget_roles(token.user))
+        return token.user, token
@@ -0,0 +1,149 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from .models import Cart, CartSummary
+
+_price_field = Cart._meta.get_field('price')
+
+
+def add_to_cart(user, menuitem_id, quantity, unit_price):
+    # a single conditional UPDATE; concurrent adds to the same line can't lose increments.
+    # A line keeps the unit price it was first added at, so the summary delta is exact.
+    line = Cart.objects.filter(user=user, menuitem_id=menuitem_id)
+    increment = {
+        'quantity': F('quantity') + quantity,
+        'price': ExpressionWrapper(
+            (F('quantity') + quantity) * F('unit_price'),
+            output_field=DecimalField(max_digits=_price_field.max_digits, decimal_places=_price_field.decimal_places),
+        ),
+    }
+    with transaction.atomic():
+        created = False
+        if not line.update(**increment):
+            try:
+                with transaction.atomic():
+                    Cart.objects.create(
+                        user=user,
+                        menuitem_id=menuitem_id,
+                        quantity=quantity,
+                        unit_price=unit_price,
+                        price=quantity * unit_price
+                    )
+                created = True
+            except IntegrityError:
+                # another request inserted the line first (unique_together user/menuitem)
+                line.update(**increment)
+        cart_item = line.get()
+        update_cart_summary(user, quantity * cart_item.unit_price, int(created))
+        return cart_item, created
+
+
+def compute_cart_summary(user):
+    return Cart.objects.filter(user=user).aggregate(total=Sum('price', default=Decimal(0)), lines=Count('pk'))
+
+
+def get_cart_summary(user):
+    summary = CartSummary.objects.filter(user=user).first()
+    if summary is None:
+        # carts filled before summaries existed start from the real rows
+        summary, _ = CartSummary.objects.get_or_create(user=user, defaults=compute_cart_summary(user))
+    return summary
+
+
+def update_cart_summary(user, total_delta, lines_delta):
+    updated = CartSummary.objects.filter(user=user).update(
+        total=F('total') + total_delta,
+        lines=F('lines') + lines_delta,
+    )
+    if not updated:
+        get_cart_summary(user)
+
+
+def rebuild_cart_summary(user):
+    # rewrite a summary that disagreed with the cart lines
+    CartSummary.objects.update_or_create(user=user, defaults=compute_cart_summary(user))
+
+
+def clear_cart_summary(user):
+    CartSummary.objects.filter(user=user).update(total=0, lines=0)
+
+
+CART_OPERATIONS = ('add', 'set', 'remove')
+
+
+def parse_cart_operations(data, prices):
+    """Validate a batch of {menuitem, quantity, op} dicts; returns (operations, errors)."""
+    operations, errors = [], {}
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            errors[index] = 'Each operation must be an object'
+            continue
+        op = item.get('op', 'add')
+        if op not in CART_OPERATIONS:
+            errors[index] = f'op must be one of {", ".join(CART_OPERATIONS)}'
+            continue
+        try:
+            menuitem_id = int(item.get('menuitem'))
+        except (TypeError, ValueError):
+            errors[index] = 'Menu item is required'
+            continue
+        if menuitem_id not in prices:
+            errors[index] = 'The menu item you are looking for does not exist'
+            continue
+        quantity = 0
+        if op != 'remove':
+            try:
+                quantity = int(item.get('quantity', 1))
+            except (TypeError, ValueError):
+                errors[index] = 'Quantity must be a number'
+                continue
+            if quantity < (1 if op == 'add' else 0):
+                errors[index] = 'Must be at least 1 item to add to cart' if op == 'add' else 'Quantity cannot be negative'
+                continue
+        operations.append((op, menuitem_id, quantity))
+    return operations, errors
+
+
+def apply_cart_operations(user, operations, prices):
+    # one read of the affected lines, then at most one bulk insert, update and delete
+    menuitem_ids = {menuitem_id for _, menuitem_id, _ in operations}
+    with transaction.atomic():
+        existing = {
+            line.menuitem_id: line
+            for line in Cart.objects.select_for_update().filter(user=user, menuitem_id__in=menuitem_ids)
+        }
+        quantities = {menuitem_id: line.quantity for menuitem_id, line in existing.items()}
+        for op, menuitem_id, quantity in operations:
+            if op == 'add':
+                quantities[menuitem_id] = quantities.get(menuitem_id, 0) + quantity
+            else:
+                quantities[menuitem_id] = quantity
+
+        to_create, to_update, to_delete = [], [], []
+        total_delta = Decimal(0)
+        for menuitem_id, quantity in quantities.items():
+            line = existing.get(menuitem_id)
+            if line is not None:
+                total_delta -= line.price
+            if quantity <= 0:
+                if line is not None:
+                    to_delete.append(line.pk)
+                continue
+            if line is None:
+                unit_price = prices[menuitem_id]
+                to_create.append(Cart(user=user, menuitem_id=menuitem_id, quantity=quantity,
+                                      unit_price=unit_price, price=quantity * unit_price))
+                total_delta += quantity * unit_price
+                continue
+            total_delta += quantity * line.unit_price
+            if line.quantity != quantity:
+                line.quantity, line.price = quantity, quantity * line.unit_price
+                to_update.append(line)
+
+        if to_create:
+            Cart.objects.bulk_create(to_create)
+        if to_update:
+            Cart.objects.bulk_update(to_update, ['quantity', 'price'])
+        if to_delete:
+            Cart.objects.filter(pk__in=to_delete).delete()
+        update_cart_summary(user, total_delta, len(to_create) - len(to_delete))
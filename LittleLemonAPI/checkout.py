@@ -0,0 +1,59 @@
+from django.db import transaction
+from .cart import rebuild_cart_summary, update_cart_summary
+from .events import emit
+from .metrics import registry
+from .models import Cart, CartSummary, Order, OrderItem
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def checkout(user, assign_delivery_crew):
+    # cart read, order insert, line items insert and cart delete all commit together
+    with transaction.atomic():
+        # the lines stay locked until commit, so a concurrent checkout can't order them a second time
+        cart_items = list(Cart.objects.select_for_update(of=('self',)).filter(user=user).select_related('menuitem'))
+        if not cart_items:
+            raise CheckoutError('Cart is empty')
+        # the order total is the running cart summary, locked after the lines as cart
+        # writes do; checked against the lines so a summary that has drifted (or a
+        # line added since the read above) can't leak into the order
+        summary = CartSummary.objects.select_for_update().filter(user=user).first()
+        total = sum(item.price for item in cart_items)
+        in_sync = summary is not None and (summary.total, summary.lines) == (total, len(cart_items))
+        if in_sync:
+            total = summary.total
+        else:
+            registry.inc('littlelemon_cart_summary_drift_total')
+
+        delivery_crew_id = assign_delivery_crew()
+        if delivery_crew_id is None:
+            raise CheckoutError('No delivery crew available')
+
+        order = Order.objects.create(
+            user=user,
+            status=0,
+            delivery_crew_id=delivery_crew_id,
+            total=total
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                menuitem=item.menuitem,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                price=item.price
+            )
+            for item in cart_items
+        ])
+        # only the lines ordered here; one added by a concurrent request stays in the cart
+        Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        if in_sync:
+            update_cart_summary(user, -total, -len(cart_items))
+        else:
+            rebuild_cart_summary(user)
+        # side effects subscribe to this and run in the outbox worker, after the response
+        emit('order_created', order_id=order.pk, user_id=user.pk, delivery_crew_id=delivery_crew_id,
+             total=str(order.total), lines=len(cart_items))
+    return order
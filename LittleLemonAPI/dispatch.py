@@ -0,0 +1,195 @@
+import random
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.utils.module_loading import import_string
+from .models import Order
+from .roles import DELIVERY_CREW
+
+
+class CrewRoster:
+    """In-memory delivery crew roster with per-crew pending order counts.
+
+    Crew members are bucketed by their number of pending orders so the least
+    loaded member is found without scanning the roster, and every update is a
+    constant amount of dict work.
+    """
+
+    def __init__(self):
+        self.members = []   # crew ids in join order, for round robin / random
+        self.load = {}      # crew id -> pending orders
+        self.buckets = {}   # pending orders -> {crew id: None}, insertion ordered
+        self.min_load = 0
+
+    def add(self, crew_id, load=0):
+        if crew_id in self.load:
+            return
+        self.members.append(crew_id)
+        self.load[crew_id] = load
+        self.buckets.setdefault(load, {})[crew_id] = None
+        if len(self.members) == 1 or load < self.min_load:
+            self.min_load = load
+
+    def remove(self, crew_id):
+        load = self.load.pop(crew_id, None)
+        if load is None:
+            return
+        self.members.remove(crew_id)
+        self._unbucket(crew_id, load)
+        if load == self.min_load and load not in self.buckets:
+            self.min_load = min(self.buckets, default=0)
+
+    def adjust(self, crew_id, delta):
+        load = self.load.get(crew_id)
+        if load is None:
+            return
+        new_load = max(load + delta, 0)
+        self._unbucket(crew_id, load)
+        self.load[crew_id] = new_load
+        self.buckets.setdefault(new_load, {})[crew_id] = None
+        if new_load < self.min_load:
+            self.min_load = new_load
+        elif load == self.min_load and load not in self.buckets:
+            self.min_load = new_load
+
+    def least_loaded(self):
+        bucket = self.buckets.get(self.min_load)
+        return next(iter(bucket)) if bucket else None
+
+    def _unbucket(self, crew_id, load):
+        bucket = self.buckets[load]
+        del bucket[crew_id]
+        if not bucket:
+            del self.buckets[load]
+
+
+class RandomStrategy:
+    def choose(self, roster):
+        return random.choice(roster.members) if roster.members else None
+
+
+class RoundRobinStrategy:
+    def __init__(self):
+        self.position = -1
+
+    def choose(self, roster):
+        if not roster.members:
+            return None
+        self.position = (self.position + 1) % len(roster.members)
+        return roster.members[self.position]
+
+
+class LeastOutstandingStrategy:
+    def choose(self, roster):
+        return roster.least_loaded()
+
+
+STRATEGIES = {
+    'random': RandomStrategy,
+    'round_robin': RoundRobinStrategy,
+    'least_outstanding': LeastOutstandingStrategy,
+}
+
+
+class Dispatcher:
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.roster = None
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def assign(self):
+        with self.lock:
+            return self.strategy.choose(self._get_roster())
+
+    def order_assigned(self, crew_id):
+        self._adjust(crew_id, 1)
+
+    def order_released(self, crew_id):
+        self._adjust(crew_id, -1)
+
+    def crew_added(self, crew_id):
+        # also called for any user who was saved active, so it checks the group itself
+        with self.lock:
+            if self.roster is None or crew_id in self.roster.load:
+                return
+            if _active_crew().filter(pk=crew_id).exists():
+                self.roster.add(crew_id, _pending_counts([crew_id]).get(crew_id, 0))
+
+    def crew_removed(self, crew_id):
+        with self.lock:
+            if self.roster is not None:
+                self.roster.remove(crew_id)
+
+    def reset(self):
+        with self.lock:
+            self.roster = None
+
+    def _adjust(self, crew_id, delta):
+        if crew_id is None:
+            return
+        with self.lock:
+            if self.roster is not None:
+                self.roster.adjust(crew_id, delta)
+
+    def _get_roster(self):
+        # other worker processes change the counts too, so resync now and then
+        ttl = getattr(settings, 'DISPATCH_ROSTER_TTL', 300)
+        if self.roster is None or time.monotonic() - self.loaded_at > ttl:
+            self.roster = self._load_roster()
+            self.loaded_at = time.monotonic()
+        else:
+            self._sync_members()
+        return self.roster
+
+    def _load_roster(self):
+        roster = CrewRoster()
+        crew_ids = _active_crew().order_by('pk').values_list('pk', flat=True)
+        pending = _pending_counts()
+        for crew_id in crew_ids:
+            roster.add(crew_id, pending.get(crew_id, 0))
+        return roster
+
+    def _sync_members(self):
+        # group and is_active changes made in other processes send no signal here,
+        # so every assignment checks who is on the crew; one indexed query
+        crew_ids = set(_active_crew().values_list('pk', flat=True))
+        for crew_id in [crew_id for crew_id in self.roster.members if crew_id not in crew_ids]:
+            self.roster.remove(crew_id)
+        joined = sorted(crew_ids.difference(self.roster.load))
+        if joined:
+            pending = _pending_counts(joined)
+            for crew_id in joined:
+                self.roster.add(crew_id, pending.get(crew_id, 0))
+
+
+def _active_crew():
+    return User.objects.filter(groups__name=DELIVERY_CREW, is_active=True)
+
+
+def _pending_counts(crew_ids=None):
+    # crew id -> pending orders, for `crew_ids` or the whole crew
+    orders = Order.objects.filter(status__eq=False, delivery_crew__isnull=False)
+    if crew_ids is not None:
+        orders = orders.filter(delivery_crew__in=crew_ids)
+    return dict(orders.values_list('delivery_crew').annotate(count=Count('pk')).order_by())
+
+
+def get_strategy(name):
+    strategy_class = STRATEGIES.get(name) or import_string(name)
+    return strategy_class()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher(get_strategy(getattr(settings, 'DISPATCH_STRATEGY', 'random')))
+    return _dispatcher
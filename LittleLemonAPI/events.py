@@ -0,0 +1,154 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+from .metrics import registry
+from .models import OutboxEvent
+
+_subscribers = {}   # event name -> {handler name: handler}
+
+
+def handler_name(handler):
+    return f'{handler.__module__}.{handler.__qualname__}'
+
+
+def subscribe(name, handler=None):
+    """Run `handler(payload)` in the outbox worker for every `name` event; also a decorator.
+
+    Subscribe at import time of a module the app loads (e.g. from ready()),
+    so the worker process knows the same handlers as the web processes.
+    """
+    if handler is None:
+        return lambda handler: subscribe(name, handler)
+    _subscribers.setdefault(name, {})[handler_name(handler)] = handler
+    return handler
+
+
+def unsubscribe(name, handler):
+    _subscribers.get(name, {}).pop(handler_name(handler), None)
+
+
+def subscribers(name):
+    return _subscribers.get(name, {})
+
+
+def emit(name, **payload):
+    """Queue an event; it is written in the caller's transaction and handled by the worker.
+
+    The request only pays for one INSERT, however many handlers subscribe.
+    """
+    event = OutboxEvent.objects.create(name=name, payload=payload, available_at=timezone.now())
+    transaction.on_commit(lambda: registry.inc('littlelemon_outbox_emitted_total', event=name))
+    return event
+
+
+def emit_many(name, payloads):
+    """emit() for a batch of events of one kind, written with a single INSERT."""
+    now = timezone.now()
+    events = OutboxEvent.objects.bulk_create(OutboxEvent(name=name, payload=payload, available_at=now) for payload in payloads)
+    if events:
+        transaction.on_commit(lambda: registry.inc('littlelemon_outbox_emitted_total', len(events), event=name))
+    return events
+
+
+def retry_delay(attempts):
+    # OUTBOX_RETRY_DELAY, doubled for every failed attempt, at most an hour
+    return min(getattr(settings, 'OUTBOX_RETRY_DELAY', 5) * 2 ** (attempts - 1), 3600)
+
+
+class OutboxWorker:
+    """Claims batches of due events and runs their handlers on a thread pool.
+
+    A claim pushes the events' available_at forward by OUTBOX_LEASE, so a
+    worker that dies mid-batch only delays them. A failed event keeps the
+    handlers that succeeded in `handled` and is retried with backoff for the
+    rest; after OUTBOX_MAX_ATTEMPTS it is marked dead.
+    """
+
+    def __init__(self, batch_size=100, threads=4):
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='outbox')
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            due = OutboxEvent.objects.filter(dead__eq=False, available_at__lte=now).order_by('available_at', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                # several workers on postgresql; sqlite serializes them with the IMMEDIATE transaction
+                due = due.select_for_update(skip_locked=True)
+            events = list(due[:self.batch_size])
+            lease = now + timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 300))
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(available_at=lease)
+        return events
+
+    def handle(self, event):
+        error = None
+        try:
+            for name, handler in subscribers(event.name).items():
+                if name in event.handled:
+                    continue
+                start = time.perf_counter()
+                try:
+                    handler(event.payload)
+                except Exception:
+                    error = traceback.format_exc()
+                else:
+                    event.handled.append(name)
+                registry.observe('littlelemon_outbox_handler_duration_seconds', time.perf_counter() - start, handler=name)
+        finally:
+            # handlers run outside a request, so nothing else recycles this thread's connection
+            close_old_connections()
+        return event, error
+
+    def record(self, results):
+        now = timezone.now()
+        done, failed = [], []
+        max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+        for event, error in results:
+            if error is None:
+                done.append(event.pk)
+                registry.inc('littlelemon_outbox_events_total', event=event.name, outcome='done')
+                continue
+            event.attempts += 1
+            event.last_error = error
+            event.dead = event.attempts >= max_attempts
+            event.available_at = now + timedelta(seconds=retry_delay(event.attempts))
+            failed.append(event)
+            registry.inc('littlelemon_outbox_events_total', event=event.name, outcome='dead' if event.dead else 'retry')
+        with transaction.atomic():
+            OutboxEvent.objects.filter(pk__in=done).delete()
+            OutboxEvent.objects.bulk_update(failed, ['attempts', 'handled', 'last_error', 'dead', 'available_at'])
+
+    def drain_batch(self):
+        """Handle one batch; returns how many events it claimed."""
+        events = self.claim()
+        if events:
+            self.record(list(self.executor.map(self.handle, events)))
+        self.update_gauges(full=len(events) == self.batch_size)
+        return len(events)
+
+    def update_gauges(self, full):
+        # backpressure: how much is waiting, how old the oldest is, and whether batches come back full
+        pending = OutboxEvent.objects.filter(dead__eq=False)
+        oldest = pending.aggregate(oldest=Min('created'))['oldest']
+        registry.set('littlelemon_outbox_pending', pending.count())
+        registry.set('littlelemon_outbox_dead', OutboxEvent.objects.filter(dead__eq=True).count())
+        registry.set('littlelemon_outbox_lag_seconds', (timezone.now() - oldest).total_seconds() if oldest else 0.0)
+        registry.set('littlelemon_outbox_saturated', int(full))
+        registry.maybe_flush()
+
+    def run(self, poll_interval=1.0, once=False):
+        """Drain until the outbox is empty, then poll every `poll_interval` seconds (or stop if `once`)."""
+        try:
+            while True:
+                if self.drain_batch():
+                    continue
+                if once:
+                    return
+                time.sleep(poll_interval)
+        finally:
+            self.executor.shutdown()
@@ -0,0 +1,57 @@
+import re
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.utils import timezone
+from .models import Cart, CartSummary, Category, IdempotencyKey, MenuItems, Order, OrderItem, OutboxEvent
+from .roles import DELIVERY_CREW
+
+# (name, queryset factory, full scan expected) for the queries behind each view;
+# ids only need to be plausible, EXPLAIN never reads the rows
+QUERIES = [
+    ('menu-items', lambda: MenuItems.objects.all(), True),
+    ('menu-items filter', lambda: MenuItems.objects.filter(featured=True, price__lt=20), False),
+    ('menu-items cursor', lambda: MenuItems.objects.filter(price__gt=10).order_by('price', 'id')[:4], False),
+    ('menu-item', lambda: MenuItems.objects.select_related('category').filter(pk=1), False),
+    ('category', lambda: Category.objects.all(), True),
+    ('cart', lambda: Cart.objects.filter(user_id=1), False),
+    ('cart summary', lambda: CartSummary.objects.filter(user_id=1), False),
+    ('orders customer', lambda: Order.objects.filter(user_id=1).order_by('-date', '-id'), False),
+    ('orders crew', lambda: Order.objects.filter(delivery_crew_id=1).order_by('-date', '-id'), False),
+    ('orders crew pending', lambda: Order.objects.filter(delivery_crew_id=1, status__eq=False).order_by('-date', '-id'), False),
+    ('crew queue', lambda: Order.objects.filter(delivery_crew_id=1, status__eq=False).order_by('date', 'id')[:4], False),
+    ('orders status', lambda: Order.objects.filter(status__eq=False).order_by('-date', '-id')[:4], False),
+    ('orders cursor', lambda: Order.objects.order_by('-date', '-id')[:4], False),
+    ('order items', lambda: OrderItem.objects.filter(order_id=1), False),
+    ('group members', lambda: User.objects.filter(groups__name=DELIVERY_CREW), False),
+    ('dispatch pending', lambda: (
+        Order.objects.filter(status__eq=False, delivery_crew__isnull=False)
+        .values_list('delivery_crew').annotate(count=Count('pk')).order_by()
+    ), False),
+    ('idempotency key', lambda: IdempotencyKey.objects.filter(user_id=1, key='key'), False),
+    ('idempotency expired', lambda: IdempotencyKey.objects.filter(expires_at__lt=timezone.now()), False),
+    ('outbox due', lambda: (
+        OutboxEvent.objects.filter(dead__eq=False, available_at__lte=timezone.now()).order_by('available_at', 'id')[:100]
+    ), False),
+]
+
+# SQLite "SCAN t" without an index, PostgreSQL "Seq Scan on t"
+FULL_SCAN = re.compile(r'\bSCAN (?!.*\bUSING\b.*\bINDEX\b)|\bSeq Scan on\b')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+def explain_queries():
+    """EXPLAIN every query in QUERIES; returns {name: {'plan', 'full_scan', 'temp_sort', 'expected'}}."""
+    report = {}
+    for name, build, expected in QUERIES:
+        plan = build().explain()
+        report[name] = {
+            'plan': plan.splitlines(),
+            'full_scan': bool(FULL_SCAN.search(plan)),
+            'temp_sort': bool(TEMP_SORT.search(plan)),
+            'expected': expected,
+        }
+    return report
+
+
+def flagged(report):
+    return [name for name, row in report.items() if (row['full_scan'] or row['temp_sort']) and not row['expected']]
@@ -0,0 +1,127 @@
+from django.conf import settings
+from rest_framework import fields as drf_fields
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from .metrics import serializer_timer
+from .renderers import FastJSONRenderer
+from .serializers import CartSerializer, CategorySerializer, MenuItemSerializer, OrderSerializer
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_to_string(value):
+    # the ORM already quantizes DecimalField values to decimal_places
+    return format(value, 'f')
+
+
+def _compile_field(field):
+    if isinstance(field, (RelatedField, drf_fields.IntegerField, drf_fields.CharField, drf_fields.BooleanField)):
+        return _identity
+    if (isinstance(field, drf_fields.DecimalField)
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            and not field.localize and not getattr(field, 'normalize_output', False)):
+        return _decimal_to_string
+    return field.to_representation
+
+
+class FastSerializer:
+    """Read-only serializer working on values_list() rows.
+
+    Field converters are compiled once from `serializer_class` so the output
+    matches it exactly; `nested` maps a field to the FastSerializer used for it,
+    which is read through a join in the same query.
+    """
+    serializer_class = None
+    nested = {}
+    _compiled = None
+
+    @classmethod
+    def compile(cls):
+        if cls.__dict__.get('_compiled') is None:
+            columns, plan = [], []
+            for field in cls.serializer_class().fields.values():
+                if field.write_only:
+                    continue
+                nested = cls.nested.get(field.field_name)
+                if nested is not None:
+                    nested_columns, nested_plan = nested.compile()
+                    plan.append((field.field_name, len(columns), nested_plan))
+                    columns.extend(f'{field.source}__{column}' for column in nested_columns)
+                else:
+                    plan.append((field.field_name, len(columns), _compile_field(field)))
+                    columns.append(field.source)
+            cls._compiled = (columns, plan)
+        return cls._compiled
+
+    @classmethod
+    def columns(cls):
+        return cls.compile()[0]
+
+    @classmethod
+    def _build(cls, row, plan, offset=0):
+        rep = {}
+        for name, index, convert in plan:
+            if isinstance(convert, list):
+                rep[name] = cls._build(row, convert, offset + index)
+                continue
+            value = row[offset + index]
+            rep[name] = None if value is None else convert(value)
+        return rep
+
+    @classmethod
+    def from_rows(cls, rows):
+        plan = cls.compile()[1]
+        with serializer_timer():
+            return [cls._build(row, plan) for row in rows]
+
+    @classmethod
+    def iterate(cls, rows):
+        plan = cls.compile()[1]
+        for row in rows:
+            yield cls._build(row, plan)
+
+    @classmethod
+    def rows(cls, queryset):
+        return queryset.values_list(*cls.columns())
+
+    @classmethod
+    def serialize(cls, queryset):
+        return cls.from_rows(cls.rows(queryset))
+
+    @classmethod
+    def dumps(cls, queryset):
+        return FastJSONRenderer().render(cls.serialize(queryset))
+
+
+class CategoryFastSerializer(FastSerializer):
+    serializer_class = CategorySerializer
+
+
+class MenuItemFastSerializer(FastSerializer):
+    serializer_class = MenuItemSerializer
+    nested = {'category': CategoryFastSerializer}
+
+
+class CartFastSerializer(FastSerializer):
+    serializer_class = CartSerializer
+
+
+class OrderFastSerializer(FastSerializer):
+    serializer_class = OrderSerializer
+
+
+class FastListMixin:
+    fast_serializer_class = None
+
+    def use_fast_serializer(self):
+        return self.fast_serializer_class is not None and getattr(settings, 'FAST_SERIALIZERS', False)
+
+    def fast_list(self, queryset):
+        rows = self.fast_serializer_class.rows(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer_class.from_rows(page))
+        return Response(self.fast_serializer_class.from_rows(rows))
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+from datetime import timedelta
+from django.conf import settings
+from django.http import HttpResponse
+from django.http.request import RawPostDataException
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .metrics import registry
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+# wakes duplicates waiting in this process as soon as a key is stored or released;
+# duplicates in other processes find out on their next poll
+_finished = threading.Condition()
+
+
+def fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    try:
+        digest.update(request._request.body)
+    except RawPostDataException:
+        # multipart bodies are consumed by the CSRF check before the view runs
+        digest.update(repr(sorted(request.data.lists())).encode())
+    return digest.hexdigest()
+
+
+def replay(record):
+    response = HttpResponse(bytes(record.body), status=record.status_code, content_type=record.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(user, key, digest):
+    """Take `key` for this request, or wait for the request that holds it.
+
+    Returns (record, None) when the caller should run the view and then
+    `store` or `release` the record, or (None, response) to answer with:
+    the stored response, 409 while the other request is still running
+    after IDEMPOTENCY_WAIT seconds, or 422 if the key came with another body.
+    """
+    lease = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    started = time.monotonic()
+    deadline = started + getattr(settings, 'IDEMPOTENCY_WAIT', 10)
+    delay, waited = 0.01, False
+    while True:
+        now = timezone.now()
+        record = next(iter(IdempotencyKey.objects.filter(user_id=user.pk, key=key)[:1]), None)
+        if record is None:
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(user_id=user.pk, key=key, fingerprint=digest, expires_at=now + lease), None
+            except IntegrityError:
+                continue    # a duplicate inserted it first
+        if record.expires_at <= now:
+            # past its replay window, or held by a request that died: take it over
+            taken = IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).update(
+                fingerprint=digest, status_code=None, content_type='', body=b'', expires_at=now + lease,
+            )
+            if taken:
+                record.fingerprint, record.status_code = digest, None
+                return record, None
+            continue
+        if record.fingerprint != digest:
+            registry.inc('littlelemon_idempotency_requests_total', outcome='mismatch')
+            return None, Response({'detail': 'This Idempotency-Key was used for a different request'},
+                                  status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status_code is not None:
+            registry.inc('littlelemon_idempotency_requests_total', outcome='replayed')
+            if waited:
+                registry.observe('littlelemon_idempotency_wait_seconds', time.monotonic() - started)
+            return None, replay(record)
+        if time.monotonic() >= deadline:
+            registry.inc('littlelemon_idempotency_requests_total', outcome='conflict')
+            return None, Response({'detail': 'A request with this Idempotency-Key is still being processed'},
+                                  status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        with _finished:
+            _finished.wait(min(delay, max(deadline - time.monotonic(), 0)))
+        delay, waited = min(delay * 2, 0.25), True
+
+
+def store(record, response):
+    response.render()
+    expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status_code=response.status_code, content_type=response.get('Content-Type', ''),
+        body=response.content, expires_at=expires_at,
+    )
+    registry.inc('littlelemon_idempotency_requests_total', outcome='stored')
+    transaction.on_commit(_notify)
+
+
+def release(record):
+    # the request failed; the next retry runs the view again
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+    registry.inc('littlelemon_idempotency_requests_total', outcome='released')
+    _notify()
+
+
+def _notify():
+    with _finished:
+        _finished.notify_all()
+
+
+def purge_expired():
+    return IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()[0]
+
+
+def idempotent(create):
+    """Run a view's create() at most once per user and Idempotency-Key header.
+
+    A retry with the same key and body gets the first response back, read
+    from IdempotencyKey in a single query; a retry that arrives while the
+    first is still running waits for it. The response is stored in the
+    transaction that runs the view, so it commits together with the
+    order or cart change it describes. 5xx responses and exceptions are
+    not stored. Requests without the header are left alone.
+    """
+    @wraps(create)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return create(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        record, response = claim(request.user, key, fingerprint(request))
+        if response is not None:
+            return response
+        try:
+            with transaction.atomic():
+                response = create(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    # rendered here, with the negotiated renderer, so the stored bytes are what the client got
+                    response = self.finalize_response(request, response, *args, **kwargs)
+                    store(record, response)
+        except BaseException:
+            release(record)
+            raise
+        if response.status_code >= 500:
+            release(record)
+        return response
+    return wrapper
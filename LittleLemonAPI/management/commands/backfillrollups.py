@@ -0,0 +1,15 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups behind /api/reports from the order tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='first order date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='last order date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        days = backfill(options['start'], options['end'])
+        self.stdout.write(f'{days} days rolled up')
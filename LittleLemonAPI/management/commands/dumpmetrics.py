@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.metrics import render_prometheus
+
+
+class Command(BaseCommand):
+    help = 'Print the request metrics collected in METRICS_DIR in Prometheus text format'
+
+    def handle(self, *args, **options):
+        if not settings.METRICS_DIR:
+            self.stderr.write('METRICS_DIR is not set, so there are no worker snapshots to read.')
+        self.stdout.write(render_prometheus(), ending='')
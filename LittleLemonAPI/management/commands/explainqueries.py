@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from LittleLemonAPI.explain import explain_queries, flagged
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries behind each API view and flag full table scans and temporary sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail', action='store_true', help='exit with an error if an unexpected scan is found')
+
+    def handle(self, *args, **options):
+        report = explain_queries()
+        for name, row in report.items():
+            marks = [mark for mark, hit in (('FULL SCAN', row['full_scan']), ('TEMP SORT', row['temp_sort'])) if hit]
+            if marks and row['expected']:
+                marks.append('(expected)')
+            self.stdout.write(f'{name}  {" ".join(marks)}'.rstrip())
+            for line in row['plan']:
+                self.stdout.write(f'    {line}')
+        problems = flagged(report)
+        self.stdout.write(f'\n{len(problems)} queries need an index: {", ".join(problems) or "none"}')
+        if problems and options['fail']:
+            raise CommandError('unexpected full scans or sorts')
@@ -0,0 +1,92 @@
+import json
+import logging
+import subprocess
+from django.core.management.base import BaseCommand, CommandError
+from bench.benchmarks import benchmark_database, unthrottled
+from bench.loadtest import SCENARIOS, run_load, seed_dataset
+from LittleLemonAPI.explain import explain_queries, flagged
+
+COLUMNS = ('requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'requests_per_s', 'queries_per_request')
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and replay a weighted mix of API traffic against it in-process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--items', type=int, default=200)
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--managers', type=int, default=2)
+        parser.add_argument('--crew', type=int, default=5)
+        parser.add_argument('--cart-lines', type=int, default=3)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--mix', help='JSON file of {scenario: weight}; unlisted scenarios are skipped')
+        parser.add_argument('--save', help='write the report to this JSON file')
+        parser.add_argument('--compare', help='baseline JSON report to diff against')
+
+    def handle(self, *args, **options):
+        weights = None
+        if options['mix']:
+            with open(options['mix']) as f:
+                weights = json.load(f)
+            unknown = set(weights) - {s.name for s in SCENARIOS}
+            if unknown:
+                raise CommandError(f'Unknown scenarios in mix: {", ".join(sorted(unknown))}')
+
+        # expected 4xx answers (e.g. checkout with an empty cart) would flood the console
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with benchmark_database(on_disk=True), unthrottled():
+            dataset = seed_dataset(
+                categories=options['categories'], items=options['items'],
+                customers=options['customers'], managers=options['managers'], crew=options['crew'],
+                cart_lines=options['cart_lines'], orders=options['orders'],
+            )
+            endpoints = run_load(dataset, requests=options['requests'], threads=options['threads'],
+                                 weights=weights, seed=options['seed'])
+            explain = explain_queries()
+
+        report = {
+            'commit': self.git_commit(),
+            'config': {key: options[key] for key in (
+                'categories', 'items', 'customers', 'managers', 'crew', 'cart_lines',
+                'orders', 'requests', 'threads', 'seed')},
+            'endpoints': endpoints,
+            'explain': explain,
+        }
+        self.print_report(endpoints)
+        problems = flagged(explain)
+        self.stdout.write(f'\nQuery plans needing an index (manage.py explainqueries): {", ".join(problems) or "none"}')
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f)['endpoints'], endpoints)
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Saved report to {options["save"]}')
+
+    def git_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            return None
+
+    def print_report(self, endpoints):
+        self.stdout.write(f'{"endpoint":<20}' + ''.join(f'{column:>20}' for column in COLUMNS))
+        for name, row in endpoints.items():
+            self.stdout.write(f'{name:<20}' + ''.join(f'{row[column]:>20}' for column in COLUMNS))
+
+    def print_comparison(self, baseline, endpoints):
+        self.stdout.write('\nChange against baseline (p95, requests/s, queries/request):')
+        for name, row in endpoints.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            changes = []
+            for column in ('p95_ms', 'requests_per_s', 'queries_per_request'):
+                before, after = old[column], row[column]
+                change = (after - before) / before * 100 if before else 0.0
+                changes.append(f'{before} -> {after} ({change:+.1f}%)')
+            self.stdout.write(f'{name:<20}' + '   '.join(changes))
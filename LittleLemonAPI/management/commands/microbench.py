@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from bench.benchmarks import BENCHMARKS, benchmark_database
+
+
+class Command(BaseCommand):
+    help = 'Run a micro benchmark against a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        func = BENCHMARKS[options['benchmark']]
+        with benchmark_database(on_disk=func.on_disk):
+            results = func(rows=options['rows'], repeat=options['repeat'], threads=options['threads'])
+        for label, value, unit in results:
+            self.stdout.write(f'{label:<40} {value:>14,.1f} {unit}')
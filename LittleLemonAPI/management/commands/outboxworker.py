@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from LittleLemonAPI.events import OutboxWorker
+from LittleLemonAPI.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = 'Run the subscribers of queued outbox events (order_created, order_status_changed, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='events claimed per round trip')
+        parser.add_argument('--threads', type=int, default=4, help='events handled concurrently')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='exit once no event is due')
+        parser.add_argument('--retry-dead', action='store_true', help='requeue events that ran out of attempts first')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            requeued = OutboxEvent.objects.filter(dead__eq=True).update(dead=False, attempts=0, available_at=timezone.now())
+            self.stdout.write(f'{requeued} dead events requeued')
+        worker = OutboxWorker(batch_size=options['batch_size'], threads=options['threads'])
+        try:
+            worker.run(poll_interval=options['poll_interval'], once=options['once'])
+        except KeyboardInterrupt:
+            # claimed events that didn't finish are picked up again once their lease runs out
+            pass
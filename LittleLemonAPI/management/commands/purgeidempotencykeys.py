@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses past IDEMPOTENCY_KEY_TTL'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{purge_expired()} expired keys deleted')
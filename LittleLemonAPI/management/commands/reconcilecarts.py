@@ -0,0 +1,39 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from LittleLemonAPI.models import Cart, CartSummary
+
+
+class Command(BaseCommand):
+    help = 'Compare the stored cart summaries with the cart lines they describe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='rewrite summaries that have drifted')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            actual = {
+                user_id: (total, lines)
+                for user_id, total, lines in Cart.objects.values('user')
+                .annotate(total=Sum('price'), lines=Count('pk'))
+                .values_list('user', 'total', 'lines')
+                .order_by()
+            }
+            stored = {
+                user_id: (total, lines)
+                for user_id, total, lines in CartSummary.objects.values_list('user', 'total', 'lines')
+            }
+            empty = (Decimal(0), 0)
+            drifted = {}
+            for user_id in actual.keys() | stored.keys():
+                expected = actual.get(user_id, empty)
+                if stored.get(user_id, empty) != expected:
+                    drifted[user_id] = expected
+                    self.stdout.write(f'user {user_id}: stored {stored.get(user_id)} expected {expected}')
+
+            if options['fix']:
+                for user_id, (total, lines) in drifted.items():
+                    CartSummary.objects.update_or_create(user_id=user_id, defaults={'total': total, 'lines': lines})
+        fixed = ' (fixed)' if options['fix'] and drifted else ''
+        self.stdout.write(f'{len(drifted)} cart summaries out of sync{fixed}')
@@ -0,0 +1,286 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags, quote_etag
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'littlelemon:menu:version'
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.entries.pop(key, default)
+
+    def items(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class MenuCache:
+    """Serialized menu responses keyed by the menu version and the request URL.
+
+    The version starts from a nanosecond timestamp and moves forward on
+    every menu write, so old entries are simply never read again. With the 'lru' backend the entries
+    live in process memory and the version in the MenuVersion row; a worker
+    rereads it at most every VERSION_TTL seconds, so another worker's write
+    shows up here within that time. Naming a CACHES alias instead shares
+    both version and entries between workers through that cache.
+    """
+
+    def __init__(self, backend='lru', max_entries=256):
+        if backend == 'lru':
+            self.store = LRUCache(max_entries)
+            self.shared = None
+        else:
+            self.store = self.shared = caches[backend]
+        self.local_version = time.time_ns()
+        self.checked_at = None
+        self.prices = None
+
+    def version_ttl(self):
+        return getattr(settings, 'MENU_CACHE', {}).get('VERSION_TTL', 1)
+
+    def version(self):
+        if self.shared is not None:
+            version = self.shared.get(VERSION_KEY)
+            if version is None:
+                version = self.local_version
+                self.shared.add(VERSION_KEY, version, None)
+            return version
+        if self.checked_at is None or time.monotonic() - self.checked_at >= self.version_ttl():
+            from .models import MenuVersion
+            version = MenuVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+            if version is None:
+                MenuVersion.objects.get_or_create(pk=1, defaults={'version': self.local_version})
+            else:
+                self.local_version = version
+            self.checked_at = time.monotonic()
+        return self.local_version
+
+    def bump(self):
+        """Move to a new version; returns (the version it replaced, the new one).
+
+        The replaced version is exact even with other workers bumping, so a
+        caller can tell whether it saw every write up to the new version.
+        """
+        from .models import MenuVersion
+        while True:
+            if self.shared is not None:
+                self.version()
+                try:
+                    version = self.shared.incr(VERSION_KEY)
+                except ValueError:
+                    continue    # evicted since; version() puts it back
+                previous = version - 1
+                break
+            previous = MenuVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+            if previous is None:
+                MenuVersion.objects.get_or_create(pk=1, defaults={'version': self.local_version})
+                continue
+            version = max(time.time_ns(), previous + 1)
+            # compare-and-set, so a bump from another worker in between is retried on top of it
+            if MenuVersion.objects.filter(pk=1, version=previous).update(version=version):
+                break
+        self.local_version = version
+        self.checked_at = time.monotonic()
+        return previous, version
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def clear(self):
+        self.store.clear()
+        self.prices = None
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    # the async views' versions: a shared cache is read through its async API
+    async def aversion(self):
+        if self.shared is not None:
+            version = await self.shared.aget(VERSION_KEY)
+            if version is None:
+                version = self.local_version
+                await self.shared.aadd(VERSION_KEY, version, None)
+            return version
+        if self.checked_at is None or time.monotonic() - self.checked_at >= self.version_ttl():
+            from .models import MenuVersion
+            version = await MenuVersion.objects.filter(pk=1).values_list('version', flat=True).afirst()
+            if version is None:
+                await MenuVersion.objects.aget_or_create(pk=1, defaults={'version': self.local_version})
+            else:
+                self.local_version = version
+            self.checked_at = time.monotonic()
+        return self.local_version
+
+    async def aget(self, key):
+        if self.shared is None:
+            return self.store.get(key)
+        return await self.shared.aget(key)
+
+    async def aset(self, key, value):
+        if self.shared is None:
+            self.store.set(key, value)
+        else:
+            await self.shared.aset(key, value)
+
+
+_menu_cache = None
+_menu_cache_lock = threading.Lock()
+
+
+def get_menu_cache():
+    global _menu_cache
+    if _menu_cache is None:
+        with _menu_cache_lock:
+            if _menu_cache is None:
+                options = getattr(settings, 'MENU_CACHE', {})
+                _menu_cache = MenuCache(options.get('BACKEND', 'lru'), options.get('MAX_ENTRIES', 256))
+    return _menu_cache
+
+
+def bump_menu_version():
+    return get_menu_cache().bump()
+
+
+class MenuPrices:
+    """{menu item id: price} for one menu version, for pricing cart lines.
+
+    Looking up an id the table doesn't have (an item created after it was
+    built, in a version this worker hasn't read yet) goes to the database,
+    so a new item is never reported missing; KeyError means it doesn't exist.
+    """
+
+    def __init__(self, version, prices):
+        self.version = version
+        self.prices = prices
+
+    def __getitem__(self, menuitem_id):
+        try:
+            return self.prices[menuitem_id]
+        except KeyError:
+            from .models import MenuItems
+            price = MenuItems.objects.filter(pk=menuitem_id).values_list('price', flat=True).first()
+            if price is None:
+                raise
+            self.prices[menuitem_id] = price
+            return price
+
+    def __contains__(self, menuitem_id):
+        try:
+            self[menuitem_id]
+        except KeyError:
+            return False
+        return True
+
+
+def get_menu_prices():
+    # rebuilt once per menu version; held apart from the response entries, which would evict it
+    from .models import MenuItems
+    cache = get_menu_cache()
+    version = cache.version()
+    prices = cache.prices
+    if prices is None or prices.version != version:
+        prices = cache.prices = MenuPrices(version, dict(MenuItems.objects.values_list('pk', 'price')))
+    return prices
+
+
+def _cache_key(request, version):
+    query = sorted(
+        (name, tuple(sorted(values)))
+        for name, values in request.GET.lists()
+        if name != 'format'
+    )
+    url = f'{request.build_absolute_uri(request.path)}?{query!r}'
+    return f'littlelemon:menu:{version}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def _detach(data):
+    # ReturnDict/ReturnList keep a reference to their serializer and its instances
+    if isinstance(data, dict):
+        return {key: _detach(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_detach(value) for value in data]
+    return data
+
+
+def _not_modified(request, etag):
+    # ETag only: a write can land in the same second as the cached response,
+    # which an If-Modified-Since date can't tell apart
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags or etag.removeprefix('W/') in etags
+
+
+def cached_response(request, handler, *args, **kwargs):
+    cache = get_menu_cache()
+    version = cache.version()
+    etag = 'W/' + quote_etag(f'menu-{version}')
+
+    if request.method == 'GET' and _not_modified(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        key = _cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, _detach(response.data))
+    response['ETag'] = etag
+    return response
+
+
+async def acached_response(request, render, handler, *args, **kwargs):
+    # cached_response for the async views; `handler` returns (data, status), `render` turns them into a response
+    cache = get_menu_cache()
+    version = await cache.aversion()
+    etag = 'W/' + quote_etag(f'menu-{version}')
+
+    if _not_modified(request, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        key = _cache_key(request, version)
+        data = await cache.aget(key)
+        if data is None:
+            data, code = await handler(request, *args, **kwargs)
+            if code != status.HTTP_200_OK:
+                return render(data, code)
+            await cache.aset(key, data)
+        response = render(data)
+    response['ETag'] = etag
+    return response
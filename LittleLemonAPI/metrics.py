@@ -0,0 +1,256 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERIES = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HELP = {
+    'littlelemon_request_duration_seconds': 'Wall time spent handling a request.',
+    'littlelemon_request_db_queries': 'Database queries run by a request.',
+    'littlelemon_request_db_duration_seconds': 'Time a request spent waiting on the database.',
+    'littlelemon_request_serializer_duration_seconds': 'Time a request spent in serializers.',
+    'littlelemon_response_size_bytes': 'Size of the response body.',
+    'littlelemon_token_cache_requests_total': 'Token authentications answered from the token cache (hit) or the database (miss).',
+    'littlelemon_token_cache_saved_queries_total': 'Database queries token cache hits avoided.',
+    'littlelemon_outbox_emitted_total': 'Events committed to the outbox.',
+    'littlelemon_outbox_events_total': 'Outbox events handled, by outcome (done, retry, dead).',
+    'littlelemon_outbox_handler_duration_seconds': 'Time an outbox subscriber took per event.',
+    'littlelemon_outbox_pending': 'Outbox events waiting to be handled.',
+    'littlelemon_outbox_dead': 'Outbox events that ran out of attempts.',
+    'littlelemon_outbox_lag_seconds': 'Age of the oldest pending outbox event.',
+    'littlelemon_idempotency_requests_total': 'Requests with an Idempotency-Key, by outcome (stored, replayed, released, conflict, mismatch).',
+    'littlelemon_idempotency_wait_seconds': 'Time a duplicate request waited for the one holding its Idempotency-Key.',
+    'littlelemon_outbox_saturated': '1 when the last outbox batch was full, i.e. the worker is behind.',
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)    # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-local histograms, counters and gauges keyed by name and labels."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.flushed_at = 0
+
+    def observe(self, name, value, buckets=SECONDS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': [
+                    [name, list(labels), list(h.buckets), list(h.counts), h.sum, h.count]
+                    for (name, labels), h in self.histograms.items()
+                ],
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def maybe_flush(self):
+        # with several worker processes each one drops its snapshot into METRICS_DIR
+        directory = getattr(settings, 'METRICS_DIR', None)
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+        now = time.monotonic()
+        if not directory or now - self.flushed_at < interval:
+            return
+        self.flushed_at = now
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+
+registry = Registry()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass    # exists, owned by another user
+    return True
+
+
+def _worker_snapshots(directory):
+    own = os.getpid()
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith('metrics-') and filename.endswith('.json')):
+            continue
+        try:
+            pid = int(filename[len('metrics-'):-len('.json')])
+        except ValueError:
+            continue
+        if pid == own:
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            if not _alive(pid):
+                # a worker that exited or was recycled; its numbers went with it
+                os.remove(path)
+                continue
+            with open(path) as f:
+                yield json.load(f)
+        except FileNotFoundError:
+            continue    # pruned by another process meanwhile
+
+
+def collect():
+    """Merge this process's metrics with the snapshots live workers left in METRICS_DIR.
+
+    Histograms and counters are summed; gauges report one value per process
+    (e.g. the outbox backlog seen by each worker), so they are merged with max.
+    """
+    snapshots = [registry.snapshot()]
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory and os.path.isdir(directory):
+        snapshots.extend(_worker_snapshots(directory))
+
+    histograms, counters, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, buckets, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [buckets, [0] * len(counts), 0.0, 0])
+            merged[1] = [a + b for a, b in zip(merged[1], counts)]
+            merged[2] += total
+            merged[3] += count
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = max(gauges[key], value) if key in gauges else value
+    return histograms, counters, gauges
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in pairs) + '}'
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    histograms, counters, gauges = collect()
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges)):
+        seen = set()
+        for (name, labels), value in sorted(series.items()):
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f'# HELP {name} {HELP[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name}{_labels(labels)} {_format(value)}')
+    seen = set()
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bound, bucket_count in zip([*buckets, '+Inf'], counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_format(total)}')
+        lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+current_request = ContextVar('littlelemon_request_stats', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    # installed on every connection when it opens, so queries are counted in
+    # whatever thread runs them; async requests run their sync code in a worker
+    # thread that inherits the request's context
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@contextmanager
+def serializer_timer():
+    stats = current_request.get()
+    if stats is None or stats.depth:
+        # nested serializers are already inside the outer measurement
+        yield
+        return
+    stats.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_time += time.perf_counter() - start
+        stats.depth -= 1
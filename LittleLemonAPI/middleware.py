@@ -0,0 +1,81 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from .metrics import BYTES, QUERIES, RequestStats, current_request, registry
+
+
+class MetricsMiddleware:
+    """Record per-route wall time, query count, DB time, serializer time and response size.
+
+    Queries are counted by metrics.count_queries, which every connection gets
+    when it opens, into the RequestStats this middleware puts in the context.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        labels = {'route': match.route if match else 'unmatched', 'method': request.method}
+        registry.observe('littlelemon_request_duration_seconds', elapsed, **labels)
+        registry.observe('littlelemon_request_db_queries', stats.queries, QUERIES, **labels)
+        registry.observe('littlelemon_request_db_duration_seconds', stats.db_time, **labels)
+        registry.observe('littlelemon_request_serializer_duration_seconds', stats.serializer_time, **labels)
+        if not response.streaming:
+            registry.observe('littlelemon_response_size_bytes', len(response.content), BYTES, **labels)
+        registry.maybe_flush()
+
+
+class ASGIURLConfMiddleware:
+    """Route ASGI requests through ASGI_URLCONF, where the read endpoints have async views.
+
+    Under WSGI an async view would cost an event loop per request, so WSGI
+    requests keep ROOT_URLCONF and its sync views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        urlconf = getattr(settings, 'ASGI_URLCONF', None)
+        if urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = urlconf
+        return await self.get_response(request)
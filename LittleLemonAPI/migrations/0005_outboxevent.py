@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-17 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0004_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField()),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('handled', models.JSONField(default=list)),
+                ('last_error', models.TextField(blank=True)),
+                ('dead', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dead', 'available_at'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
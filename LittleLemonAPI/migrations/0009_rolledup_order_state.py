@@ -0,0 +1,54 @@
+# Generated by Django 5.0.7 on 2026-10-17 20:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def record_counted_state(apps, schema_editor):
+    # what apply_order counted for orders rolled up before the state kept their date, total and lines
+    RolledUpOrder = apps.get_model('LittleLemonAPI', 'RolledUpOrder')
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    states = list(RolledUpOrder.objects.filter(date__isnull=True))
+    orders = {order['pk']: order for order in Order.objects.filter(pk__in=[state.pk for state in states]).values('pk', 'date', 'total')}
+    lines = {}
+    for order_id, menuitem_id, category_id, quantity, price in OrderItem.objects.filter(order_id__in=orders).values_list(
+            'order_id', 'menuitem_id', 'menuitem__category_id', 'quantity', 'price'):
+        lines.setdefault(order_id, []).append([menuitem_id, category_id, quantity, str(price)])
+    for state in states:
+        order = orders.get(state.pk)
+        if order is not None:
+            state.date, state.total, state.lines = timezone.localdate(order['date']), order['total'], lines.get(state.pk, [])
+    RolledUpOrder.objects.bulk_update(states, ['date', 'total', 'lines'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0008_menuversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rolleduporder',
+            name='date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='rolleduporder',
+            name='lines',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='rolleduporder',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='rolleduporder',
+            name='order',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, serialize=False, to='LittleLemonAPI.order'),
+        ),
+        migrations.RunPython(record_counted_state, migrations.RunPython.noop),
+    ]
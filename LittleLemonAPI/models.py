@@ -1,7 +1,20 @@
 from django.db import models
+from django.db.models.lookups import BuiltinLookup, Exact
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+@models.BooleanField.register_lookup
+class BooleanEquals(Exact):
+    # filter(status=False) compiles to NOT "status", which no index can serve;
+    # filter(status__eq=False) compiles to "status" = 0
+    lookup_name = 'eq'
+
+    def as_sql(self, compiler, connection):
+        return BuiltinLookup.as_sql(self, compiler, connection)
+
+    def get_rhs_op(self, connection, rhs):
+        return connection.operators['exact'] % rhs
+
 class Category(models.Model):
     slug = models.SlugField(unique=True, blank=True)
     title = models.CharField(max_length=255, db_index=True, unique=True)
@@ -35,12 +48,37 @@ class Cart(models.Model):
     def __str__(self):
         return f'{self.quantity} * {self.menuitem.title.capitalize()}'
 
+class CartSummary(models.Model):
+    # running totals of a user's cart, maintained by LittleLemonAPI.cart
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    lines = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.lines} lines, {self.total}'
+
+class MenuVersion(models.Model):
+    # one row: the menu version every worker's MenuCache keys its entries on (LittleLemonAPI.menu_cache)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return str(self.version)
+
 class Order(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='delivery_crew', null=True)
-    status = models.BooleanField(db_index=True, default=0)
+    # user, delivery_crew and status lookups are served by the composite indexes below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='delivery_crew', null=True, db_index=False)
+    status = models.BooleanField(default=0)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateTimeField(auto_now_add=True, db_index=True)
+    class Meta:
+        # order lists filter by crew / customer / status and read newest first
+        indexes = [
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='order_crew_date_idx'),
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['status', 'date'], name='order_status_date_idx'),
+        ]
 
     def __str__(self):
         return f'Order {self.id}'
@@ -56,3 +94,92 @@ class OrderItem(models.Model):
     
     def __str__(self):
         return f'{self.quantity} * {self.menuitem.title.capitalize()}'
+
+class OutboxEvent(models.Model):
+    # events written with the change that caused them and handled later by `manage.py outboxworker`
+    name = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField()    # next attempt; pushed forward while a worker holds the event
+    attempts = models.PositiveSmallIntegerField(default=0)
+    handled = models.JSONField(default=list)    # subscribers that already succeeded
+    last_error = models.TextField(blank=True)
+    dead = models.BooleanField(default=False)    # gave up after OUTBOX_MAX_ATTEMPTS
+    class Meta:
+        indexes = [
+            models.Index(fields=['dead', 'available_at'], name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} {self.pk}'
+
+class IdempotencyKey(models.Model):
+    # responses kept for POST retries that repeat an Idempotency-Key header (LittleLemonAPI.idempotency)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)    # sha256 of the method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True)    # None while the first request runs
+    content_type = models.CharField(max_length=255, blank=True)
+    body = models.BinaryField(default=b'')
+    expires_at = models.DateTimeField(db_index=True)    # end of the running request's lease, then of the replay window
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f'{self.key} ({self.user_id})'
+
+# daily rollups behind the reports endpoint, kept up to date by LittleLemonAPI.rollups;
+# days are the order's date in TIME_ZONE and deliveries count on the day the order was placed
+class DailySales(models.Model):
+    date = models.DateField(primary_key=True)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.date}: {self.orders} orders, {self.revenue}'
+
+class DailyMenuItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItems, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+    def __str__(self):
+        return f'{self.date}: {self.quantity} * {self.menuitem_id}'
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    class Meta:
+        unique_together = ('date', 'category')
+
+    def __str__(self):
+        return f'{self.date}: {self.quantity} * category {self.category_id}'
+
+class DailyCrewDeliveries(models.Model):
+    date = models.DateField()
+    delivery_crew = models.ForeignKey(User, on_delete=models.CASCADE)
+    delivered = models.PositiveIntegerField(default=0)
+    class Meta:
+        unique_together = ('date', 'delivery_crew')
+
+    def __str__(self):
+        return f'{self.date}: {self.delivered} by {self.delivery_crew_id}'
+
+class RolledUpOrder(models.Model):
+    # what the rollups currently count for an order, so applying it again only adds the difference;
+    # it outlives a deleted order until the order_deleted event takes the counts back out
+    order = models.OneToOneField(Order, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True)
+    date = models.DateField(null=True)
+    total = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    lines = models.JSONField(default=list)    # [menuitem id, category id, quantity, price] per order line
+    delivered = models.BooleanField(default=False)
+    delivery_crew_id = models.IntegerField(null=True)
+
+    def __str__(self):
+        return f'Order {self.order_id} rolled up'
@@ -1,5 +1,17 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.query import ValuesListIterable
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .menu_cache import LRUCache
 
 class CustomPagination(PageNumberPagination):
     page_size = 4
@@ -12,4 +24,171 @@ class CustomPagination(PageNumberPagination):
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data
-        })
\ No newline at end of file
+        })
+
+# COUNT(*) results reused by count=approx, keyed by the SQL being counted
+_counts = LRUCache(512)
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a unique ordering, e.g. ('-date', '-id').
+
+    The cursor holds the ordering values of the last (or first) row shown, so
+    every page is an indexed range scan instead of an OFFSET. `count` can be
+    exact (the default), approx (a COUNT(*) reused for COUNT_CACHE_TTL
+    seconds) or none.
+    """
+    page_size = CustomPagination.page_size
+    page_size_query_param = CustomPagination.page_size_query_param
+    max_page_size = CustomPagination.max_page_size
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering_query_param = 'ordering'
+    orderings = {'-id': ('-id',)}
+    count_mode = 'exact'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        self.count = self.get_count(queryset, request)
+
+        fields = [(name.lstrip('-'), name.startswith('-') != reverse) for name in self.ordering]
+        queryset = queryset.order_by(*(f'-{name}' if descending else name for name, descending in fields))
+        if values is not None:
+            queryset = queryset.filter(self.after(fields, values))
+
+        # values_list() querysets get the ordering columns appended and stripped again
+        row_fields = queryset._fields if queryset._iterable_class is ValuesListIterable else None
+        if row_fields:
+            queryset = queryset.values_list(*row_fields, *(name for name, _ in fields))
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if row_fields:
+            width = len(row_fields)
+            positions = [row[width:] for row in rows]
+            rows = [row[:width] for row in rows]
+        else:
+            positions = [tuple(getattr(row, name) for name, _ in fields) for row in rows]
+
+        has_next = has_more if not reverse else values is not None
+        has_previous = values is not None if not reverse else has_more
+        self.next_position = positions[-1] if rows and has_next else None
+        self.previous_position = positions[0] if rows and has_previous else None
+        return rows
+
+    def after(self, fields, values):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), per column direction
+        condition = Q()
+        for index, (name, descending) in enumerate(fields):
+            step = Q(**{f'{name}__{"lt" if descending else "gt"}': values[index]})
+            for (previous, _), value in zip(fields[:index], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request):
+        name = request.query_params.get(self.ordering_query_param)
+        return self.orderings.get(name) or next(iter(self.orderings.values()))
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, self.count_mode)
+        if mode == 'none':
+            return None
+        if mode != 'approx':
+            return queryset.count()
+        key = str(queryset.query)
+        cached = _counts.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        count = queryset.count()
+        _counts.set(key, (time.monotonic() + getattr(settings, 'COUNT_CACHE_TTL', 60), count))
+        return count
+
+    def encode_cursor(self, position, reverse):
+        values = [value.isoformat() if isinstance(value, (date, datetime)) else
+                  str(value) if isinstance(value, Decimal) else value for value in position]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = payload['v'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return [self.decode_value(model, name, value) for name, value in zip(self.ordering, values)], reverse
+
+    def decode_value(self, model, name, value):
+        # cursors come from clients: anything the ordering column could not hold is a 404, not a 500
+        field = model._meta.get_field(name.lstrip('-'))
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except (ValidationError, TypeError, ValueError, ArithmeticError):
+            raise NotFound('Invalid cursor')
+        if value is None:
+            # the ordering columns are all NOT NULL
+            raise NotFound('Invalid cursor')
+        return value
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position, False))
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.previous_position, True))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+class OrderKeysetPagination(KeysetPagination):
+    orderings = {
+        '-date': ('-date', '-id'),
+        'date': ('date', 'id'),
+    }
+
+class MenuItemKeysetPagination(KeysetPagination):
+    orderings = {
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+class KeysetPaginationMixin:
+    # ?cursor= (empty for the first page) switches a view to keyset pagination
+    keyset_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.keyset_pagination_class is not None and 'cursor' in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
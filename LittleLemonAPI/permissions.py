@@ -1,5 +1,10 @@
 from rest_framework import permissions
+from .roles import is_delivery_crew, is_manager
 
 class IsManager(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Manager').exists()
\ No newline at end of file
+        return is_manager(request.user)
+
+class IsDeliveryCrew(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return is_delivery_crew(request.user)
@@ -0,0 +1,123 @@
+import json
+import math
+import re
+from io import BytesIO
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:     # optional; without it everything goes through the stdlib json module
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+# any integer literal outside the 64-bit range has at least 19 digits
+_LONG_DIGITS = re.compile(rb'\d{19}')
+
+
+def _json_dumps(data):
+    text = json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+    return text.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def _default(obj):
+    value = _encoder.default(obj)
+    if isinstance(value, float) and not math.isfinite(value):
+        # Decimal('NaN') and friends: orjson would write null, the stdlib fallback raises like DRF
+        raise ValueError('Out of range float values are not JSON compliant')
+    return value
+
+
+def dumps(data):
+    """Compact JSON bytes, encoded exactly as rest_framework's JSONRenderer does.
+
+    One difference is left: a float NaN or Infinity already in `data` comes
+    out as null, where DRF raises ValueError. No serializer here produces
+    floats, and finding them would take a walk over the whole payload.
+    """
+    if orjson is None:
+        return _json_dumps(data)
+    try:
+        # datetimes, Decimals and lazy strings go to DRF's encoder, so they come out as they always did
+        ret = orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # integers beyond 64 bits, non-finite Decimals, or a type neither encoder knows
+        # (json raises the usual TypeError / ValueError)
+        return _json_dumps(data)
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class FastJSONRenderer(JSONRenderer):
+    # orjson for the usual compact response; indented (?indent= / browsable) output stays with the stdlib
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or not self.compact or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """orjson for the usual request body, the stdlib for anything it can't read exactly.
+
+    orjson turns integers beyond 64 bits into floats, so bodies with a long
+    run of digits go to DRF's parser, which keeps them as ints. So do bodies
+    orjson refuses, so that what is accepted and the errors match DRF's.
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if not _LONG_DIGITS.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(BytesIO(body), media_type, parser_context)
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    # streamed listings write their own body; this covers errors and plain responses
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(super(NDJSONRenderer, self).render(item) + b'\n' for item in data)
+
+
+class LazyRenderer(BaseRenderer):
+    """Takes part in content negotiation for `renderer_path` and imports it only when it is picked."""
+    renderer_path = None
+    _renderer_class = None
+
+    @classmethod
+    def load(cls):
+        if cls._renderer_class is None:
+            cls._renderer_class = import_string(cls.renderer_path)
+        return cls._renderer_class
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return self.load()().render(data, accepted_media_type, renderer_context)
+
+
+class LazyBrowsableAPIRenderer(LazyRenderer):
+    renderer_path = 'rest_framework.renderers.BrowsableAPIRenderer'
+    media_type = 'text/html'
+    format = 'api'
+
+
+class LazyXMLRenderer(LazyRenderer):
+    renderer_path = 'rest_framework_xml.renderers.XMLRenderer'
+    media_type = 'application/xml'
+    format = 'xml'
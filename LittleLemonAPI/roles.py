@@ -0,0 +1,98 @@
+import threading
+import time
+from django.conf import settings
+from .menu_cache import LRUCache
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, 'ROLE_CACHE_TTL', 60)
+
+
+def get_role_cache():
+    # user id -> (expiry, frozenset of group names), shared by every request in the process
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LRUCache(getattr(settings, 'ROLE_CACHE_MAX_ENTRIES', 10000))
+    return _cache
+
+
+def get_roles(user):
+    if not user or not user.is_authenticated:
+        return frozenset()
+    # resolved once per request: request.user is a fresh object for every request
+    roles = getattr(user, '_roles', None)
+    if roles is not None:
+        return roles
+
+    roles = _cached(user)
+    if roles is None:
+        roles = _store(user, frozenset(user.groups.values_list('name', flat=True)))
+    user._roles = roles
+    return roles
+
+
+async def aget_roles(user):
+    # get_roles for async views: the cache is shared, the query goes through the async ORM
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_roles', None)
+    if roles is not None:
+        return roles
+    roles = _cached(user)
+    if roles is None:
+        names = [name async for name in user.groups.values_list('name', flat=True)]
+        roles = _store(user, frozenset(names))
+    user._roles = roles
+    return roles
+
+
+def _cached(user):
+    cache = get_role_cache()
+    entry = cache.get(user.pk)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        cache.pop(user.pk)
+        return None
+    return entry[1]
+
+
+def _store(user, roles):
+    get_role_cache().set(user.pk, (time.monotonic() + _ttl(), roles))
+    return roles
+
+
+def get_stored_roles(user):
+    # straight from the database: the cache may not have seen another worker's
+    # membership change yet, so writes to a user's groups are decided on this
+    return frozenset(user.groups.values_list('name', flat=True))
+
+
+def has_role(user, role):
+    return role in get_roles(user)
+
+
+def is_manager(user):
+    return has_role(user, MANAGER)
+
+
+def is_delivery_crew(user):
+    return has_role(user, DELIVERY_CREW)
+
+
+def invalidate(user=None):
+    # drop one user (or everyone) from the cache after a membership change
+    if user is None:
+        get_role_cache().clear()
+        return
+    get_role_cache().pop(getattr(user, 'pk', user))
+    if hasattr(user, '_roles'):
+        del user._roles
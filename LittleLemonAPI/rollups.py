@@ -0,0 +1,219 @@
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .events import subscribe
+from .models import (
+    DailyCategorySales, DailyCrewDeliveries, DailyMenuItemSales, DailySales, Order, OrderItem, RolledUpOrder,
+)
+
+ROLLUPS = [DailySales, DailyMenuItemSales, DailyCategorySales, DailyCrewDeliveries]
+CENT = Decimal('0.01')
+
+
+def _add(model, key, **deltas):
+    # adjust a rollup row that is known to exist
+    model.objects.filter(**key).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def _increment(model, keys, rows):
+    """Add each row's values to the rollup row with the same `keys`, creating it if needed.
+
+    Rows must carry every column: the INSERT doesn't apply model defaults.
+
+    One INSERT ... ON CONFLICT DO UPDATE per table (SQLite 3.24+, PostgreSQL);
+    a filter().update() then create() per row costs three times the queries.
+    """
+    if not rows:
+        return
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in keys)
+    updates = ', '.join(
+        f'{quote(field.column)} = {table}.{quote(field.column)} + excluded.{quote(field.column)}'
+        for field in fields if field.name not in keys
+    )
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+    params = [field.get_db_prep_save(row[field.name], connection) for row in rows for field in fields]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) VALUES {placeholders} ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+            params,
+        )
+
+
+# a rollup row whose count here drops to 0 holds nothing a backfill would write, so it is deleted
+COUNTS = {DailySales: 'orders', DailyMenuItemSales: 'quantity', DailyCategorySales: 'quantity', DailyCrewDeliveries: 'delivered'}
+
+
+def _contributions(state):
+    """{(model, key): {field: amount}} for what the rollups count for one order's state."""
+    rows = {}
+
+    def add(model, key, **amounts):
+        row = rows.setdefault((model, key), dict.fromkeys(amounts, 0))
+        for field, amount in amounts.items():
+            row[field] += amount
+
+    day = state.date
+    add(DailySales, (('date', day),), revenue=Decimal(state.total), orders=1, delivered=int(state.delivered))
+    if state.delivered and state.delivery_crew_id is not None:
+        add(DailyCrewDeliveries, (('date', day), ('delivery_crew', state.delivery_crew_id)), delivered=1)
+    for menuitem_id, category_id, quantity, price in state.lines:
+        add(DailyMenuItemSales, (('date', day), ('menuitem', menuitem_id)), quantity=quantity, revenue=Decimal(price))
+        add(DailyCategorySales, (('date', day), ('category', category_id)), quantity=quantity, revenue=Decimal(price))
+    return rows
+
+
+def _apply_difference(counted, wanted):
+    # increases go in one upsert per table; decreases update rows that are known to exist
+    increments = {}
+    for row in counted.keys() | wanted.keys():
+        model, key = row
+        before, after = counted.get(row, {}), wanted.get(row, {})
+        deltas = {field: after.get(field, 0) - before.get(field, 0) for field in before.keys() | after.keys()}
+        if not any(deltas.values()):
+            continue
+        if all(delta >= 0 for delta in deltas.values()):
+            increments.setdefault((model, tuple(name for name, _ in key)), []).append({**dict(key), **deltas})
+            continue
+        _add(model, dict(key), **deltas)
+        model.objects.filter(**dict(key), **{COUNTS[model]: 0}).delete()
+    for (model, keys), rows in increments.items():
+        _increment(model, list(keys), rows)
+
+
+def apply_order(order_id):
+    """Bring the rollups in line with the order's current state, or take it out once it is deleted.
+
+    RolledUpOrder records what is already counted for the order, so applying
+    it twice, or its events out of order, only ever changes the difference.
+    An order's lines don't change after checkout; they are read once.
+    """
+    with transaction.atomic():
+        state = RolledUpOrder.objects.select_for_update().filter(order_id=order_id).first()
+        order = Order.objects.filter(pk=order_id).values('date', 'status', 'delivery_crew_id', 'total').first()
+        counted = _contributions(state) if state is not None else {}
+        if order is None:
+            _apply_difference(counted, {})
+            if state is not None:
+                state.delete()
+            return
+        if state is None:
+            lines = OrderItem.objects.filter(order_id=order_id).values_list('menuitem_id', 'menuitem__category_id', 'quantity', 'price')
+            state = RolledUpOrder(order_id=order_id, lines=[[menuitem_id, category_id, quantity, str(price)]
+                                                            for menuitem_id, category_id, quantity, price in lines])
+        state.date, state.total = timezone.localdate(order['date']), order['total']
+        state.delivered = bool(order['status'])
+        state.delivery_crew_id = order['delivery_crew_id'] if state.delivered else None
+        _apply_difference(counted, _contributions(state))
+        state.save(force_insert=state._state.adding)
+
+
+@subscribe('order_created')
+@subscribe('order_status_changed')
+@subscribe('order_changed')
+@subscribe('order_deleted')
+def update_rollups(payload):
+    apply_order(payload['order_id'])
+
+
+def _counted_states(orders):
+    # the orders and their lines, both read in order id order and walked side by side
+    lines = OrderItem.objects.filter(order__in=orders).order_by('order_id', 'pk').values_list(
+        'order_id', 'menuitem_id', 'menuitem__category_id', 'quantity', 'price',
+    ).iterator(chunk_size=5000)
+    line = next(lines, None)
+    for pk, date, total, status, crew_id in orders.order_by('pk').values_list(
+            'pk', 'date', 'total', 'status', 'delivery_crew_id').iterator(chunk_size=5000):
+        counted = []
+        while line is not None and line[0] == pk:
+            counted.append([line[1], line[2], line[3], str(line[4])])
+            line = next(lines, None)
+        yield RolledUpOrder(order_id=pk, date=timezone.localdate(date), total=total, lines=counted,
+                            delivered=status, delivery_crew_id=crew_id if status else None)
+
+
+def backfill(start=None, end=None):
+    """Rebuild the rollups for orders placed from `start` to `end` (inclusive dates, None for open-ended)."""
+    orders = Order.objects.order_by()
+    days = {}
+    if start is not None:
+        orders = orders.filter(date__date__gte=start)
+        days['date__gte'] = start
+    if end is not None:
+        orders = orders.filter(date__date__lte=end)
+        days['date__lte'] = end
+    lines = OrderItem.objects.filter(order__in=orders).order_by()
+    delivered = orders.filter(status__eq=True)
+
+    with transaction.atomic():
+        for model in ROLLUPS:
+            model.objects.filter(**days).delete()
+        RolledUpOrder.objects.filter(order__in=orders).delete()
+        # and deleted orders whose order_deleted event hasn't been handled yet
+        RolledUpOrder.objects.filter(**days).delete()
+
+        DailySales.objects.bulk_create(
+            (DailySales(**row) for row in orders.values(day=TruncDate('date')).annotate(
+                revenue=Sum('total'), orders=Count('pk'), delivered=Count('pk', filter=Q(status__eq=True)),
+            ).values('revenue', 'orders', 'delivered', date=F('day'))),
+            batch_size=1000,
+        )
+        DailyMenuItemSales.objects.bulk_create(
+            (DailyMenuItemSales(**row) for row in lines.values('menuitem_id', day=TruncDate('order__date')).annotate(
+                quantity=Sum('quantity'), revenue=Sum('price'),
+            ).values('menuitem_id', 'quantity', 'revenue', date=F('day'))),
+            batch_size=1000,
+        )
+        DailyCategorySales.objects.bulk_create(
+            (DailyCategorySales(**row) for row in lines.values(
+                category_id=F('menuitem__category_id'), day=TruncDate('order__date'),
+            ).annotate(quantity=Sum('quantity'), revenue=Sum('price')).values('category_id', 'quantity', 'revenue', date=F('day'))),
+            batch_size=1000,
+        )
+        DailyCrewDeliveries.objects.bulk_create(
+            (DailyCrewDeliveries(**row) for row in delivered.filter(delivery_crew__isnull=False).values(
+                'delivery_crew_id', day=TruncDate('date'),
+            ).annotate(delivered=Count('pk')).values('delivery_crew_id', 'delivered', date=F('day'))),
+            batch_size=1000,
+        )
+        RolledUpOrder.objects.bulk_create(_counted_states(orders), batch_size=1000)
+    return DailySales.objects.filter(**days).count()
+
+
+def _money(value):
+    # formatted like the DecimalFields in the order serializers
+    return str(Decimal(value).quantize(CENT))
+
+
+def report(start, end, top=10):
+    """Totals for the days from `start` to `end` read only from the rollups."""
+    in_range = {'date__range': (start, end)}
+    days = list(DailySales.objects.filter(**in_range).order_by('date').values('date', 'revenue', 'orders', 'delivered'))
+    menu_items = (
+        DailyMenuItemSales.objects.filter(**in_range).values('menuitem', title=F('menuitem__title'))
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue', 'menuitem')[:top]
+    )
+    categories = (
+        DailyCategorySales.objects.filter(**in_range).values('category', title=F('category__title'))
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue', 'category')
+    )
+    crew = (
+        DailyCrewDeliveries.objects.filter(**in_range).values('delivery_crew', username=F('delivery_crew__username'))
+        .annotate(delivered=Sum('delivered')).order_by('-delivered', 'delivery_crew')
+    )
+    return {
+        'start': start,
+        'end': end,
+        'revenue': _money(sum(day['revenue'] for day in days)),
+        'orders': sum(day['orders'] for day in days),
+        'delivered': sum(day['delivered'] for day in days),
+        'days': [{**day, 'revenue': _money(day['revenue'])} for day in days],
+        'menu_items': [{**row, 'revenue': _money(row['revenue'])} for row in menu_items],
+        'categories': [{**row, 'revenue': _money(row['revenue'])} for row in categories],
+        'delivery_crew': list(crew),
+    }
@@ -0,0 +1,226 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.db import connection
+from django.db.models import IntegerField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter
+from .menu_cache import get_menu_cache
+
+TOKEN = re.compile(r'\w+')
+
+# score multipliers: where the term was found and how closely it matched
+TITLE, CATEGORY = 2.0, 1.0
+EXACT, PREFIX, TYPO = 1.0, 0.6, 0.4
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def _deletes(term):
+    # one-character deletions; two terms within one edit share at least one of these
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class MenuSearchIndex:
+    """In-memory inverted index over menu item and category titles.
+
+    Built lazily from the database and tagged with the menu version it
+    reflects. Local writes patch it in place (see signals.py); a version it
+    didn't see, e.g. a write from another worker sharing the menu cache,
+    makes the next search rebuild it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.postings = {}      # term -> {item id: weight}
+        self.terms = []         # sorted vocabulary, for prefix lookups
+        self.neighbours = {}    # one-deletion variant -> terms, for typo lookups
+        self.documents = {}     # item id -> (title terms, category id)
+        self.categories = {}    # category id -> title terms
+
+    def build(self, version):
+        from .models import Category, MenuItems
+        self.postings, self.documents = {}, {}
+        self.categories = {pk: tokenize(title) for pk, title in Category.objects.values_list('pk', 'title')}
+        for pk, title, category_id in MenuItems.objects.values_list('pk', 'title', 'category_id').iterator(chunk_size=5000):
+            self._add(pk, tokenize(title), category_id, bulk=True)
+        self._reindex_terms()
+        self.version = version
+
+    def _add(self, pk, title_terms, category_id, bulk=False):
+        self.documents[pk] = (title_terms, category_id)
+        weights = dict.fromkeys(self.categories.get(category_id, ()), CATEGORY)
+        weights.update(dict.fromkeys(title_terms, TITLE))
+        for term, weight in weights.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                if not bulk:
+                    self._term_added(term)
+            posting[pk] = weight
+
+    def _remove(self, pk):
+        document = self.documents.pop(pk, None)
+        if document is None:
+            return
+        title_terms, category_id = document
+        for term in {*title_terms, *self.categories.get(category_id, ())}:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(pk, None)
+                if not posting:
+                    del self.postings[term]
+                    self._term_removed(term)
+
+    def _variants(self, term):
+        return _deletes(term) | {term} if len(term) >= 4 else ()
+
+    def _term_added(self, term):
+        insort(self.terms, term)
+        for variant in self._variants(term):
+            self.neighbours.setdefault(variant, set()).add(term)
+
+    def _term_removed(self, term):
+        del self.terms[bisect_left(self.terms, term)]
+        for variant in self._variants(term):
+            terms = self.neighbours[variant]
+            terms.discard(term)
+            if not terms:
+                del self.neighbours[variant]
+
+    def _reindex_terms(self):
+        self.terms = sorted(self.postings)
+        self.neighbours = {}
+        for term in self.terms:
+            for variant in self._variants(term):
+                self.neighbours.setdefault(variant, set()).add(term)
+
+    def item_changed(self, pk):
+        from .models import MenuItems
+        self._remove(pk)
+        row = MenuItems.objects.filter(pk=pk).values_list('title', 'category_id').first()
+        if row is not None:
+            self._add(pk, tokenize(row[0]), row[1])
+
+    def category_changed(self, pk):
+        from .models import Category, MenuItems
+        affected = [item for item, (_, category_id) in self.documents.items() if category_id == pk]
+        for item in affected:
+            self._remove(item)
+        title = Category.objects.filter(pk=pk).values_list('title', flat=True).first()
+        if title is None:
+            self.categories.pop(pk, None)
+        else:
+            self.categories[pk] = tokenize(title)
+        for item, title, category_id in MenuItems.objects.filter(pk__in=affected).values_list('pk', 'title', 'category_id'):
+            self._add(item, tokenize(title), category_id)
+
+    def apply(self, model_name, pk, previous_version, version):
+        # called after commit with the versions either side of this write's bump
+        with self.lock:
+            if self.version is None or self.version != previous_version:
+                return
+            if model_name == 'category':
+                self.category_changed(pk)
+            else:
+                self.item_changed(pk)
+            self.version = version
+
+    def _candidates(self, token):
+        # {term: match multiplier} for one query token
+        matches = {}
+        if token in self.postings:
+            matches[token] = EXACT
+        if len(token) >= 2:
+            start = bisect_left(self.terms, token)
+            for term in self.terms[start:]:
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, PREFIX)
+        for variant in self._variants(token):
+            for term in self.neighbours.get(variant, ()):
+                matches.setdefault(term, TYPO)
+        return matches
+
+    def search(self, query, limit=None):
+        """Ids of the items matching every word of `query`, best first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        cache_version = get_menu_cache().version()
+        with self.lock:
+            if self.version != cache_version:
+                self.build(cache_version)
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, multiplier in self._candidates(token).items():
+                    for pk, weight in self.postings[term].items():
+                        score = weight * multiplier
+                        if score > token_scores.get(pk, 0):
+                            token_scores[pk] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: score + token_scores[pk] for pk, score in scores.items() if pk in token_scores}
+                if not scores:
+                    return []
+        if limit:
+            return heapq.nsmallest(limit, scores, key=lambda pk: (-scores[pk], pk))
+        return sorted(scores, key=lambda pk: (-scores[pk], pk))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = MenuSearchIndex()
+    return _index
+
+
+def _rank(model, ids):
+    # a simple CASE on the primary key; Case(When(...)) costs ~0.2ms per id to compile
+    column = f'{connection.ops.quote_name(model._meta.db_table)}.{connection.ops.quote_name(model._meta.pk.column)}'
+    whens = ' '.join(['WHEN %s THEN %s'] * len(ids))
+    params = [value for position, pk in enumerate(ids) for value in (pk, position)]
+    return RawSQL(f'CASE {column} {whens} END', params, output_field=IntegerField())
+
+
+class MenuSearchFilter(SearchFilter):
+    """?search= backed by the menu search index, ordered by relevance.
+
+    At most SEARCH_MAX_RESULTS matches are returned, best first, and the
+    view reports whether there were more as `truncated` (see
+    search_truncated()). Keyset pages follow their own ordering, so
+    ?search= with ?cursor= is refused rather than losing the ranking.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        if 'cursor' in request.query_params:
+            raise ValidationError({self.search_param: 'Search results are ranked by relevance and paged with ?page=, not ?cursor='})
+        limit = getattr(settings, 'SEARCH_MAX_RESULTS', 200)
+        ids = get_search_index().search(query, limit + 1)
+        request.search_truncated = len(ids) > limit
+        if not ids:
+            return queryset.none()
+        ids = ids[:limit]
+        return queryset.filter(pk__in=ids).annotate(search_rank=_rank(queryset.model, ids)).order_by('search_rank')
+
+
+def search_truncated(request):
+    # True or False after MenuSearchFilter ran a search for this request, None otherwise
+    return getattr(request, 'search_truncated', None)
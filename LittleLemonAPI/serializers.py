@@ -1,33 +1,65 @@
+from datetime import timedelta
 from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import User 
-from .models import MenuItems, Category, Cart, Order
+from .models import MenuItems, Category, Cart, CartSummary, Order, OrderItem
+from .metrics import serializer_timer
 import bleach
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+class TimedSerializer(serializers.ModelSerializer):
+    # time spent building .data is reported by MetricsMiddleware
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+class CategorySerializer(TimedSerializer):
     class Meta:
         model = Category
         fields = ['id', 'title']
+        list_serializer_class = TimedListSerializer
 
     def validate_title(self, value):
         return bleach.clean(value)
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemListSerializer(TimedListSerializer):
+    def to_representation(self, data):
+        # each category is serialized once per page and shared by its items
+        self.category_reps = {}
+        return super().to_representation(data)
+
+class MenuItemSerializer(TimedSerializer):
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all()) # nested serializer
     class Meta:
         model = MenuItems
         fields = ['id', 'title', 'price', 'category', 'featured']
+        list_serializer_class = MenuItemListSerializer
         # depth = 1
     
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep['category'] = CategorySerializer(instance.category).data
+        category_reps = getattr(self.parent, 'category_reps', None)
+        if category_reps is None:
+            rep['category'] = CategorySerializer(instance.category).data
+        else:
+            category = category_reps.get(instance.category_id)
+            if category is None:
+                category = category_reps[instance.category_id] = CategorySerializer(instance.category).data
+            rep['category'] = category
         return rep
 
     def validate_title(self, value):
         return bleach.clean(value)
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedSerializer):
     #automatically set the user to the current user
     user = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -36,21 +68,69 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = ['id', 'user', 'menuitem', 'quantity', 'unit_price', 'price']
+        list_serializer_class = TimedListSerializer
         extra_kwargs = {
             'price': {'read_only': True, 'min_value': 1},
             'quantity': {'min_value': 1}
         }
 
-class OrderSerializer(serializers.ModelSerializer):
+class CartSummarySerializer(TimedSerializer):
+    class Meta:
+        model = CartSummary
+        fields = ['total', 'lines']
+
+class OrderSerializer(TimedSerializer):
     class Meta:
         model = Order
         fields = ['id', 'user', 'delivery_crew', 'total', 'date']
+        list_serializer_class = TimedListSerializer
 
-class UserSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(TimedSerializer):
+    title = serializers.CharField(source='menuitem.title', read_only=True)
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'menuitem', 'title', 'quantity', 'unit_price', 'price']
+        list_serializer_class = TimedListSerializer
+
+class OrderDetailSerializer(OrderSerializer):
+    # reads orderitem_set and each line's menuitem; load them with views.with_items()
+    items = OrderItemSerializer(source='orderitem_set', many=True, read_only=True)
+    class Meta(OrderSerializer.Meta):
+        fields = [*OrderSerializer.Meta.fields, 'status', 'items']
+
+class CrewStatusSerializer(serializers.Serializer):
+    # {"orders": [1, 2, 3], "status": 1} moves every listed order to one status
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    status = serializers.BooleanField()
+
+    def validate_orders(self, value):
+        max_orders = getattr(settings, 'CREW_STATUS_MAX_ORDERS', 500)
+        if len(value) > max_orders:
+            raise serializers.ValidationError(f'At most {max_orders} orders per request')
+        return list(dict.fromkeys(value))
+
+class UserSerializer(TimedSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'password']
+        list_serializer_class = TimedListSerializer
         extra_kwargs = {
             'password': {'write_only': True},
             'email': {'required': False}
-        }
\ No newline at end of file
+        }
+
+class ReportQuerySerializer(serializers.Serializer):
+    # ?start=&end= default to the last 30 days
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    top = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, data):
+        end = data.get('end') or timezone.localdate()
+        start = data.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError('start must not be after end')
+        max_days = getattr(settings, 'REPORT_MAX_DAYS', 366)
+        if (end - start).days >= max_days:
+            raise serializers.ValidationError(f'Reports cover at most {max_days} days')
+        return {'start': start, 'end': end, 'top': data['top']}
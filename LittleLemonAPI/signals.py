@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from . import authentication, roles
+from .dispatch import get_dispatcher
+from .events import emit
+from .menu_cache import bump_menu_version
+from .metrics import count_queries
+from .models import Category, MenuItems, Order
+from .search import get_search_index
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        roles.invalidate(instance)
+        authentication.invalidate_user(instance.pk)
+    elif pk_set:
+        for pk in pk_set:
+            roles.invalidate(pk)
+            authentication.invalidate_user(pk)
+    else:
+        # group.user_set.clear() doesn't tell us who was affected
+        roles.invalidate()
+        authentication.invalidate_user()
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    # djoser's token/logout deletes the user's tokens
+    key = instance.key
+    transaction.on_commit(lambda: authentication.invalidate_token(key))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    # deactivation or any other change to the cached user snapshot
+    user_id = instance.pk
+    transaction.on_commit(lambda: authentication.invalidate_user(user_id))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def update_crew_roster(sender, instance, action, reverse, pk_set, **kwargs):
+    # applied on commit, so a rolled back group change never reaches the roster
+    if action == 'post_clear':
+        transaction.on_commit(get_dispatcher().reset)
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        crew_ids = pk_set if instance.name == roles.DELIVERY_CREW else ()
+    else:
+        is_crew_group = Group.objects.filter(pk__in=pk_set, name=roles.DELIVERY_CREW).exists()
+        crew_ids = [instance.pk] if is_crew_group else ()
+    if not crew_ids:
+        return
+
+    def apply():
+        dispatcher = get_dispatcher()
+        for crew_id in crew_ids:
+            if action == 'post_add':
+                dispatcher.crew_added(crew_id)
+            else:
+                dispatcher.crew_removed(crew_id)
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=User)
+def update_crew_activity(sender, instance, update_fields=None, **kwargs):
+    # deactivated crew leave the roster and reactivated crew rejoin it; logins only touch last_login
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    user_id = instance.pk
+    if instance.is_active:
+        transaction.on_commit(lambda: get_dispatcher().crew_added(user_id))
+    else:
+        transaction.on_commit(lambda: get_dispatcher().crew_removed(user_id))
+
+
+_status_field = Order._meta.get_field('status')
+
+
+def _pending_crew(order):
+    # read from __dict__ so deferred fields never trigger a query
+    if 'status' not in order.__dict__ or 'delivery_crew_id' not in order.__dict__:
+        return None
+    if _status_field.to_python(order.status):
+        return None
+    return order.delivery_crew_id
+
+
+def _rolled_up_fields(order):
+    # the fields besides status that the sales rollups count
+    return tuple(order.__dict__.get(name) for name in ('total', 'delivery_crew_id', 'date'))
+
+
+@receiver(post_init, sender=Order)
+def remember_pending_crew(sender, instance, **kwargs):
+    instance._pending_crew = _pending_crew(instance)
+    instance._rolled_up = _rolled_up_fields(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_crew_load(sender, instance, created, **kwargs):
+    old = None if created else instance._pending_crew
+    new = _pending_crew(instance)
+    instance._pending_crew = new
+    if old == new:
+        return
+
+    def apply():
+        dispatcher = get_dispatcher()
+        if old is not None:
+            dispatcher.order_released(old)
+        if new is not None:
+            dispatcher.order_assigned(new)
+    transaction.on_commit(apply)
+
+
+@receiver(post_delete, sender=Order)
+def release_crew_load(sender, instance, **kwargs):
+    crew_id = instance._pending_crew
+    if crew_id is not None:
+        transaction.on_commit(lambda: get_dispatcher().order_released(crew_id))
+
+
+@receiver(post_save, sender=Order)
+def queue_rollup_change(sender, instance, created, **kwargs):
+    # status changes have their own event; checkout emits order_created
+    old, new = instance._rolled_up, _rolled_up_fields(instance)
+    instance._rolled_up = new
+    if not created and old != new:
+        emit('order_changed', order_id=instance.pk)
+
+
+@receiver(post_delete, sender=Order)
+def queue_rollup_removal(sender, instance, **kwargs):
+    emit('order_deleted', order_id=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=MenuItems)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_menu_cache(sender, instance, **kwargs):
+    # bump after commit so a concurrent read can't cache pre-commit rows under the new version
+    def apply():
+        previous, version = bump_menu_version()
+        get_search_index().apply(sender._meta.model_name, instance.pk, previous, version)
+    transaction.on_commit(apply)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
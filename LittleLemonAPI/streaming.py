@@ -0,0 +1,50 @@
+from itertools import islice
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from .renderers import NDJSONRenderer, dumps
+
+NDJSON = NDJSONRenderer.media_type
+
+
+def wants_ndjson(request):
+    return getattr(request, 'accepted_media_type', None) == NDJSON
+
+
+def wants_stream(request):
+    return request.query_params.get('stream') in ('1', 'true') or wants_ndjson(request)
+
+
+def _generate(reps, chunk_size, ndjson):
+    # one bytes chunk per database fetch keeps both memory and write calls bounded;
+    # each chunk is encoded as it goes, since every orjson result holds a few KB
+    # of buffer however short it is
+    first = True
+    if not ndjson:
+        yield b'['
+    while True:
+        chunk = list(islice(reps, chunk_size))
+        if not chunk:
+            break
+        if ndjson:
+            body = bytearray()
+            for rep in chunk:
+                body += dumps(rep)
+                body += b'\n'
+            yield bytes(body)
+        else:
+            body = dumps(chunk)[1:-1]
+            yield body if first else b',' + body
+            first = False
+    if not ndjson:
+        yield b']'
+
+
+def stream_response(request, queryset, fast_serializer_class):
+    chunk_size = getattr(settings, 'STREAM_CHUNK_SIZE', 2000)
+    ndjson = wants_ndjson(request)
+    rows = fast_serializer_class.rows(queryset).iterator(chunk_size=chunk_size)
+    reps = fast_serializer_class.iterate(rows)
+    return StreamingHttpResponse(
+        _generate(reps, chunk_size, ndjson),
+        content_type=NDJSON if ndjson else 'application/json',
+    )
@@ -1,3 +1,1155 @@
-from django.test import TestCase
+import base64
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework.views import APIView
+from LittleLemon.database import database_settings, sqlite_pragmas
+from . import roles
+from .authentication import USER_FIELDS, TokenCache, get_token_cache
+from .cart import add_to_cart, get_cart_summary
+from .checkout import checkout
+from .dispatch import get_dispatcher
+from .events import OutboxWorker, emit, handler_name, subscribe, unsubscribe
+from .idempotency import idempotent
+from .fast_serializers import CartFastSerializer, CategoryFastSerializer, MenuItemFastSerializer, OrderFastSerializer
+from .menu_cache import MenuCache, get_menu_cache, get_menu_prices
+from .metrics import collect, registry
+from .models import Cart, CartSummary, Category, IdempotencyKey, MenuItems, Order, OrderItem, OutboxEvent, RolledUpOrder
+from .renderers import FastJSONParser, FastJSONRenderer
+from .roles import DELIVERY_CREW, MANAGER
+from .rollups import ROLLUPS, backfill, report, update_rollups
+from .search import get_search_index
+from .throttling import SQLiteCounterStore
+from .views import set_crew_orders_status
 
-# Create your tests here.
+
+def count_in_process(path, key, expires, checks, results):
+    store = SQLiteCounterStore(path)
+    results.put([store.incr(key, expires) for _ in range(checks)])
+
+
+class APIFixtures:
+    def setUp(self):
+        # process-wide caches outlive the test transactions
+        roles.invalidate()
+        get_token_cache().clear()
+        get_dispatcher().reset()
+        get_menu_cache().clear()
+        get_menu_cache().version()
+        # the configured 5/minute would throttle most tests
+        throttles = mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {'anon': None, 'user': None})
+        throttles.start()
+        self.addCleanup(throttles.stop)
+        self.manager = User.objects.create_user('manager')
+        self.crew = User.objects.create_user('crew')
+        self.customer = User.objects.create_user('customer')
+        Group.objects.create(id=1, name=MANAGER).user_set.add(self.manager)
+        Group.objects.create(id=2, name=DELIVERY_CREW).user_set.add(self.crew)
+        self.categories = [Category.objects.create(title=f'Category {i}') for i in range(3)]
+        self.menuitems = [
+            MenuItems.objects.create(title=f'Item {i}', price=Decimal(i + 1), category=self.categories[i % 3], featured=i % 2 == 0)
+            for i in range(6)
+        ]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+    def fill_cart(self, user, lines):
+        for menuitem in self.menuitems[:lines]:
+            add_to_cart(user, menuitem.pk, 2, menuitem.price)
+
+
+class APITestCase(APIFixtures, TestCase):
+    pass
+
+
+class APITransactionTestCase(APIFixtures, TransactionTestCase):
+    pass
+
+
+class CheckoutTests(APITestCase):
+    def test_queries_per_checkout_do_not_grow_with_the_cart(self):
+        for lines in (1, len(self.menuitems)):
+            with self.subTest(lines=lines):
+                self.fill_cart(self.customer, lines)
+                with self.assertNumQueries(9):
+                    order = checkout(self.customer, lambda: self.crew.pk)
+                self.assertEqual(OrderItem.objects.filter(order=order).count(), lines)
+                self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_total_is_read_from_the_cart_summary(self):
+        self.fill_cart(self.customer, 3)
+        registry.reset()
+        self.addCleanup(registry.reset)
+        total = get_cart_summary(self.customer).total
+        order = checkout(self.customer, lambda: self.crew.pk)
+        self.assertEqual(order.total, total)
+        self.assertEqual(order.total, sum(OrderItem.objects.filter(order=order).values_list('price', flat=True)))
+        summary = get_cart_summary(self.customer)
+        self.assertEqual((summary.lines, summary.total), (0, 0))
+        self.assertNotIn(('littlelemon_cart_summary_drift_total', ()), registry.counters)
+
+    def test_a_drifted_summary_is_not_ordered_and_is_repaired(self):
+        self.fill_cart(self.customer, 3)
+        registry.reset()
+        self.addCleanup(registry.reset)
+        # a running summary that has drifted from the cart rows must not leak into the order
+        CartSummary.objects.filter(user=self.customer).update(total=Decimal('999.99'))
+        order = checkout(self.customer, lambda: self.crew.pk)
+        self.assertEqual(order.total, Decimal('12.00'))
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('12.00'))
+        summary = get_cart_summary(self.customer)
+        self.assertEqual((summary.lines, summary.total), (0, 0))
+        self.assertEqual(registry.counters[('littlelemon_cart_summary_drift_total', ())], 1)
+
+    def test_a_line_added_after_the_read_stays_in_the_cart(self):
+        self.fill_cart(self.customer, 2)
+        late = self.menuitems[5]
+
+        def assign():
+            # runs between the cart read and the delete, like a concurrent cart POST
+            add_to_cart(self.customer, late.pk, 1, late.price)
+            return self.crew.pk
+
+        order = checkout(self.customer, assign)
+        self.assertEqual(list(OrderItem.objects.filter(order=order).values_list('menuitem', flat=True)),
+                         [menuitem.pk for menuitem in self.menuitems[:2]])
+        self.assertEqual(list(Cart.objects.filter(user=self.customer).values_list('menuitem', flat=True)), [late.pk])
+        summary = get_cart_summary(self.customer)
+        self.assertEqual((summary.lines, summary.total), (1, late.price))
+
+
+class CartTests(APITestCase):
+    def test_items_newer_than_the_price_table_can_be_added(self):
+        get_menu_prices()
+        # bulk_create sends no post_save, like a write whose version bump this worker hasn't read yet
+        [menuitem] = MenuItems.objects.bulk_create([MenuItems(title='New', price=Decimal('7.50'), category=self.categories[0])])
+        client = self.client_for(self.customer)
+        response = client.post('/api/cart', {'menuitem': menuitem.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['price'], '15.00')
+        response = client.post('/api/cart', [{'menuitem': menuitem.pk}, {'menuitem': menuitem.pk + 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data['errors']), [1])
+
+    @override_settings(CART_MAX_OPERATIONS=3)
+    def test_batches_are_bounded(self):
+        client = self.client_for(self.customer)
+        batch = [{'menuitem': menuitem.pk} for menuitem in self.menuitems[:4]]
+        response = client.post('/api/cart', batch, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'At most 3 cart operations per request')
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+        self.assertEqual(client.post('/api/cart', batch[:3], format='json').status_code, 200)
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    def test_concurrent_adds_to_one_line_lose_no_increments(self):
+        user = User.objects.create_user('customer')
+        menuitem = MenuItems.objects.create(title='Item', price=Decimal('2.50'), category=Category.objects.create(title='Category'))
+        threads, adds = 8, 25
+        errors = []
+
+        def hammer():
+            try:
+                for _ in range(adds):
+                    add_to_cart(user, menuitem.pk, 1, menuitem.price)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=hammer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        line = Cart.objects.get(user=user, menuitem=menuitem)
+        self.assertEqual(line.quantity, threads * adds)
+        self.assertEqual(line.price, threads * adds * menuitem.price)
+        summary = get_cart_summary(user)
+        self.assertEqual((summary.lines, summary.total), (1, line.price))
+
+
+class IdempotencyTests(APITestCase):
+    def post(self, client, url, data, key='key-1'):
+        return client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_a_replay_returns_the_stored_response_without_running_the_view(self):
+        client = self.client_for(self.customer)
+        data = {'menuitem': self.menuitems[0].pk, 'quantity': 2}
+        first = self.post(client, '/api/cart', data)
+        self.assertEqual(first.status_code, 201)
+        with mock.patch('LittleLemonAPI.views.add_to_cart', side_effect=AssertionError('ran the view again')):
+            with self.assertNumQueries(1):
+                replayed = self.post(client, '/api/cart', data)
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed['Content-Type'], first['Content-Type'])
+        self.assertEqual(replayed.content, first.content)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+
+    def test_the_same_key_with_another_body_is_refused(self):
+        client = self.client_for(self.customer)
+        self.assertEqual(self.post(client, '/api/cart', {'menuitem': self.menuitems[0].pk}).status_code, 201)
+        response = self.post(client, '/api/cart', {'menuitem': self.menuitems[1].pk})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(list(Cart.objects.filter(user=self.customer).values_list('menuitem', flat=True)), [self.menuitems[0].pk])
+        # keys belong to a user
+        self.assertEqual(self.post(self.client_for(self.manager), '/api/cart', {'menuitem': self.menuitems[1].pk}).status_code, 201)
+
+    def test_failures_release_the_key(self):
+        client = self.client_for(self.customer)
+        data = {'menuitem': self.menuitems[0].pk}
+        with mock.patch('LittleLemonAPI.views.add_to_cart', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                self.post(client, '/api/cart', data)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post(client, '/api/cart', data).status_code, 201)
+
+        calls = []
+
+        class FlakyView(APIView):
+            @idempotent
+            def post(self, request):
+                calls.append(request.data)
+                return Response({'attempt': len(calls)}, status=503 if len(calls) == 1 else 201)
+
+        view = FlakyView.as_view()
+        responses = []
+        for _ in range(3):
+            request = APIRequestFactory().post('/flaky', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='key-2')
+            force_authenticate(request, self.customer)
+            responses.append(view(request))
+        self.assertEqual([response.status_code for response in responses], [503, 201, 201])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(json.loads(responses[2].content), {'attempt': 2})
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=60, IDEMPOTENCY_WAIT=0)
+    def test_an_abandoned_key_is_taken_over_after_the_lock_timeout(self):
+        client = self.client_for(self.customer)
+        data = {'menuitem': self.menuitems[0].pk}
+        # a request that claimed the key and died before it could store or release it
+        with mock.patch('LittleLemonAPI.views.add_to_cart', side_effect=SystemExit), \
+                mock.patch('LittleLemonAPI.idempotency.release'):
+            with self.assertRaises(SystemExit):
+                self.post(client, '/api/cart', data)
+        record = IdempotencyKey.objects.get()
+        self.assertIsNone(record.status_code)
+        response = self.post(client, '/api/cart', data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Cart.objects.exists())
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.post(client, '/api/cart', data).status_code, 201)
+        record.refresh_from_db()
+        self.assertEqual(record.status_code, 201)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 1)
+
+    def test_checkout_runs_once_across_replays(self):
+        client = self.client_for(self.customer)
+        self.fill_cart(self.customer, 3)
+        first = self.post(client, '/api/orders', {})
+        self.assertEqual(first.status_code, 201)
+        # a line added after the order must not be ordered or cleared by a replay
+        add_to_cart(self.customer, self.menuitems[5].pk, 1, self.menuitems[5].price)
+        for _ in range(2):
+            replayed = self.post(client, '/api/orders', {})
+            self.assertEqual((replayed.status_code, replayed.content), (201, first.content))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 3)
+        self.assertEqual(list(Cart.objects.filter(user=self.customer).values_list('menuitem', flat=True)), [self.menuitems[5].pk])
+        self.assertEqual(OutboxEvent.objects.filter(name='order_created').count(), 1)
+
+
+class IdempotencyConcurrencyTests(APITransactionTestCase):
+    def race(self, hold):
+        """Start a checkout and keep it running until `hold(duplicate)` returns.
+
+        `duplicate` is a second request with the same key, already waiting on the first.
+        """
+        started, proceed, waiting = threading.Event(), threading.Event(), threading.Event()
+        calls, responses = [], {}
+
+        def slow_checkout(*args):
+            calls.append(args)
+            started.set()
+            proceed.wait(10)
+            return checkout(*args)
+
+        class WatchedCondition(threading.Condition):
+            def wait(self, timeout=None):
+                waiting.set()
+                return super().wait(timeout)
+
+        def post(name):
+            try:
+                responses[name] = self.client_for(self.customer).post('/api/orders', {}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+            finally:
+                connection.close()
+
+        self.fill_cart(self.customer, 2)
+        with mock.patch('LittleLemonAPI.views.checkout', slow_checkout), \
+                mock.patch('LittleLemonAPI.idempotency._finished', WatchedCondition()):
+            first = threading.Thread(target=post, args=('first',))
+            first.start()
+            self.assertTrue(started.wait(10))
+            duplicate = threading.Thread(target=post, args=('duplicate',))
+            duplicate.start()
+            self.assertTrue(waiting.wait(10))
+            hold(duplicate)
+            proceed.set()
+            first.join(10)
+            duplicate.join(10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        return responses
+
+    def test_a_duplicate_waits_for_the_first_response(self):
+        responses = self.race(lambda duplicate: None)
+        self.assertEqual(responses['first'].status_code, 201)
+        self.assertEqual(responses['duplicate'].status_code, 201)
+        self.assertEqual(responses['duplicate'].content, responses['first'].content)
+        self.assertEqual(responses['duplicate']['Idempotent-Replayed'], 'true')
+
+    @override_settings(IDEMPOTENCY_WAIT=0.2)
+    def test_a_duplicate_gives_up_with_a_conflict(self):
+        responses = self.race(lambda duplicate: duplicate.join(10))
+        self.assertEqual(responses['first'].status_code, 201)
+        self.assertEqual(responses['duplicate'].status_code, 409)
+
+
+class ThrottleStoreTests(TestCase):
+    def test_the_limit_holds_across_processes(self):
+        processes, checks, limit = 4, 200, 300
+        expires = int(time.time()) + 60
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'throttle.sqlite3')
+            SQLiteCounterStore(path).connection()    # create the table before the race
+            workers = [context.Process(target=count_in_process, args=(path, 'user_1', expires, checks, results)) for _ in range(processes)]
+            for worker in workers:
+                worker.start()
+            counts = [count for _ in workers for count in results.get(timeout=60)]
+            for worker in workers:
+                worker.join()
+        # every check got its own count, so exactly `limit` of them were allowed
+        self.assertEqual(sorted(counts), list(range(1, processes * checks + 1)))
+        self.assertEqual(sum(count <= limit for count in counts), limit)
+
+    async def test_async_checks_run_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteCounterStore(os.path.join(directory, 'throttle.sqlite3'))
+            threads = []
+            incr = store.incr
+            with mock.patch.object(store, 'incr', lambda *args: threads.append(threading.get_ident()) or incr(*args)):
+                self.assertEqual(await store.aincr('user_1', int(time.time()) + 60), 1)
+            self.assertNotIn(threading.get_ident(), threads)
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    base_dir = Path('/srv/littlelemon')
+
+    def settings_for(self, **environ):
+        # only the variables given here, whatever the host has set
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return database_settings(self.base_dir)
+
+    def test_sqlite_is_the_default(self):
+        config = self.settings_for()
+        self.assertIn(config['ENGINE'], ('django.db.backends.sqlite3', 'LittleLemon.sqlite_backend'))
+        self.assertEqual(config['NAME'], self.base_dir / 'db.sqlite3')
+        self.assertEqual(config['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (60, True))
+
+    def test_the_test_database_is_per_process(self):
+        name = self.settings_for()['TEST']['NAME']
+        self.assertEqual(os.path.dirname(name), tempfile.gettempdir())
+        self.assertIn(str(os.getpid()), os.path.basename(name))
+        self.assertEqual(self.settings_for(DATABASE_TEST_NAME='/tmp/mine.sqlite3')['TEST']['NAME'], '/tmp/mine.sqlite3')
+
+    def test_postgresql_is_selected_by_either_name(self):
+        for engine in ('postgresql', 'postgres'):
+            with self.subTest(engine=engine):
+                config = self.settings_for(DATABASE_ENGINE=engine, DATABASE_NAME='orders', DATABASE_HOST='db',
+                                           DATABASE_PORT='5432', DATABASE_USER='lemon', DATABASE_PASSWORD='secret')
+                self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+                self.assertEqual((config['NAME'], config['HOST'], config['PORT'], config['USER'], config['PASSWORD']),
+                                 ('orders', 'db', '5432', 'lemon', 'secret'))
+                self.assertEqual(config['OPTIONS'], {})
+                self.assertNotIn('TEST', config)
+
+    def test_an_unknown_engine_is_refused(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "not 'mysql'"):
+            self.settings_for(DATABASE_ENGINE='mysql')
+
+    def test_conn_max_age(self):
+        for engine in ('sqlite', 'postgresql'):
+            with self.subTest(engine=engine):
+                config = self.settings_for(DATABASE_ENGINE=engine, DATABASE_CONN_MAX_AGE='300')
+                self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (300, True))
+                # 0 closes the connection after every request, so there is nothing to health check
+                config = self.settings_for(DATABASE_ENGINE=engine, DATABASE_CONN_MAX_AGE='0')
+                self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (0, False))
+
+    def test_integers_that_do_not_parse_are_refused(self):
+        for name in ('DATABASE_CONN_MAX_AGE', 'DATABASE_POOL_SIZE'):
+            with self.subTest(name=name):
+                with self.assertRaisesMessage(ImproperlyConfigured, f"{name} must be an integer, not '1m'"):
+                    self.settings_for(DATABASE_ENGINE='postgresql', **{name: '1m'})
+
+    def test_the_pool_needs_django_5_1(self):
+        with mock.patch('django.VERSION', (5, 0, 7, 'final', 0)):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'DATABASE_POOL_SIZE needs Django 5.1'):
+                self.settings_for(DATABASE_ENGINE='postgresql', DATABASE_POOL_SIZE='10')
+        with mock.patch('django.VERSION', (5, 1, 0, 'final', 0)):
+            config = self.settings_for(DATABASE_ENGINE='postgresql', DATABASE_POOL_SIZE='10')
+        self.assertEqual(config['OPTIONS'], {'pool': {'min_size': 1, 'max_size': 10}})
+        # the pool replaces persistent connections
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (0, False))
+
+    def test_sqlite_pragmas(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(sqlite_pragmas(), {'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 5000})
+        with mock.patch.dict(os.environ, {'SQLITE_JOURNAL_MODE': 'delete', 'SQLITE_SYNCHRONOUS': 'full',
+                                          'SQLITE_BUSY_TIMEOUT': '250'}, clear=True):
+            self.assertEqual(sqlite_pragmas(), {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': 250})
+        with mock.patch.dict(os.environ, {'SQLITE_BUSY_TIMEOUT': 'soon'}, clear=True):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'SQLITE_BUSY_TIMEOUT must be an integer'):
+                sqlite_pragmas()
+
+
+class DispatcherRosterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dispatcher = get_dispatcher()
+        self.dispatcher.assign()    # loads the roster
+        self.crew_group = Group.objects.get(name=DELIVERY_CREW)
+
+    def test_crew_joins_the_roster_on_commit(self):
+        new_crew = User.objects.create_user('new-crew')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.crew_group.user_set.add(new_crew)
+            self.assertNotIn(new_crew.pk, self.dispatcher.roster.load)
+        self.assertTrue(callbacks)
+        self.assertIn(new_crew.pk, self.dispatcher.roster.load)
+
+    def test_rolled_back_group_change_never_reaches_the_roster(self):
+        new_crew = User.objects.create_user('new-crew')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.crew_group.user_set.add(new_crew)
+        callbacks.clear()    # what a rollback does to them
+        self.assertNotIn(new_crew.pk, self.dispatcher.roster.load)
+
+    def test_inactive_users_are_not_dispatched_to(self):
+        inactive = User.objects.create_user('inactive-crew', is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crew_group.user_set.add(inactive)
+        self.assertNotIn(inactive.pk, self.dispatcher.roster.load)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crew.is_active = False
+            self.crew.save()
+        self.assertNotIn(self.crew.pk, self.dispatcher.roster.load)
+
+    def test_reactivated_crew_rejoin_the_roster(self):
+        Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal(10))
+        for active in (False, True):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.crew.is_active = active
+                self.crew.save(update_fields=['is_active'])
+            self.assertEqual(self.crew.pk in self.dispatcher.roster.load, active)
+        self.assertEqual(self.dispatcher.roster.load[self.crew.pk], 1)
+        # a reactivated customer doesn't join
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save()
+        self.assertNotIn(self.customer.pk, self.dispatcher.roster.load)
+
+    def test_changes_from_other_workers_reach_the_next_assignment(self):
+        # queryset updates and through-model inserts send no signals, like a write in another process
+        User.objects.filter(pk=self.crew.pk).update(is_active=False)
+        new_crew = User.objects.create_user('new-crew')
+        User.groups.through.objects.create(user=new_crew, group=self.crew_group)
+        self.assertEqual({self.dispatcher.assign() for _ in range(20)}, {new_crew.pk})
+        self.assertEqual(list(self.dispatcher.roster.load), [new_crew.pk])
+
+
+class OrderDetailTests(APITestCase):
+    def test_detail_queries_do_not_grow_with_the_lines(self):
+        client = self.client_for(self.customer)
+        client.get('/api/cart')    # token and roles are cached from here on
+        for lines in (1, len(self.menuitems)):
+            with self.subTest(lines=lines):
+                self.fill_cart(self.customer, lines)
+                order = checkout(self.customer, lambda: self.crew.pk)
+                # the order, then its lines joined to their menu items
+                with self.assertNumQueries(2):
+                    response = client.get(f'/api/orders/{order.pk}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.data), ['id', 'user', 'delivery_crew', 'total', 'date', 'status', 'items'])
+                self.assertFalse(response.data['status'])
+                self.assertEqual(
+                    [(item['menuitem'], item['title'], item['quantity'], item['unit_price'], item['price']) for item in response.data['items']],
+                    [(menuitem.pk, menuitem.title, 2, f'{menuitem.price:.2f}', f'{2 * menuitem.price:.2f}') for menuitem in self.menuitems[:lines]],
+                )
+
+    def test_other_users_orders_are_refused(self):
+        self.fill_cart(self.customer, 1)
+        order = checkout(self.customer, lambda: self.crew.pk)
+        response = self.client_for(self.manager).get(f'/api/orders/{order.pk}')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('items', response.data)
+
+
+class CrewQueueTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_crew = User.objects.create_user('other-crew')
+        self.other_crew.groups.add(2)
+        self.orders = [Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal(10)) for _ in range(4)]
+        self.delivered = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal(10), status=True)
+        self.others = Order.objects.create(user=self.customer, delivery_crew=self.other_crew, total=Decimal(10))
+        self.client = self.client_for(self.crew)
+        self.client.get('/api/orders/queue')    # token and roles are cached from here on
+
+    def post(self, data):
+        return self.client.post('/api/orders/queue', data, format='json')
+
+    def statuses(self):
+        return dict(Order.objects.values_list('pk', 'status'))
+
+    def test_only_the_crew_members_pending_orders_change(self):
+        before = self.statuses()
+        mine = [order.pk for order in self.orders[:3]]
+        response = self.post({'orders': [*mine, self.delivered.pk, self.others.pk, 10 ** 6], 'status': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'status': True, 'updated': mine, 'unchanged': sorted([self.delivered.pk, self.others.pk, 10 ** 6])})
+        self.assertEqual(self.statuses(), {**before, **dict.fromkeys(mine, True)})
+        events = OutboxEvent.objects.filter(name='order_status_changed').order_by('pk')
+        self.assertEqual([event.payload['order_id'] for event in events], mine)
+        self.assertEqual({(event.payload['status'], event.payload['previous_status']) for event in events}, {(True, False)})
+
+    def test_one_update_for_any_number_of_orders(self):
+        # savepoint, select of the ids that change, UPDATE, one INSERT of the events, release
+        for orders in (self.orders[:1], self.orders[1:]):
+            with self.subTest(orders=len(orders)):
+                with CaptureQueriesContext(connection) as queries, self.assertNumQueries(5):
+                    response = self.post({'orders': [order.pk for order in orders], 'status': True})
+                self.assertEqual(len(response.data['updated']), len(orders))
+                self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries.captured_queries), 1)
+
+    @override_settings(CREW_STATUS_MAX_ORDERS=3)
+    def test_invalid_requests_change_nothing(self):
+        before = self.statuses()
+        for data in (
+            {'orders': [order.pk for order in self.orders], 'status': True},
+            {'orders': [self.orders[0].pk], 'status': 'maybe'},
+            {'orders': [self.orders[0].pk]},
+            {'orders': [], 'status': True},
+            {'orders': ['first'], 'status': True},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+        self.assertEqual(self.post({'orders': [order.pk for order in self.orders[:3]], 'status': False}).status_code, 200)
+        self.assertEqual(self.statuses(), before)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_only_delivery_crew_may_post(self):
+        for user in (self.customer, self.manager):
+            with self.subTest(user=user.username):
+                response = self.client_for(user).post('/api/orders/queue', {'orders': [self.orders[0].pk], 'status': True}, format='json')
+                self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.get(pk=self.orders[0].pk).status)
+
+
+class GroupMembershipTests(APITestCase):
+    def test_a_membership_change_reaches_the_next_permission_check(self):
+        manager, customer = self.client_for(self.manager), self.client_for(self.customer)
+        self.assertEqual(customer.get('/api/reports').status_code, 403)    # roles cached from here on
+        self.assertEqual(manager.post('/api/groups/manager/users', {'user': self.customer.pk}, format='json').status_code, 201)
+        self.assertEqual(customer.get('/api/reports').status_code, 200)
+        self.assertEqual(manager.delete(f'/api/groups/manager/users/{self.customer.pk}').status_code, 200)
+        self.assertEqual(customer.get('/api/reports').status_code, 403)
+
+    def test_membership_writes_ignore_a_stale_role_cache(self):
+        client = self.client_for(self.manager)
+        # another worker removed the crew member; this worker's cache hasn't heard of it
+        self.crew.groups.clear()
+        roles._store(self.crew, frozenset({DELIVERY_CREW}))
+        response = client.post('/api/groups/delivery-crew/users', {'user': self.crew.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.crew.groups.filter(name=DELIVERY_CREW).exists())
+        # and added the customer
+        self.customer.groups.add(2)
+        roles._store(self.customer, frozenset())
+        self.assertEqual(client.delete(f'/api/groups/delivery-crew/users/{self.customer.pk}').status_code, 200)
+        self.assertFalse(self.customer.groups.exists())
+
+
+class MenuCacheTests(APITestCase):
+    @override_settings(MENU_CACHE={'BACKEND': 'lru', 'VERSION_TTL': 0})
+    def test_a_write_in_one_worker_reaches_the_others(self):
+        writer, reader = MenuCache(), MenuCache()
+        before = reader.version()
+        self.assertEqual(writer.version(), before)
+        self.assertEqual(writer.bump()[0], before)
+        self.assertGreater(reader.version(), before)
+        self.assertEqual(reader.version(), writer.version())
+
+    def test_bump_reports_the_version_it_replaced(self):
+        for backend in ('lru', 'default'):
+            with self.subTest(backend=backend):
+                first, second = MenuCache(backend), MenuCache(backend)
+                _, version = first.bump()
+                # `second` still holds an older version, but bumps on top of `first`'s
+                self.assertEqual(second.bump()[0], version)
+
+    def test_etag_revalidation(self):
+        client = self.client_for(self.customer)
+        response = client.get('/api/menu-items')
+        self.assertNotIn('Last-Modified', response)
+        response = client.get('/api/menu-items', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_a_menu_write_changes_the_etag(self):
+        client = self.client_for(self.customer)
+        old_etag = client.get('/api/menu-items')['ETag']
+        for write in (
+            lambda: MenuItems.objects.create(title='New', price=Decimal(3), category=self.categories[0]),
+            lambda: MenuItems.objects.filter(pk=self.menuitems[0].pk).first().save(),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            # a client holding the old ETag gets the new menu, even with a later If-Modified-Since
+            response = client.get('/api/menu-items', HTTP_IF_NONE_MATCH=old_etag, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], len(self.menuitems) + 1)
+            self.assertNotEqual(response['ETag'], old_etag)
+            # and the new ETag revalidates until the next write
+            self.assertEqual(client.get('/api/menu-items', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            old_etag = response['ETag']
+
+
+class SearchIndexTests(APITestCase):
+    @override_settings(MENU_CACHE={'BACKEND': 'lru', 'VERSION_TTL': 3600})
+    def test_a_write_from_another_worker_triggers_a_rebuild(self):
+        index = get_search_index()
+        self.assertEqual(index.search('item'), [menuitem.pk for menuitem in self.menuitems])
+        # another worker adds an item and bumps the shared version
+        [elsewhere] = MenuItems.objects.bulk_create([MenuItems(title='Zucchini', price=Decimal(4), category=self.categories[0])])
+        MenuCache().bump()
+        # a local write patches the index only if it holds every version before this one
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItems.objects.create(title='Risotto', price=Decimal(5), category=self.categories[0])
+        self.assertEqual(index.search('zucchini'), [elsewhere.pk])
+
+    @override_settings(SEARCH_MAX_RESULTS=4)
+    def test_searches_say_when_they_were_truncated(self):
+        client = self.client_for(self.customer)
+        for fast in (False, True):
+            with self.subTest(fast=fast), self.settings(FAST_SERIALIZERS=fast):
+                get_menu_cache().clear()
+                for _ in range(2):    # the second answer comes from the response cache
+                    response = client.get('/api/menu-items?search=item&perpage=2')
+                    self.assertEqual((response.data['count'], response.data['truncated']), (4, True))
+                    self.assertEqual([item['id'] for item in response.data['results']], [menuitem.pk for menuitem in self.menuitems[:2]])
+                response = client.get('/api/menu-items?search=item 3')
+                self.assertEqual((response.data['count'], response.data['truncated']), (1, False))
+                self.assertNotIn('truncated', client.get('/api/menu-items').data)
+
+    def test_searches_are_not_paged_by_cursor(self):
+        client = self.client_for(self.customer)
+        response = client.get('/api/menu-items?search=item&cursor=&ordering=price')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+
+
+@override_settings(MENU_CACHE={'BACKEND': 'lru', 'VERSION_TTL': 3600})
+class ListQueryCountTests(APITestCase):
+    """Each list endpoint runs as many queries for one row as for a page of them."""
+
+    def setUp(self):
+        super().setUp()
+        MenuItems.objects.all().delete()
+        Category.objects.all().delete()
+        self.category = Category.objects.create(title='Mains')
+
+    def add_menuitems(self, count):
+        for _ in range(count):
+            category = Category.objects.create(title=f'Category {Category.objects.count()}')
+            MenuItems.objects.create(title=f'Item {category.pk}', price=Decimal(5), category=category)
+
+    def add_categories(self, count):
+        for _ in range(count):
+            Category.objects.create(title=f'Category {Category.objects.count()}')
+
+    def add_cart_lines(self, count):
+        for _ in range(count):
+            menuitem = MenuItems.objects.create(title='Cart item', price=Decimal(5), category=self.category)
+            add_to_cart(self.customer, menuitem.pk, 1, menuitem.price)
+
+    def add_orders(self, count):
+        menuitem = MenuItems.objects.create(title='Ordered item', price=Decimal(5), category=self.category)
+        for _ in range(count):
+            order = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal(10))
+            OrderItem.objects.create(order=order, menuitem=menuitem, quantity=2, unit_price=Decimal(5), price=Decimal(10))
+
+    def add_crew(self, count):
+        for _ in range(count):
+            User.objects.create_user(f'crew-{User.objects.count()}').groups.add(2)
+
+    def assertConstantQueries(self, user, url, expected, add_rows):
+        client = self.client_for(user)
+        add_rows(1)
+        client.get(url)    # token, roles and menu version are cached from here on
+        for added, rows in ((0, 1), (9, 10)):
+            add_rows(added)
+            get_menu_cache().clear()
+            with self.assertNumQueries(expected):
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            results = response.data['results'] if isinstance(response.data, dict) else response.data
+            self.assertGreaterEqual(len(results), rows)
+
+    def test_menu_items(self):
+        self.assertConstantQueries(self.customer, '/api/menu-items?perpage=50', 3, self.add_menuitems)
+
+    def test_menu_items_cursor(self):
+        self.assertConstantQueries(self.customer, '/api/menu-items?cursor=&perpage=50', 3, self.add_menuitems)
+
+    def test_categories(self):
+        self.assertConstantQueries(self.customer, '/api/category?perpage=50', 2, self.add_categories)
+
+    def test_cart(self):
+        self.assertConstantQueries(self.customer, '/api/cart', 1, self.add_cart_lines)
+
+    def test_customer_orders(self):
+        self.assertConstantQueries(self.customer, '/api/orders', 1, self.add_orders)
+
+    def test_customer_orders_with_items(self):
+        self.assertConstantQueries(self.customer, '/api/orders?expand=items', 2, self.add_orders)
+
+    def test_crew_orders(self):
+        self.assertConstantQueries(self.crew, '/api/orders', 1, self.add_orders)
+
+    def test_crew_queue(self):
+        self.assertConstantQueries(self.crew, '/api/orders/queue?perpage=50', 3, self.add_orders)
+
+    def test_manager_orders(self):
+        self.assertConstantQueries(self.manager, '/api/orders?perpage=50', 2, self.add_orders)
+
+    def test_manager_orders_cursor(self):
+        self.assertConstantQueries(self.manager, '/api/orders?cursor=&perpage=50&expand=items', 3, self.add_orders)
+
+    def test_group_members(self):
+        self.assertConstantQueries(self.manager, '/api/groups/delivery-crew/users', 1, self.add_crew)
+
+
+class KeysetCursorTests(APITestCase):
+    def cursor(self, values, reverse=0):
+        payload = json.dumps({'v': values, 'r': reverse}).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def test_tampered_cursors_are_not_found(self):
+        client = self.client_for(self.manager)
+        for values in (['garbage', 'x'], [None, None], [{}, 1], ['2024-01-01T00:00:00+00:00', 2 ** 70], [1]):
+            for url in ('/api/orders?cursor={}', '/api/menu-items?cursor={}&ordering=price'):
+                with self.subTest(values=values, url=url):
+                    response = client.get(url.format(self.cursor(values)))
+                    self.assertEqual(response.status_code, 404)
+        self.assertEqual(client.get('/api/orders?cursor=not-base64!').status_code, 404)
+
+    def test_next_link_round_trips(self):
+        client = self.client_for(self.customer)
+        response = client.get('/api/menu-items?cursor=&perpage=4&ordering=price')
+        self.assertEqual(response.data['count'], 6)
+        following = client.get(response.data['next'])
+        self.assertEqual(following.status_code, 200)
+        self.assertEqual([item['id'] for item in following.data['results']], [item.pk for item in self.menuitems[4:]])
+
+
+class TokenCacheTests(APITestCase):
+    def entry(self, user):
+        return (0, [getattr(user, name) for name in USER_FIELDS], None, ())
+
+    def test_invalidating_a_user_drops_only_their_tokens(self):
+        cache = TokenCache(3)
+        for key, user in (('a', self.customer), ('b', self.customer), ('c', self.crew)):
+            cache.set(key, self.entry(user))
+        with mock.patch.object(cache, 'items', side_effect=AssertionError('scanned the cache')):
+            cache.pop_user(self.customer.pk)
+        self.assertEqual([key for key, _ in cache.items()], ['c'])
+        # evicted and popped keys leave the index too
+        for key in 'defg':
+            cache.set(key, self.entry(self.manager))
+        cache.pop('g')
+        self.assertEqual(cache.by_user, {self.manager.pk: {'e', 'f'}})
+
+    def test_login_drops_the_cached_snapshot(self):
+        client = self.client_for(self.customer)
+        client.get('/api/cart')
+        self.assertEqual(len(get_token_cache().by_user[self.customer.pk]), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save(update_fields=['last_login'])
+        self.assertNotIn(self.customer.pk, get_token_cache().by_user)
+
+
+class AsyncViewTests(APITestCase):
+    async def test_async_and_sync_paths_render_alike(self):
+        key = (await Token.objects.acreate(user=self.manager)).key
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        for url in ('/api/menu-items', f'/api/menu-items/{self.menuitems[0].pk}', '/api/category', '/api/orders'):
+            for accept in ('*/*', 'application/json', 'application/json; indent=4', 'text/html', 'application/xml'):
+                with self.subTest(url=url, accept=accept):
+                    response = await self.async_client.get(url, headers={'authorization': f'Token {key}', 'accept': accept})
+                    expected = await sync_to_async(client.get)(url, HTTP_ACCEPT=accept)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response['Content-Type'], expected['Content-Type'])
+                    if 'html' not in accept:
+                        self.assertEqual(response.content, expected.content)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def observed(self, name):
+        return [h for (metric, _), h in registry.histograms.items() if metric == name]
+
+    async def test_async_requests_count_queries(self):
+        key = (await Token.objects.acreate(user=self.customer)).key
+        response = await self.async_client.get('/api/menu-items', headers={'authorization': f'Token {key}'})
+        self.assertEqual(response.status_code, 200)
+        [queries] = self.observed('littlelemon_request_db_queries')
+        self.assertEqual(queries.count, 1)
+        self.assertGreater(queries.sum, 0)
+
+    def test_collect_drops_dead_workers_and_takes_max_gauges(self):
+        finished = subprocess.Popen([sys.executable, '-c', ''])
+        finished.wait()
+        live = os.getppid()
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            for pid, value in ((live, 5), (finished.pid, 7)):
+                with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+                    json.dump({'histograms': [], 'counters': [['requests', [], value]], 'gauges': [['pending', [], value]]}, f)
+            registry.inc('requests', 2)
+            registry.set('pending', 3)
+            histograms, counters, gauges = collect()
+            self.assertEqual(counters[('requests', ())], 7)
+            self.assertEqual(gauges[('pending', ())], 5)
+            self.assertEqual(os.listdir(directory), [f'metrics-{live}.json'])
+
+
+@override_settings(OUTBOX_RETRY_DELAY=5, OUTBOX_MAX_ATTEMPTS=3, OUTBOX_LEASE=300)
+class OutboxWorkerTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.start = timezone.now()
+        self.now = self.start
+        clock = mock.patch('django.utils.timezone.now', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.calls = []
+
+    def worker(self, batch_size=10):
+        worker = OutboxWorker(batch_size=batch_size, threads=2)
+        self.addCleanup(worker.executor.shutdown)
+        return worker
+
+    def subscribe(self, name, handler):
+        subscribe(name, handler)
+        self.addCleanup(unsubscribe, name, handler)
+
+    def at(self, seconds):
+        self.now = self.start + timedelta(seconds=seconds)
+
+    def gauge(self, name):
+        return registry.gauges[(name, ())]
+
+    def test_failures_back_off_then_die(self):
+        def succeeds(payload):
+            self.calls.append('succeeds')
+
+        def fails(payload):
+            self.calls.append('fails')
+            raise RuntimeError('mail server down')
+
+        self.subscribe('test_event', succeeds)
+        self.subscribe('test_event', fails)
+        emit('test_event', n=1)
+        worker = self.worker()
+        # due again after 5, 10 more, then dead on the third failure
+        for seconds, claimed, attempts in ((0, 1, 1), (4, 0, 1), (5, 1, 2), (14, 0, 2), (15, 1, 3), (10 ** 6, 0, 3)):
+            self.at(seconds)
+            with self.subTest(seconds=seconds):
+                self.assertEqual(worker.drain_batch(), claimed)
+                event = OutboxEvent.objects.get()
+                self.assertEqual(event.attempts, attempts)
+        self.assertTrue(event.dead)
+        self.assertIn('mail server down', event.last_error)
+        self.assertEqual(event.handled, [handler_name(succeeds)])
+        # the handler that succeeded isn't run again
+        self.assertEqual(self.calls, ['succeeds', 'fails', 'fails', 'fails'])
+        self.assertEqual(self.gauge('littlelemon_outbox_dead'), 1)
+        self.assertEqual(self.gauge('littlelemon_outbox_pending'), 0)
+        self.assertEqual(registry.counters[('littlelemon_outbox_events_total', (('event', 'test_event'), ('outcome', 'retry')))], 2)
+        self.assertEqual(registry.counters[('littlelemon_outbox_events_total', (('event', 'test_event'), ('outcome', 'dead')))], 1)
+
+    def test_an_expired_lease_is_claimed_again(self):
+        self.subscribe('test_event', self.calls.append)
+        emit('test_event', n=1)
+        # a worker claims the event and dies before recording anything
+        self.assertEqual(len(self.worker().claim()), 1)
+        other = self.worker()
+        self.at(299)
+        self.assertEqual(other.drain_batch(), 0)
+        self.at(300)
+        self.assertEqual(other.drain_batch(), 1)
+        self.assertEqual(self.calls, [{'n': 1}])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_handled_batches_are_deleted_and_the_gauges_follow(self):
+        self.subscribe('test_event', self.calls.append)
+        for n in range(3):
+            emit('test_event', n=n)
+        worker = self.worker(batch_size=2)
+        self.at(30)
+        self.assertEqual(worker.drain_batch(), 2)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+        self.assertEqual(self.gauge('littlelemon_outbox_pending'), 1)
+        self.assertEqual(self.gauge('littlelemon_outbox_saturated'), 1)
+        self.assertEqual(self.gauge('littlelemon_outbox_lag_seconds'), 30.0)
+        self.assertEqual(worker.drain_batch(), 1)
+        self.assertEqual(worker.drain_batch(), 0)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(sorted(payload['n'] for payload in self.calls), [0, 1, 2])
+        self.assertEqual(self.gauge('littlelemon_outbox_pending'), 0)
+        self.assertEqual(self.gauge('littlelemon_outbox_saturated'), 0)
+        self.assertEqual(self.gauge('littlelemon_outbox_lag_seconds'), 0.0)
+
+
+class RollupTests(APITestCase):
+    def handle_events(self):
+        for event in OutboxEvent.objects.order_by('pk'):
+            update_rollups(event.payload)
+        OutboxEvent.objects.all().delete()
+
+    def rollups(self):
+        # every column but the surrogate ids a backfill renumbers
+        tables = []
+        for model in ROLLUPS:
+            columns = [field.attname for field in model._meta.concrete_fields if field.name != 'id']
+            tables.append(list(model.objects.order_by(*columns).values(*columns)))
+        return tables, list(RolledUpOrder.objects.order_by('pk').values())
+
+    def place_orders(self, *carts):
+        orders = []
+        for lines in carts:
+            self.fill_cart(self.customer, lines)
+            orders.append(checkout(self.customer, lambda: self.crew.pk))
+        return orders
+
+    def test_live_rollups_match_a_backfill(self):
+        orders = self.place_orders(1, 3, 6)
+        set_crew_orders_status(self.crew, [orders[0].pk, orders[2].pk], True)
+        self.handle_events()
+        today = timezone.localdate()
+        live = report(today, today)
+        self.assertEqual(live['orders'], 3)
+        backfill()
+        self.assertEqual(report(today, today), live)
+
+    def test_deleted_and_edited_orders_leave_the_rollups(self):
+        orders = self.place_orders(1, 3, 6)
+        set_crew_orders_status(self.crew, [orders[0].pk, orders[2].pk], True)
+        self.handle_events()
+        other_crew = User.objects.create_user('other-crew')
+        orders[0].total += Decimal('5.00')
+        orders[0].delivery_crew = other_crew
+        orders[0].save()
+        response = self.client_for(self.manager).delete(f'/api/orders/{orders[2].pk}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(sorted(OutboxEvent.objects.values_list('name', flat=True)), ['order_changed', 'order_deleted'])
+        self.handle_events()
+        live = self.rollups()
+        today = timezone.localdate()
+        self.assertEqual(report(today, today)['orders'], 2)
+        self.assertEqual(report(today, today)['revenue'], str(orders[0].total + orders[1].total))
+        backfill()
+        self.assertEqual(self.rollups(), live)
+        # replaying the events changes nothing
+        update_rollups({'order_id': orders[0].pk})
+        update_rollups({'order_id': orders[2].pk})
+        self.assertEqual(self.rollups(), live)
+
+    def test_report_endpoint_validates_the_range(self):
+        self.place_orders(2)
+        self.handle_events()
+        client = self.client_for(self.manager)
+        today = timezone.localdate()
+        response = client.get('/api/reports')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['start'], response.data['end']), (today - timedelta(days=29), today))
+        self.assertEqual(response.data['orders'], 1)
+        for query in (f'start={today}&end={today - timedelta(days=1)}', 'start=yesterday', 'top=0'):
+            with self.subTest(query=query):
+                self.assertEqual(client.get(f'/api/reports?{query}').status_code, 400)
+        with self.settings(REPORT_MAX_DAYS=7):
+            self.assertEqual(client.get(f'/api/reports?start={today - timedelta(days=6)}&end={today}').status_code, 200)
+            response = client.get(f'/api/reports?start={today - timedelta(days=7)}&end={today}')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['non_field_errors'], ['Reports cover at most 7 days'])
+        self.assertEqual(self.client_for(self.customer).get('/api/reports').status_code, 403)
+
+
+class RendererTests(APITestCase):
+    def test_fast_renderer_and_parser_match_drf(self):
+        self.fill_cart(self.customer, 3)
+        checkout(self.customer, lambda: self.crew.pk)
+        payloads = [
+            MenuItemFastSerializer.serialize(MenuItems.objects.all()),
+            OrderFastSerializer.serialize(Order.objects.all()),
+            {'title': 'caf\u00e9 \u2028 \u2029', 'price': Decimal('1.50'), 'tags': [None, True, 2 ** 70 + 1, -2 ** 64 - 1]},
+        ]
+        for data in payloads:
+            body = JSONRenderer().render(data)
+            self.assertEqual(FastJSONRenderer().render(data), body)
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_the_parser_keeps_big_integers_exact(self):
+        for value in (2 ** 70 + 1, -2 ** 64 - 1, 10 ** 30 + 7):
+            with self.subTest(value=value):
+                parsed = FastJSONParser().parse(BytesIO(json.dumps({'quantity': value}).encode()))['quantity']
+                self.assertIs(type(parsed), int)
+                self.assertEqual(parsed, value)
+        # what orjson refuses is left to DRF, which accepts it or raises its own error
+        for body in (b'[1e400]', b'{"a": NaN}', b'{"a": '):
+            with self.subTest(body=body):
+                try:
+                    expected = JSONParser().parse(BytesIO(body))
+                except ParseError as exc:
+                    with self.assertRaisesMessage(ParseError, str(exc.detail)):
+                        FastJSONParser().parse(BytesIO(body))
+                else:
+                    self.assertEqual(FastJSONParser().parse(BytesIO(body)), expected)
+
+    def test_non_finite_decimals_are_refused_like_drf(self):
+        for value in (Decimal('NaN'), Decimal('Infinity'), Decimal('-Infinity')):
+            with self.subTest(value=value):
+                for renderer in (JSONRenderer(), FastJSONRenderer()):
+                    with self.assertRaisesMessage(ValueError, 'Out of range float values are not JSON compliant'):
+                        renderer.render({'total': value})
+
+
+class FastSerializerTests(APITestCase):
+    """The values() serializers must produce exactly what the DRF serializers do."""
+
+    def setUp(self):
+        super().setUp()
+        MenuItems.objects.create(title='Ünïcode \u2028 item', price=Decimal('0.05'), category=self.categories[0])
+        for menuitem in self.menuitems[:3]:
+            add_to_cart(self.customer, menuitem.pk, 3, menuitem.price)
+            add_to_cart(self.manager, menuitem.pk, 1, menuitem.price)
+        checkout(self.manager, lambda: self.crew.pk)
+        checkout(self.customer, lambda: self.crew.pk)
+        Order.objects.create(user=self.customer, delivery_crew=None, total=Decimal('1234.50'), status=True)
+        add_to_cart(self.customer, self.menuitems[4].pk, 2, self.menuitems[4].price)
+
+    def test_serializers(self):
+        for fast_serializer, queryset in (
+            (CategoryFastSerializer, Category.objects.order_by('pk')),
+            (MenuItemFastSerializer, MenuItems.objects.order_by('pk')),
+            (CartFastSerializer, Cart.objects.order_by('pk')),
+            (OrderFastSerializer, Order.objects.order_by('pk')),
+        ):
+            with self.subTest(fast_serializer.__name__):
+                expected = fast_serializer.serializer_class(queryset, many=True).data
+                self.assertEqual(fast_serializer.serialize(queryset), [dict(item) for item in expected])
+
+    def test_endpoints(self):
+        for user, url in (
+            (self.customer, '/api/menu-items'),
+            (self.customer, '/api/menu-items?perpage=50&featured=true'),
+            (self.customer, '/api/menu-items?cursor=&perpage=3'),
+            (self.customer, '/api/category'),
+            (self.customer, '/api/cart'),
+            (self.customer, '/api/orders'),
+            (self.crew, '/api/orders'),
+            (self.manager, '/api/orders?perpage=50'),
+            (self.manager, '/api/orders?cursor=&perpage=2'),
+        ):
+            with self.subTest(user=user.username, url=url):
+                responses = []
+                for fast in (False, True):
+                    get_menu_cache().clear()
+                    with self.settings(FAST_SERIALIZERS=fast):
+                        response = self.client_for(user).get(url)
+                    self.assertEqual(response.status_code, 200)
+                    responses.append(response.content)
+                self.assertEqual(responses[0], responses[1])
+
+
+class StreamingTests(APITestCase):
+    def stream(self, client, **headers):
+        response = client.get('/api/orders?stream=1', **headers)
+        size = rows = 0
+        for chunk in response.streaming_content:
+            size += len(chunk)
+            rows += chunk.count(b'"id":')
+        return size, rows
+
+    def test_streamed_export_memory_is_bounded(self):
+        client = self.client_for(self.manager)
+        # imports and first-request setup are not part of the export
+        self.stream(client)
+        orders = 100000
+        Order.objects.bulk_create(
+            (Order(user=self.customer, delivery_crew=self.crew, total=Decimal(i % 500) + Decimal('0.25')) for i in range(orders)),
+            batch_size=5000,
+        )
+        for headers in ({}, {'HTTP_ACCEPT': 'application/x-ndjson'}):
+            with self.subTest(**headers):
+                tracemalloc.start()
+                try:
+                    size, rows = self.stream(client, **headers)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertEqual(rows, orders)
+                # a few chunks of STREAM_CHUNK_SIZE rows at a time, never the whole body
+                self.assertLess(peak, size / 4)
+                self.assertLess(peak, 4 * 1024 * 1024)
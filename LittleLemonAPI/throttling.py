@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import throttling
+
+
+class SQLiteCounterStore:
+    """Fixed-window counters in a SQLite file shared by every worker on the host.
+
+    Each check is one UPSERT ... RETURNING on the key's row, which SQLite
+    applies atomically, so concurrent processes never lose an increment.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.checks = 0
+
+    def connection(self):
+        # sqlite connections must not cross a fork, so key them by pid
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = wal')
+            conn.execute('PRAGMA synchronous = off')    # losing counters in a crash is harmless
+            conn.execute('CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, expires INTEGER, count INTEGER) WITHOUT ROWID')
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def incr(self, key, expires):
+        conn = self.connection()
+        (count,), = conn.execute(
+            'INSERT INTO throttle (key, expires, count) VALUES (?, ?, 1) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'count = CASE WHEN expires = excluded.expires THEN count + 1 ELSE 1 END, '
+            'expires = excluded.expires '
+            'RETURNING count',
+            (key, expires),
+        ).fetchall()
+        self.checks += 1
+        if self.checks % 1000 == 0:
+            conn.execute('DELETE FROM throttle WHERE expires < ?', (int(time.time()),))
+        return count
+
+    async def aincr(self, key, expires):
+        # the write can wait up to the busy timeout behind other workers, so it runs
+        # in a worker thread (with its own connection) rather than on the event loop
+        return await sync_to_async(self.incr, thread_sensitive=False)(key, expires)
+
+
+class CacheCounterStore:
+    """Fixed-window counters in a CACHES alias; shared when the cache is (redis, memcached, database)."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def incr(self, key, expires):
+        key = f'{key}:{expires}'
+        timeout = max(expires - int(time.time()), 1)
+        if self.cache.add(key, 1, timeout):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # expired between add() and incr()
+            self.cache.add(key, 1, timeout)
+            return 1
+
+    async def aincr(self, key, expires):
+        key = f'{key}:{expires}'
+        timeout = max(expires - int(time.time()), 1)
+        if await self.cache.aadd(key, 1, timeout):
+            return 1
+        try:
+            return await self.cache.aincr(key)
+        except ValueError:
+            await self.cache.aadd(key, 1, timeout)
+            return 1
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_counter_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = getattr(settings, 'THROTTLE_STORE', {})
+                if options.get('BACKEND', 'sqlite') == 'sqlite':
+                    _store = SQLiteCounterStore(options.get('PATH', settings.BASE_DIR / 'throttle.sqlite3'))
+                else:
+                    _store = CacheCounterStore(options['BACKEND'])
+    return _store
+
+
+class FixedWindowThrottleMixin:
+    """SimpleRateThrottle with one shared counter per client and window.
+
+    DRF's throttles keep a list of request timestamps per client in the
+    default cache and rewrite it on every request; here a check is a single
+    atomic increment.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        now = int(time.time())
+        self.expires = now - now % self.duration + self.duration
+        return get_counter_store().incr(self.key, self.expires) <= self.num_requests
+
+    async def aallow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        now = int(time.time())
+        self.expires = now - now % self.duration + self.duration
+        return await get_counter_store().aincr(self.key, self.expires) <= self.num_requests
+
+    def wait(self):
+        return max(self.expires - time.time(), 0)
+
+
+class AnonRateThrottle(FixedWindowThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(FixedWindowThrottleMixin, throttling.UserRateThrottle):
+    pass
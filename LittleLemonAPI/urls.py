@@ -7,8 +7,12 @@ urlpatterns = [
     path('menu-items', views.MenuItemsView.as_view()),
     path('menu-items/<int:pk>', views.SingleItemView.as_view()),
     path('cart', views.CartView.as_view()),
+    path('cart/summary', views.CartSummaryView.as_view()),
     path('orders', views.OrdersView.as_view()),
+    path('orders/queue', views.CrewQueueView.as_view()),
     path('orders/<int:pk>', views.OrderItemView.as_view()),
     path('groups/<str:group_name>/users', views.GroupView.as_view()),
     path('groups/<str:group_name>/users/<int:pk>', views.SingleGroupView.as_view()),
+    path('reports', views.ReportView.as_view()),
+    path('metrics', views.MetricsView.as_view()),
 ]
\ No newline at end of file
@@ -1,16 +1,33 @@
 from django_filters import rest_framework as filters
 from rest_framework import generics, status
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
-from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth.models import User
-import random
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse
 from .models import Category, MenuItems, Cart, Order, OrderItem
-from .serializers import CategorySerializer, MenuItemSerializer, OrderSerializer, CartSerializer, UserSerializer
-from .pagination import CustomPagination
-from .permissions import IsManager
+from .serializers import CategorySerializer, MenuItemSerializer, OrderSerializer, CartSerializer, CartSummarySerializer, CrewStatusSerializer, OrderDetailSerializer, ReportQuerySerializer, UserSerializer
+from .pagination import CustomPagination, KeysetPaginationMixin, MenuItemKeysetPagination, OrderKeysetPagination
+from .permissions import IsDeliveryCrew, IsManager
+from .throttling import AnonRateThrottle, UserRateThrottle
+from .roles import MANAGER, DELIVERY_CREW, get_stored_roles, is_manager, is_delivery_crew
 from .filters import MenuItemFilter
+from .search import MenuSearchFilter, search_truncated
+from .cart import add_to_cart, apply_cart_operations, clear_cart_summary, get_cart_summary, parse_cart_operations
+from .checkout import CheckoutError, checkout
+from .dispatch import get_dispatcher
+from .events import emit, emit_many
+from .idempotency import idempotent
+from .menu_cache import cached_response, get_menu_prices
+from .metrics import render_prometheus
+from .rollups import report
+from .fast_serializers import CartFastSerializer, FastListMixin, MenuItemFastSerializer, OrderFastSerializer
+from .renderers import NDJSONRenderer
+from .streaming import stream_response, wants_stream
 
 # GET: list (multiple objects) / retrieve (single object)
 # POST: create
@@ -25,9 +42,9 @@ class CategoryView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPagination
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return cached_response(request, super().list, *args, **kwargs)
     def create(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists() or request.user.is_superuser:
+        if is_manager(request.user) or request.user.is_superuser:
             return super().create(request, *args, **kwargs)
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
     
@@ -39,67 +56,88 @@ class SingleCategoryView(generics.RetrieveUpdateDestroyAPIView):
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
     def destroy(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             return super().destroy(request, *args, **kwargs)
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
 
-class MenuItemsView(generics.ListCreateAPIView):
-    queryset = MenuItems.objects.all()
+class MenuItemsView(KeysetPaginationMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = MenuItems.objects.prefetch_related('category')    # one category query per page
     serializer_class = MenuItemSerializer   
     filterset_class = MenuItemFilter
-    filter_backends = [filters.DjangoFilterBackend, SearchFilter]
-    search_fields = ['title', 'category__title']    # /menu-items?search=desert
+    filter_backends = [filters.DjangoFilterBackend, MenuSearchFilter]    # /menu-items?search=desert
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPagination
+    keyset_pagination_class = MenuItemKeysetPagination    # /menu-items?cursor=
+    fast_serializer_class = MenuItemFastSerializer
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return cached_response(request, self.list_items, *args, **kwargs)
+
+    def list_items(self, request, *args, **kwargs):
+        if self.use_fast_serializer():
+            response = self.fast_list(self.filter_queryset(self.get_queryset()))
+        else:
+            response = super().list(request, *args, **kwargs)
+        # searches stop at SEARCH_MAX_RESULTS; `count` is what can be paged through
+        truncated = search_truncated(request)
+        if truncated is not None:
+            response.data['truncated'] = truncated
+        return response
 
     def create(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             #create the item and return 201 created
             return super().create(request, *args, **kwargs)
         #return 403 unauthorized
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
 
 class SingleItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItems.objects.all()
+    queryset = MenuItems.objects.select_related('category')
     serializer_class = MenuItemSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
     permission_classes = [IsAuthenticated]
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        return cached_response(request, super().retrieve, *args, **kwargs)
     def update(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             return super().update(request, *args, **kwargs)
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
     def partial_update(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             return super().partial_update(request, *args, **kwargs)
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
     def destroy(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             return super().destroy(request, *args, **kwargs)
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
 
-class CartView(generics.ListCreateAPIView, generics.DestroyAPIView):
+class CartView(FastListMixin, generics.ListCreateAPIView, generics.DestroyAPIView):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+    fast_serializer_class = CartFastSerializer
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        if wants_stream(request):
+            return stream_response(request, queryset, CartFastSerializer)
+        if self.use_fast_serializer():
+            return Response(CartFastSerializer.serialize(queryset))
         serializer = CartSerializer(queryset, many=True)
         return Response(serializer.data)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.create_batch(request)
         menuitem_id = request.data.get('menuitem')
         if not menuitem_id:
             return Response({'detail': 'Menu item is required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            menuitem = MenuItems.objects.get(pk=menuitem_id)
-        except MenuItems.DoesNotExist:
+            unit_price = get_menu_prices()[int(menuitem_id)]
+        except (KeyError, TypeError, ValueError):
             return Response({'detail': 'The menu item you are looking for does not exist'}, status=status.HTTP_404_NOT_FOUND)
         
         quantity = request.data.get('quantity', 1)
@@ -110,42 +148,56 @@ class CartView(generics.ListCreateAPIView, generics.DestroyAPIView):
         if quantity < 1:
             return Response({'detail': 'Must be at least 1 item to add to cart'}, status=status.HTTP_400_BAD_REQUEST)
 
-        unit_price = menuitem.price
-
-        try:
-            cart_item = Cart.objects.get(user=request.user, menuitem=menuitem)
-            cart_item.quantity += quantity
-            cart_item.price = int(cart_item.quantity)*unit_price
-            cart_item.save()
-            created = False
-        except Cart.DoesNotExist:
-            cart_item = Cart.objects.create(
-                user=request.user,
-                menuitem=menuitem,
-                quantity=quantity,
-                unit_price=unit_price,
-                price=quantity * unit_price
-            )
-            created = True
+        cart_item, created = add_to_cart(request.user, int(menuitem_id), quantity, unit_price)
         serializer = CartSerializer(cart_item)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+    def create_batch(self, request):
+        # POST [{"menuitem": 1, "quantity": 2}, {"menuitem": 3, "op": "remove"}, ...]
+        max_operations = getattr(settings, 'CART_MAX_OPERATIONS', 100)
+        if len(request.data) > max_operations:
+            return Response({'detail': f'At most {max_operations} cart operations per request'}, status=status.HTTP_400_BAD_REQUEST)
+        prices = get_menu_prices()
+        operations, errors = parse_cart_operations(request.data, prices)
+        if errors:
+            return Response({'detail': 'Invalid cart operations', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        apply_cart_operations(request.user, operations, prices)
+        serializer = CartSerializer(Cart.objects.filter(user=request.user), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def destroy(self, request, *args, **kwargs):
         cart_items = Cart.objects.filter(user=request.user)
-        cart_items.delete()
+        with transaction.atomic():
+            cart_items.delete()
+            clear_cart_summary(request.user)
         return Response({'detail': 'Cart has been emptied'}, status=status.HTTP_204_NO_CONTENT)
 
+class CartSummaryView(APIView):
+    throttle_classes = [AnonRateThrottle, UserRateThrottle]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = CartSummarySerializer(get_cart_summary(request.user))
+        return Response(serializer.data)
+
 class OrderFilter(filters.FilterSet):
     status = filters.CharFilter(method='filter_by_status')
     def filter_by_status(self, queryset, name, value):
         status_map = {'pending': 0, 'delivered': 1}
-        return queryset.filter(status=status_map[value])
+        return queryset.filter(status__eq=status_map[value])
 
     class Meta:
         model = Order
         fields = ['user', 'delivery_crew', 'total', 'date', 'status']
 
-class OrdersView(generics.ListCreateAPIView):
+def with_items(orders):
+    # every order's lines and their menu items in one extra query, for OrderDetailSerializer
+    return orders.prefetch_related(Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('menuitem').order_by('id')))
+
+def expands_items(request):
+    return 'items' in request.query_params.get('expand', '').split(',')
+
+class OrdersView(KeysetPaginationMixin, FastListMixin, generics.ListCreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
@@ -153,71 +205,155 @@ class OrdersView(generics.ListCreateAPIView):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
     permission_classes = [IsAuthenticated]
     pagination_class = CustomPagination
+    keyset_pagination_class = OrderKeysetPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+    fast_serializer_class = OrderFastSerializer
+
+    # ?expand=items nests each order's lines, prefetched for the whole page;
+    # the values() serializers and NDJSON exports stay flat
+    def use_fast_serializer(self):
+        return super().use_fast_serializer() and not expands_items(self.request)
+
+    def get_queryset(self):
+        orders = super().get_queryset()
+        return with_items(orders) if expands_items(self.request) else orders
+
+    def get_serializer_class(self):
+        return OrderDetailSerializer if expands_items(self.request) else OrderSerializer
 
     def list(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        fast = self.use_fast_serializer()
+        if is_manager(request.user):
+            if wants_stream(request):
+                # exports skip pagination entirely
+                return stream_response(request, self.filter_queryset(self.get_queryset()), OrderFastSerializer)
+            if fast:
+                return self.fast_list(self.filter_queryset(self.get_queryset()))
             return super().list(request, *args, **kwargs)
-        elif request.user.groups.filter(name='Delivery crew').exists():
-            orders = Order.objects.filter(delivery_crew=request.user)
+        elif is_delivery_crew(request.user):
+            orders = Order.objects.filter(delivery_crew=request.user).order_by('-date', '-id')
         else:
-            orders = Order.objects.filter(user=request.user)
-        serializer = OrderSerializer(orders, many=True)
+            orders = Order.objects.filter(user=request.user).order_by('-date', '-id')
+        if wants_stream(request):
+            return stream_response(request, orders, OrderFastSerializer)
+        if fast:
+            return Response(OrderFastSerializer.serialize(orders))
+        if expands_items(request):
+            orders = with_items(orders)
+        serializer = self.get_serializer(orders, many=True)
         return Response(serializer.data)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
-        # get current cart items
-        cart_items = Cart.objects.filter(user=request.user)
-        if not cart_items.exists():
-            return Response({'detail': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        total_price = sum(int(item.quantity)*item.price for item in cart_items)
-
-        delivery_crew_members = User.objects.filter(groups__name='Delivery crew')
-        if not delivery_crew_members.exists():
-            return Response({'detail': 'No delivery crew available'}, status=status.HTTP_400_BAD_REQUEST)
-        delivery_crew = random.choice(delivery_crew_members)
-        order = Order.objects.create(
-            user=request.user,
-            status=0,
-            delivery_crew=delivery_crew,
-            total=total_price
-        )
-
-        #add cart items to order table
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                menuitem=item.menuitem,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                price=item.quantity*item.price
-            )
-        cart_items.delete()
+        try:
+            order = checkout(request.user, get_dispatcher().assign)
+        except CheckoutError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+def emit_status_change(order, previous_status):
+    current = Order._meta.get_field('status').to_python(order.status)
+    if current != previous_status:
+        emit('order_status_changed', order_id=order.pk, status=current, previous_status=previous_status,
+             delivery_crew_id=order.delivery_crew_id)
+
+def save_order(order, previous_status):
+    # the status event commits together with the order row
+    with transaction.atomic():
+        order.save()
+        emit_status_change(order, previous_status)
+
+def set_crew_orders_status(crew, order_ids, new_status):
+    """Move the crew member's orders among `order_ids` to `new_status` with one UPDATE.
+
+    queryset.update() skips the post_save handlers, so the status events and
+    the dispatcher's pending counts are taken care of here. Returns the ids
+    that changed; ids that aren't the crew's or already have the status are left alone.
+    """
+    with transaction.atomic():
+        orders = Order.objects.filter(pk__in=order_ids, delivery_crew=crew, status__eq=not new_status)
+        if connection.features.has_select_for_update:
+            orders = orders.select_for_update()
+        changed = sorted(orders.values_list('pk', flat=True))
+        if not changed:
+            return []
+        Order.objects.filter(pk__in=changed).update(status=new_status)
+        emit_many('order_status_changed', (
+            {'order_id': pk, 'status': new_status, 'previous_status': not new_status, 'delivery_crew_id': crew.pk}
+            for pk in changed
+        ))
+
+        def apply():
+            dispatcher = get_dispatcher()
+            for _ in changed:
+                if new_status:
+                    dispatcher.order_released(crew.pk)
+                else:
+                    dispatcher.order_assigned(crew.pk)
+        transaction.on_commit(apply)
+    return changed
+
+
+class CrewQueueView(generics.ListAPIView):
+    # a delivery crew member's pending orders, oldest first, with their lines;
+    # POST sets the status of several of them at once
+    serializer_class = OrderDetailSerializer
+    permission_classes = [IsAuthenticated, IsDeliveryCrew]
+    throttle_classes = [AnonRateThrottle, UserRateThrottle]
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        # served by order_crew_status_date_idx, no sort step
+        return with_items(Order.objects.filter(delivery_crew=self.request.user, status__eq=False).order_by('date', 'id'))
+
+    def post(self, request, *args, **kwargs):
+        params = CrewStatusSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        order_ids, new_status = params.validated_data['orders'], params.validated_data['status']
+        updated = set_crew_orders_status(request.user, order_ids, new_status)
+        unchanged = sorted(set(order_ids).difference(updated))
+        return Response({'status': new_status, 'updated': updated, 'unchanged': unchanged})
+
+
 class OrderItemView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
+    def get_queryset(self):
+        # reads get the order and its lines in two queries
+        if self.request.method in ('GET', 'HEAD'):
+            return with_items(Order.objects.all())
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        return OrderDetailSerializer if self.request.method in ('GET', 'HEAD') else OrderSerializer
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.user == request.user:
-            return super().retrieve(request, *args, **kwargs)
+        if instance.user_id == request.user.pk:
+            return Response(self.get_serializer(instance).data)
         return Response({'detail': 'This is not your order'}, status=status.HTTP_403_FORBIDDEN)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.user == request.user:
+        if instance.user_id == request.user.pk:
             return super().partial_update(request, *args, **kwargs)
         return Response({'detail': 'This is not your order'}, status=status.HTTP_403_FORBIDDEN)
 
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        with transaction.atomic():
+            emit_status_change(serializer.save(), previous_status)
+
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
+        previous_status = instance.status
 
         # manager can update delivery crew and status
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             delivery_crew = request.data.get('delivery_crew')
             status = request.data.get('status')
 
@@ -227,26 +363,26 @@ class OrderItemView(generics.RetrieveUpdateDestroyAPIView):
                 instance.status = status
 
             if delivery_crew is not None or status is not None:
-                instance.save()
+                save_order(instance, previous_status)
                 return Response(self.get_serializer(instance).data)
             return Response({'detail': 'Please update the delivery crew or status.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # allow delivery crew to update status only
-        if request.user.groups.filter(name='Delivery crew').exists():
+        if is_delivery_crew(request.user):
             status = request.data.get('status')
             if status is not None:
                 instance.status = status    # access the instance object and update the status
-                instance.save() # save the instance
+                save_order(instance, previous_status) # save the instance
                 return Response(self.get_serializer(instance).data)   # serialize and return the updated instance
             return Response({'detail': 'Please update the status.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # user can update their order
-        if instance.user == request.user:
+        if instance.user_id == request.user.pk:
             return super().partial_update(request, *args, **kwargs)
         return Response({'detail': 'This is not your order'}, status=status.HTTP_403_FORBIDDEN)
 
     def destroy(self, request, *args, **kwargs):
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             return super().destroy(request, *args, **kwargs)
         return Response({'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN)
 
@@ -261,11 +397,11 @@ class GroupView(generics.ListCreateAPIView):
     def list(self, request, *args, **kwargs):
         group_name = self.kwargs.get('group_name')
         if group_name == 'delivery-crew':
-            all_delivery_crew = User.objects.filter(groups__name='Delivery crew')
+            all_delivery_crew = User.objects.filter(groups__name=DELIVERY_CREW)
             serializer = UserSerializer(all_delivery_crew, many=True)
             return Response(serializer.data)
         elif group_name == 'manager':
-            all_managers = User.objects.filter(groups__name='Manager')
+            all_managers = User.objects.filter(groups__name=MANAGER)
             serializer = UserSerializer(all_managers, many=True)
             return Response(serializer.data)
         return Response({'detail': 'You can only list delivery-crew or manager groups.'}, status=status.HTTP_404_NOT_FOUND)
@@ -273,21 +409,23 @@ class GroupView(generics.ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         group_name = self.kwargs.get('group_name')
         user = User.objects.get(pk=request.data.get('user'))
+        # membership changes invalidate the role cache through the m2m_changed signal
+        roles = get_stored_roles(user)
         if group_name == 'delivery-crew':
-            if user.groups.filter(name='Delivery crew').exists():
+            if DELIVERY_CREW in roles:
                 return Response({'detail': 'User is already in delivery crew'}, status=status.HTTP_200_OK)
             user.groups.add(2)
 
             # remove user from manager group if they are in it
-            if user.groups.filter(name='Manager').exists():
+            if MANAGER in roles:
                 user.groups.remove(1)
             return Response({'detail': 'User added to delivery crew'}, status=status.HTTP_201_CREATED)
         elif group_name == 'manager':
-            if user.groups.filter(name='Manager').exists():
+            if MANAGER in roles:
                 return Response({'detail': 'User is already manager'}, status=status.HTTP_200_OK)
             user.groups.add(1)
 
-            if user.groups.filter(name='Delivery crew').exists():
+            if DELIVERY_CREW in roles:
                 user.groups.remove(2)
             return Response({'detail': 'User added to manager group'}, status=status.HTTP_201_CREATED)
         return Response({'detail': 'You can only add user to delivery-crew or manager groups.'}, status=status.HTTP_404_NOT_FOUND)
@@ -301,14 +439,31 @@ class SingleGroupView(generics.DestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         group_name = self.kwargs.get('group_name')
         user = self.get_object()
+        roles = get_stored_roles(user)
         if group_name == 'delivery-crew':
-            if user.groups.filter(name='Delivery crew').exists():
+            if DELIVERY_CREW in roles:
                 user.groups.remove(2)
                 return Response({'detail': 'User removed from delivery crew'}, status=status.HTTP_200_OK)
             return Response({'detail': 'User is not in delivery crew'}, status=status.HTTP_404_NOT_FOUND)
         elif group_name == 'manager':
-            if user.groups.filter(name='Manager').exists():
+            if MANAGER in roles:
                 user.groups.remove(1)
                 return Response({'detail': 'User removed from manager group'}, status=status.HTTP_200_OK)
             return Response({'detail': 'User is not manager'}, status=status.HTTP_404_NOT_FOUND)
-        return Response({'detail': 'You can only remove user from delivery-crew or manager groups.'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        return Response({'detail': 'You can only remove user from delivery-crew or manager groups.'}, status=status.HTTP_404_NOT_FOUND)
+
+class ReportView(APIView):
+    # sales, menu and delivery totals from the daily rollups; no order table is read
+    throttle_classes = [AnonRateThrottle, UserRateThrottle]
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request, *args, **kwargs):
+        params = ReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(report(**params.validated_data))
+
+class MetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1 @@
+"""Micro benchmarks and load tests, run through `manage.py microbench` and `manage.py loadbench`."""
@@ -0,0 +1,823 @@
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from LittleLemonAPI.models import Category, MenuItems, Cart, Order, OrderItem
+
+BENCHMARKS = {}
+
+
+def benchmark(name, on_disk=False):
+    def register(func):
+        func.on_disk = on_disk
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+@contextmanager
+def benchmark_database(verbosity=0, on_disk=False):
+    # a throwaway test database, so benchmarks never write to db.sqlite3;
+    # on_disk gives concurrent writers a real file instead of shared memory
+    setup_test_environment()
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        test_settings['NAME'] = old_test_name
+        teardown_test_environment()
+
+
+@contextmanager
+def unthrottled():
+    # benchmarks fire far more than the configured 5/minute
+    from rest_framework.throttling import SimpleRateThrottle
+    rates = SimpleRateThrottle.THROTTLE_RATES
+    SimpleRateThrottle.THROTTLE_RATES = {scope: None for scope in rates}
+    try:
+        yield
+    finally:
+        SimpleRateThrottle.THROTTLE_RATES = rates
+
+
+@contextmanager
+def generous_throttles():
+    # throttles still checked, one counter increment per scope and request, but never
+    # tripped, against a throwaway counter file
+    from rest_framework.throttling import SimpleRateThrottle
+    from LittleLemonAPI import throttling
+    rates, store = SimpleRateThrottle.THROTTLE_RATES, throttling._store
+    SimpleRateThrottle.THROTTLE_RATES = {scope: '1000000/minute' for scope in rates}
+    throttling._store = throttling.SQLiteCounterStore(os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3'))
+    try:
+        yield
+    finally:
+        SimpleRateThrottle.THROTTLE_RATES, throttling._store = rates, store
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def seed_menu(categories=10, items=100):
+    Category.objects.bulk_create(
+        Category(title=f'category {i}', slug=f'category-{i}') for i in range(categories)
+    )
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+    MenuItems.objects.bulk_create(
+        (MenuItems(
+            title=f'item {i}',
+            price=Decimal(random.randrange(100, 5000)) / 100,
+            featured=i % 7 == 0,
+            category_id=category_ids[i % len(category_ids)],
+        ) for i in range(items)),
+        batch_size=1000,
+    )
+
+
+def seed_users(prefix, count):
+    User.objects.bulk_create(User(username=f'{prefix}{i}') for i in range(count))
+    return list(User.objects.filter(username__startswith=prefix).values_list('pk', flat=True))
+
+
+def seed_carts(user_ids, lines=5):
+    menuitems = list(MenuItems.objects.values_list('pk', 'price')[:lines])
+    Cart.objects.bulk_create(
+        (Cart(user_id=user_id, menuitem_id=pk, quantity=2, unit_price=price, price=2 * price)
+         for user_id in user_ids for pk, price in menuitems),
+        batch_size=1000,
+    )
+
+
+def seed_orders(user_ids, crew_ids, count):
+    Order.objects.bulk_create(
+        (Order(
+            user_id=user_ids[i % len(user_ids)],
+            delivery_crew_id=crew_ids[i % len(crew_ids)] if crew_ids else None,
+            status=i % 3 == 0,
+            total=Decimal(random.randrange(100, 50000)) / 100,
+        ) for i in range(count)),
+        batch_size=1000,
+    )
+
+
+@benchmark('serializers')
+def serializers_benchmark(rows=10000, repeat=3, **options):
+    """DRF ModelSerializer against the values() fast serializers."""
+    from LittleLemonAPI.fast_serializers import CartFastSerializer, MenuItemFastSerializer, OrderFastSerializer
+    from LittleLemonAPI.serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+
+    seed_menu(categories=20, items=rows)
+    users = seed_users('bench-user-', max(rows // 5, 1))
+    crew = seed_users('bench-crew-', 5)
+    seed_carts(users, lines=5)
+    seed_orders(users, crew, rows)
+
+    cases = [
+        ('menu-items', MenuItems.objects.prefetch_related('category'), MenuItemSerializer, MenuItemFastSerializer),
+        ('cart', Cart.objects.all(), CartSerializer, CartFastSerializer),
+        ('orders', Order.objects.all(), OrderSerializer, OrderFastSerializer),
+    ]
+    results = []
+    for name, queryset, serializer_class, fast_class in cases:
+        count = queryset.count()
+        slow = timed(lambda: serializer_class(queryset.all(), many=True).data, repeat)
+        fast = timed(lambda: fast_class.serialize(queryset.all()), repeat)
+        results.append((f'{name} ModelSerializer', count / slow, 'objects/s'))
+        results.append((f'{name} FastSerializer', count / fast, 'objects/s'))
+    return results
+
+
+@benchmark('pagination')
+def pagination_benchmark(rows=100000, repeat=3, **options):
+    """First and last page of the order history, OFFSET against keyset."""
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonAPI.pagination import CustomPagination, OrderKeysetPagination
+
+    users = seed_users('bench-user-', 100)
+    seed_orders(users, [], rows)
+    queryset = Order.objects.order_by('-date', '-id')
+    factory = APIRequestFactory()
+    page_size = CustomPagination.page_size
+    last_page = (rows + page_size - 1) // page_size
+
+    def offset_page(number):
+        request = Request(factory.get('/api/orders', {'page': number}))
+        return lambda: list(CustomPagination().paginate_queryset(queryset, request))
+
+    def keyset_page(position):
+        paginator = OrderKeysetPagination()
+        cursor = '' if position is None else paginator.encode_cursor(position, False)
+        params = {'cursor': cursor, 'count': 'none'}
+        request = Request(factory.get('/api/orders', params))
+        return lambda: paginator.paginate_queryset(Order.objects.all(), request)
+
+    deep = queryset.values_list('date', 'id')[(last_page - 1) * page_size - 1]
+    return [
+        ('offset page 1', timed(offset_page(1), repeat) * 1000, 'ms'),
+        (f'offset page {last_page}', timed(offset_page(last_page), repeat) * 1000, 'ms'),
+        ('keyset page 1', timed(keyset_page(None), repeat) * 1000, 'ms'),
+        (f'keyset page {last_page}', timed(keyset_page(deep), repeat) * 1000, 'ms'),
+    ]
+
+
+@benchmark('metrics')
+def metrics_benchmark(rows=2000, repeat=3, **options):
+    """Request throughput with MetricsMiddleware installed and removed."""
+    from django.test import modify_settings
+    from rest_framework.test import APIClient
+    from LittleLemonAPI.metrics import registry
+
+    seed_menu(categories=5, items=50)
+    user = User.objects.create(username='bench-manager')
+    results = []
+    for label, change in (('with', {}), ('without', {'remove': 'LittleLemonAPI.middleware.MetricsMiddleware'})):
+        with modify_settings(MIDDLEWARE=change), unthrottled():
+            client = APIClient()
+            client.force_authenticate(user)
+            client.get('/api/menu-items')
+            elapsed = timed(lambda: [client.get('/api/menu-items') for _ in range(rows)], repeat)
+        results.append((f'menu-items {label} MetricsMiddleware', rows / elapsed, 'requests/s'))
+    registry.reset()
+    return results
+
+
+DISHES = ['pizza', 'pasta', 'salad', 'soup', 'burger', 'risotto', 'lasagna', 'tiramisu', 'bruschetta', 'gelato']
+STYLES = ['greek', 'spicy', 'classic', 'lemon', 'garlic', 'truffle', 'vegan', 'smoked', 'house', 'grilled']
+
+
+@benchmark('search')
+def search_benchmark(rows=100000, repeat=3, **options):
+    """?search= through SearchFilter's icontains scan against the menu search index."""
+    from rest_framework.filters import SearchFilter
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonAPI.menu_cache import bump_menu_version
+    from LittleLemonAPI.search import MenuSearchFilter, get_search_index
+
+    Category.objects.bulk_create(Category(title=f'{dish} corner', slug=f'{dish}-corner') for dish in DISHES)
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+    MenuItems.objects.bulk_create(
+        (MenuItems(
+            title=f'{STYLES[i % 10]} {DISHES[i // 10 % 10]} {i}',
+            price=Decimal(random.randrange(100, 5000)) / 100,
+            category_id=category_ids[i // 100 % len(category_ids)],
+        ) for i in range(rows)),
+        batch_size=1000,
+    )
+    bump_menu_version()
+    factory = APIRequestFactory()
+
+    class View:
+        search_fields = ['title', 'category__title']
+
+    def run(backend, query):
+        # what a paginated list does: COUNT(*) plus the first page
+        request = Request(factory.get('/api/menu-items', {'search': query}))
+
+        def page():
+            queryset = backend().filter_queryset(request, MenuItems.objects.order_by('pk'), View)
+            return queryset.count(), list(queryset[:4].values_list('pk'))
+        return page
+
+    index = get_search_index()
+    build = timed(lambda: index.build(index.version), 1)
+    results = [('index build', build * 1000, 'ms')]
+    for query in ('lasagna', 'truff', 'grilled pizza', 'tiramsu'):
+        results.append((f'SearchFilter "{query}"', timed(run(SearchFilter, query), repeat) * 1000, 'ms'))
+        results.append((f'MenuSearchFilter "{query}"', timed(run(MenuSearchFilter, query), repeat) * 1000, 'ms'))
+    return results
+
+
+@benchmark('checkout', on_disk=True)
+def checkout_benchmark(rows=400, repeat=1, threads=8, **options):
+    """Concurrent add-to-cart + checkout writers under different SQLite/connection profiles."""
+    from django.contrib.auth.models import Group
+    from django.test import override_settings
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+    from LittleLemonAPI.roles import DELIVERY_CREW
+
+    seed_menu(categories=5, items=50)
+    customers = seed_users('bench-customer-', threads)
+    Group.objects.create(name=DELIVERY_CREW).user_set.add(*seed_users('bench-crew-', 5))
+    tokens = {user_id: Token.objects.create(user_id=user_id).key for user_id in customers}
+    menuitems = list(MenuItems.objects.values_list('pk', flat=True))
+    rollback = {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': 5000}
+    wal = {'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 5000}
+    # (label, pragmas, transaction mode, CONN_MAX_AGE); the first is the old default setup
+    profiles = [
+        ('rollback journal, deferred', rollback, None, 0),
+        ('WAL, deferred', wal, None, 0),
+        ('WAL, immediate', wal, 'IMMEDIATE', 0),
+        ('WAL, immediate, persistent', wal, 'IMMEDIATE', 60),
+    ]
+    per_thread = max(rows // threads, 1)
+
+    def worker(token, failures):
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        try:
+            for i in range(per_thread):
+                client.post('/api/cart', {'menuitem': menuitems[i % len(menuitems)], 'quantity': 1}, format='json')
+                if client.post('/api/orders').status_code != 201:
+                    failures.append(1)
+        finally:
+            connections['default'].close()
+
+    # the deferred profiles fail with "database is locked"; count those instead of logging them
+    logger = logging.getLogger('django.request')
+    level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    results = []
+    database = connections.settings['default']
+    conn_max_age, options = database['CONN_MAX_AGE'], database['OPTIONS']
+    try:
+        for label, pragmas, transaction_mode, max_age in profiles:
+            database['CONN_MAX_AGE'] = max_age
+            database['OPTIONS'] = {**options, 'transaction_mode': transaction_mode}
+            connection.close()
+            with override_settings(SQLITE_PRAGMAS=pragmas), unthrottled():
+                failures = []
+                workers = [threading.Thread(target=worker, args=(tokens[pk], failures)) for pk in customers]
+                start = time.perf_counter()
+                for thread in workers:
+                    thread.start()
+                for thread in workers:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+            results.append((label, (per_thread * threads - len(failures)) / elapsed, 'checkouts/s'))
+            results.append((f'{label} failures', len(failures), 'checkouts'))
+    finally:
+        database['CONN_MAX_AGE'], database['OPTIONS'] = conn_max_age, options
+        connection.close()
+        logger.setLevel(level)
+    return results
+
+
+def _throttle_worker(throttle_class, user_id, checks, results):
+    from types import SimpleNamespace
+    request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=user_id))
+    start = time.perf_counter()
+    allowed = sum(throttle_class().allow_request(request, None) for _ in range(checks))
+    results.put((allowed, time.perf_counter() - start))
+
+
+@benchmark('throttle')
+def throttle_benchmark(rows=20000, repeat=1, threads=4, **options):
+    """Requests let through by `threads` worker processes sharing one user limit."""
+    import multiprocessing
+    from rest_framework import throttling as drf_throttling
+    from LittleLemonAPI import throttling
+
+    limit = rows // 4
+    context = multiprocessing.get_context('fork')
+    results = []
+    original_store = throttling._store
+    throttling._store = throttling.SQLiteCounterStore(os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3'))
+    try:
+        for label, base in (('DRF history', drf_throttling.UserRateThrottle),
+                            ('fixed window', throttling.UserRateThrottle)):
+            throttle_class = type('BenchThrottle', (base,), {'rate': f'{limit}/hour', 'scope': 'bench'})
+            queue = context.Queue()
+            user_id = random.randrange(10**9)
+            workers = [context.Process(target=_throttle_worker, args=(throttle_class, user_id, rows // threads, queue))
+                       for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            outcomes = [queue.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            allowed = sum(count for count, _ in outcomes)
+            rate = sum(rows // threads / elapsed for _, elapsed in outcomes)
+            results.append((f'{label} allowed (limit {limit})', allowed, 'requests'))
+            results.append((f'{label}', rate, 'checks/s'))
+    finally:
+        throttling._store = original_store
+    return results
+
+
+def _latency_summary(label, latencies, wall):
+    latencies = sorted(latencies)
+    return [
+        (f'{label} throughput', len(latencies) / wall, 'requests/s'),
+        (f'{label} p50', latencies[len(latencies) // 2] * 1000, 'ms'),
+        (f'{label} p99', latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 'ms'),
+    ]
+
+
+@benchmark('asgi', on_disk=True)
+def asgi_benchmark(rows=2000, repeat=1, threads=64, **options):
+    """The read endpoints with `threads` concurrent connections: WSGI threads against one ASGI event loop."""
+    import asyncio
+    from django.contrib.auth.models import Group
+    from django.test import AsyncClient, Client
+    from rest_framework.authtoken.models import Token
+    from LittleLemonAPI.metrics import registry
+    from LittleLemonAPI.roles import DELIVERY_CREW
+
+    seed_menu(categories=10, items=200)
+    customers = seed_users('bench-customer-', 20)
+    crew = seed_users('bench-crew-', 5)
+    Group.objects.create(name=DELIVERY_CREW).user_set.add(*crew)
+    seed_orders(customers, crew, 2000)
+    tokens = [Token.objects.create(user_id=pk).key for pk in customers + crew]
+    menuitems = list(MenuItems.objects.values_list('pk', flat=True))
+    rnd = random.Random(0)
+    plan = [
+        (rnd.choice(tokens), rnd.choice([
+            ('/api/menu-items', {'page': rnd.randint(1, 50)}),
+            (f'/api/menu-items/{rnd.choice(menuitems)}', {}),
+            ('/api/category', {}),
+            ('/api/orders', {}),
+        ]))
+        for _ in range(rows)
+    ]
+
+    def wsgi_connection(requests, latencies):
+        client = Client()
+        try:
+            for token, (path, params) in requests:
+                start = time.perf_counter()
+                client.get(path, params, headers={'Authorization': f'Token {token}'})
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connections['default'].close()
+
+    async def asgi_connection(requests, latencies):
+        client = AsyncClient()
+        for token, (path, params) in requests:
+            start = time.perf_counter()
+            await client.get(path, params, headers={'Authorization': f'Token {token}'})
+            latencies.append(time.perf_counter() - start)
+
+    async def asgi_run(latencies):
+        await asyncio.gather(*(asgi_connection(plan[i::threads], latencies) for i in range(threads)))
+
+    def queries_per_request():
+        # as MetricsMiddleware counted them, in whichever thread ran each query
+        counted = [h for (name, _), h in registry.histograms.items() if name == 'littlelemon_request_db_queries']
+        return sum(h.sum for h in counted) / max(sum(h.count for h in counted), 1)
+
+    results = []
+    with generous_throttles():
+        latencies = []
+        registry.reset()
+        workers = [threading.Thread(target=wsgi_connection, args=(plan[i::threads], latencies)) for i in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        results += _latency_summary(f'WSGI, {threads} threads', latencies, time.perf_counter() - start)
+        results.append((f'WSGI, {threads} threads queries', queries_per_request(), 'per request'))
+
+        latencies = []
+        registry.reset()
+        start = time.perf_counter()
+        asyncio.run(asgi_run(latencies))
+        results += _latency_summary(f'ASGI, {threads} connections', latencies, time.perf_counter() - start)
+        results.append((f'ASGI, {threads} connections queries', queries_per_request(), 'per request'))
+    registry.reset()
+    return results
+
+
+@benchmark('outbox', on_disk=True)
+def outbox_benchmark(rows=400, repeat=1, threads=8, **options):
+    """Checkout latency with slow subscribers run inline or through the outbox, then the worker's drain rate."""
+    from unittest import mock
+    from django.contrib.auth.models import Group
+    from django.utils import timezone
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+    from LittleLemonAPI import checkout as checkout_module
+    from LittleLemonAPI.events import OutboxWorker, subscribe, subscribers, unsubscribe
+    from LittleLemonAPI.models import OutboxEvent
+    from LittleLemonAPI.roles import DELIVERY_CREW
+
+    seed_menu(categories=5, items=50)
+    customer = seed_users('bench-customer-', 1)[0]
+    Group.objects.create(name=DELIVERY_CREW).user_set.add(*seed_users('bench-crew-', 5))
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user_id=customer).key}')
+    menuitem = MenuItems.objects.values_list('pk', flat=True).first()
+
+    # stand-ins for notifications / kitchen tickets: 2ms of I/O each
+    handlers = []
+    for i in range(8):
+        def handler(payload):
+            time.sleep(0.002)
+        handler.__qualname__ = f'handler{i}'
+        handlers.append(handler)
+
+    def inline_emit(name, **payload):
+        for handler in subscribers(name).values():
+            handler(payload)
+
+    def checkouts(count):
+        latencies = []
+        for _ in range(count):
+            client.post('/api/cart', {'menuitem': menuitem, 'quantity': 1}, format='json')
+            start = time.perf_counter()
+            client.post('/api/orders')
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return latencies[len(latencies) // 2] * 1000
+
+    results = []
+    per_case = max(rows // 8, 1)
+    try:
+        with unthrottled():
+            for count in (0, 8):
+                for handler in handlers[:count]:
+                    subscribe('order_created', handler)
+                with mock.patch.object(checkout_module, 'emit', inline_emit):
+                    results.append((f'checkout p50, {count} subscribers inline', checkouts(per_case), 'ms'))
+                results.append((f'checkout p50, {count} subscribers outbox', checkouts(per_case), 'ms'))
+
+        OutboxEvent.objects.all().delete()
+        for pool in (1, threads):
+            OutboxEvent.objects.bulk_create(
+                (OutboxEvent(name='order_created', payload={'order_id': i}, available_at=timezone.now())
+                 for i in range(rows)),
+                batch_size=1000,
+            )
+            start = time.perf_counter()
+            OutboxWorker(batch_size=100, threads=pool).run(once=True)
+            results.append((f'drain, {pool} threads', rows / (time.perf_counter() - start), 'events/s'))
+    finally:
+        for handler in handlers:
+            unsubscribe('order_created', handler)
+    return results
+
+
+@benchmark('reports', on_disk=True)
+def reports_benchmark(rows=100000, repeat=3, threads=8, **options):
+    """A year's report from the daily rollups against aggregating the order tables; backfill and live update rates."""
+    from datetime import timedelta
+    from django.db.models import Count, Q, Sum
+    from django.utils import timezone
+    from LittleLemonAPI.events import OutboxWorker
+    from LittleLemonAPI.models import OrderItem, OutboxEvent
+    from LittleLemonAPI.rollups import backfill, report
+
+    seed_menu(categories=10, items=200)
+    customers = seed_users('bench-customer-', 50)
+    crew = seed_users('bench-crew-', 10)
+    seed_orders(customers, crew, rows)
+    now = timezone.now()
+    orders = list(Order.objects.only('pk'))
+    for i, order in enumerate(orders):
+        order.date = now - timedelta(days=i % 365, minutes=i % 1440)
+    Order.objects.bulk_update(orders, ['date'], batch_size=1000)
+    menuitems = list(MenuItems.objects.values_list('pk', 'price'))
+    OrderItem.objects.bulk_create(
+        (OrderItem(order_id=order.pk, menuitem_id=pk, quantity=2, unit_price=price, price=2 * price)
+         for i, order in enumerate(orders) for pk, price in menuitems[i % 50:i % 50 + 3]),
+        batch_size=1000,
+    )
+    end = timezone.localdate()
+    start = end - timedelta(days=364)
+
+    def scan():
+        placed = Order.objects.filter(date__date__range=(start, end))
+        placed.aggregate(revenue=Sum('total'), orders=Count('pk'), delivered=Count('pk', filter=Q(status__eq=True)))
+        lines = OrderItem.objects.filter(order__date__date__range=(start, end))
+        list(lines.values('menuitem').annotate(quantity=Sum('quantity'), revenue=Sum('price')).order_by('-revenue')[:10])
+        list(lines.values('menuitem__category').annotate(quantity=Sum('quantity'), revenue=Sum('price')))
+        list(placed.filter(status__eq=True).values('delivery_crew').annotate(delivered=Count('pk')))
+
+    results = [('backfill', rows / timed(backfill, 1), 'orders/s')]
+    results.append(('report, scanning orders', 1000 * timed(scan, repeat), 'ms'))
+    results.append(('report, rollups', 1000 * timed(lambda: report(start, end), repeat), 'ms'))
+
+    # live updates: the outbox worker rolling up new orders, which must land where a backfill would
+    for pool in (1, threads):
+        first = Order.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        seed_orders(customers, crew, 1000)
+        fresh = list(Order.objects.filter(pk__gt=first).values_list('pk', flat=True))
+        OrderItem.objects.bulk_create(
+            (OrderItem(order_id=order_id, menuitem_id=pk, quantity=1, unit_price=price, price=price)
+             for order_id in fresh for pk, price in menuitems[:3]),
+            batch_size=1000,
+        )
+        OutboxEvent.objects.bulk_create(
+            (OutboxEvent(name='order_created', payload={'order_id': order_id}, available_at=timezone.now()) for order_id in fresh),
+            batch_size=1000,
+        )
+        elapsed = timed(lambda: OutboxWorker(batch_size=100, threads=pool).run(once=True), 1)
+        results.append((f'live rollup, {pool} threads', len(fresh) / elapsed, 'orders/s'))
+    return results
+
+
+@benchmark('auth')
+def auth_benchmark(rows=5000, repeat=3, **options):
+    """Cached menu reads authenticated by DRF's TokenAuthentication and by CachedTokenAuthentication."""
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonAPI import views
+    from LittleLemonAPI.authentication import CachedTokenAuthentication, get_token_cache
+
+    seed_menu(categories=10, items=200)
+    users = seed_users('bench-user-', 200)
+    Token.objects.bulk_create(Token(user_id=pk, key=Token.generate_key()) for pk in users)
+    keys = list(Token.objects.values_list('key', flat=True))
+    factory = APIRequestFactory()
+    requests = [factory.get('/api/menu-items', HTTP_AUTHORIZATION=f'Token {keys[i % len(keys)]}') for i in range(rows)]
+
+    results = []
+    with unthrottled():
+        for label, authentication in (('TokenAuthentication', TokenAuthentication), ('CachedTokenAuthentication', CachedTokenAuthentication)):
+            view = views.MenuItemsView.as_view(authentication_classes=[authentication])
+            get_token_cache().clear()
+            view(requests[0])
+
+            def run():
+                for request in requests:
+                    view(request)
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                elapsed = timed(run, repeat)
+            results.append((label, rows / elapsed, 'requests/s'))
+            results.append((f'{label} queries', len(queries) / (rows * repeat), 'per request'))
+    return results
+
+
+COLD_START = '''
+import os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.test import Client
+Client().get('/api/menu-items', HTTP_ACCEPT='application/json')
+print((time.perf_counter() - start) * 1000, len(sys.modules))
+'''
+
+
+@benchmark('renderers')
+def renderers_benchmark(rows=10000, repeat=3, **options):
+    """JSON render/parse through DRF's stdlib classes and the orjson ones; worker cold start per API_PROFILE."""
+    import subprocess
+    import sys
+    from io import BytesIO
+    from django.conf import settings
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from LittleLemonAPI.fast_serializers import MenuItemFastSerializer, OrderFastSerializer
+    from LittleLemonAPI.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+    seed_menu(categories=20, items=rows)
+    users = seed_users('bench-user-', max(rows // 5, 1))
+    seed_orders(users, users[:5], rows)
+    payloads = [
+        ('menu-items', MenuItemFastSerializer.serialize(MenuItems.objects.all())),
+        ('orders', OrderFastSerializer.serialize(Order.objects.all())),
+    ]
+    results = [('orjson installed', int(orjson is not None), '')]
+    for name, data in payloads:
+        body = JSONRenderer().render(data)
+        results.append((f'{name} render JSONRenderer', 1000 * timed(lambda: JSONRenderer().render(data), repeat), 'ms'))
+        results.append((f'{name} render FastJSONRenderer', 1000 * timed(lambda: FastJSONRenderer().render(data), repeat), 'ms'))
+        results.append((f'{name} parse JSONParser', 1000 * timed(lambda: JSONParser().parse(BytesIO(body)), repeat), 'ms'))
+        results.append((f'{name} parse FastJSONParser', 1000 * timed(lambda: FastJSONParser().parse(BytesIO(body)), repeat), 'ms'))
+
+    # a fresh interpreter serving its first request, best of `repeat`
+    for profile in ('development', 'production'):
+        env = {**os.environ, 'API_PROFILE': profile, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'LittleLemon.settings')}
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', COLD_START], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+            runs.append([float(value) for value in out.stdout.split()])
+        elapsed, modules = min(runs)
+        results.append((f'cold start, {profile}', elapsed, 'ms'))
+        results.append((f'cold start, {profile} modules', modules, 'modules'))
+    return results
+
+
+@benchmark('idempotency')
+def idempotency_benchmark(rows=2000, repeat=3, **options):
+    """Retried checkouts: a retry without a key re-runs checkout, a retry with one replays the stored response."""
+    from django.contrib.auth.models import Group
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonAPI import views
+    from LittleLemonAPI.roles import DELIVERY_CREW
+
+    seed_menu(categories=5, items=50)
+    customers = seed_users('bench-customer-', 200)
+    Group.objects.create(name=DELIVERY_CREW).user_set.add(*seed_users('bench-crew-', 5))
+    seed_carts(customers)
+    Token.objects.bulk_create(Token(user_id=pk, key=Token.generate_key()) for pk in customers)
+    tokens = dict(Token.objects.values_list('user_id', 'key'))
+    factory = APIRequestFactory()
+    view = views.OrdersView.as_view()
+
+    def post(user_id, key=None):
+        headers = {'HTTP_AUTHORIZATION': f'Token {tokens[user_id]}'}
+        if key is not None:
+            headers['HTTP_IDEMPOTENCY_KEY'] = key
+        response = view(factory.post('/api/orders', **headers))
+        # replays are plain HttpResponses, already rendered
+        return response.render() if hasattr(response, 'render') else response
+
+    results = []
+    with unthrottled():
+        start = time.perf_counter()
+        for user_id in customers:
+            post(user_id, key=f'checkout-{user_id}')
+        results.append(('first checkout', len(customers) / (time.perf_counter() - start), 'requests/s'))
+        for label, key in (('retry without key (Cart is empty)', None), ('retry with key (replayed)', 'checkout')):
+            retries = [(customers[i % len(customers)], key and f'{key}-{customers[i % len(customers)]}') for i in range(rows)]
+
+            def run():
+                for user_id, retry_key in retries:
+                    post(user_id, retry_key)
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                elapsed = timed(run, repeat)
+            results.append((label, rows / elapsed, 'requests/s'))
+            results.append((f'{label} queries', len(queries) / (rows * repeat), 'per request'))
+    results.append(('orders placed', Order.objects.count(), ''))
+    return results
+
+
+@benchmark('crewqueue')
+def crewqueue_benchmark(rows=20000, repeat=3, **options):
+    """A crew member's order list and delivered updates: /api/orders + one PATCH per order vs /api/orders/queue."""
+    from django.contrib.auth.models import Group
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonAPI import views
+    from LittleLemonAPI.roles import DELIVERY_CREW
+
+    seed_menu(categories=5, items=50)
+    customers = seed_users('bench-customer-', 200)
+    crew = seed_users('bench-crew-', 5)
+    Group.objects.create(name=DELIVERY_CREW).user_set.add(*crew)
+    seed_orders(customers, crew, rows)
+    menuitems = list(MenuItems.objects.values_list('pk', 'price')[:3])
+    OrderItem.objects.bulk_create(
+        (OrderItem(order_id=pk, menuitem_id=menuitem_id, quantity=1, unit_price=price, price=price)
+         for pk in Order.objects.values_list('pk', flat=True) for menuitem_id, price in menuitems),
+        batch_size=1000,
+    )
+    crew_id = crew[0]
+    headers = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user_id=crew_id).key}'}
+    factory = APIRequestFactory()
+    pending = list(Order.objects.filter(delivery_crew_id=crew_id, status__eq=False).order_by('date', 'id').values_list('pk', flat=True))
+    batch = pending[:50]
+
+    def run_view(view, request, **kwargs):
+        response = view(request, **kwargs)
+        response.render()
+        if response.status_code != 200:
+            raise AssertionError(response.content)
+        return response
+
+    list_view, detail_view, queue_view = views.OrdersView.as_view(), views.OrderItemView.as_view(), views.CrewQueueView.as_view()
+    reads = [
+        ('GET /api/orders (every order ever assigned)', lambda: run_view(list_view, factory.get('/api/orders', **headers))),
+        ('GET /api/orders/queue (first page, with lines)', lambda: run_view(queue_view, factory.get('/api/orders/queue', **headers))),
+    ]
+
+    def patch_each(status):
+        for pk in batch:
+            run_view(detail_view, factory.patch(f'/api/orders/{pk}', {'status': status}, format='json', **headers), pk=pk)
+
+    def post_batch(status):
+        run_view(queue_view, factory.post('/api/orders/queue', {'orders': batch, 'status': status}, format='json', **headers))
+    writes = [
+        (f'PATCH /api/orders/<id> x {len(batch)}', patch_each),
+        (f'POST /api/orders/queue with {len(batch)} orders', post_batch),
+    ]
+
+    results = [('pending orders of the crew member', len(pending), '')]
+    with unthrottled():
+        for label, run in reads:
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                elapsed = timed(run, repeat)
+            results.append((label, 1000 * elapsed, 'ms'))
+            results.append((f'{label} queries', len(queries) / repeat, ''))
+        for label, run in writes:
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                # deliver the batch, then put it back, so every round starts from the same state
+                elapsed = timed(lambda: (run(True), run(False)), repeat) / 2
+            results.append((label, 1000 * elapsed, 'ms'))
+            results.append((f'{label} queries', len(queries) / (2 * repeat), ''))
+    return results
+
+
+@benchmark('orderdetail')
+def orderdetail_benchmark(rows=20000, repeat=3, **options):
+    """Order detail and ?expand=items pages: lines loaded per order vs prefetched with views.with_items()."""
+    from django.contrib.auth.models import Group
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIRequestFactory
+    from LittleLemonAPI import views
+    from LittleLemonAPI.roles import MANAGER
+    from LittleLemonAPI.serializers import OrderDetailSerializer
+
+    seed_menu(categories=5, items=50)
+    customers = seed_users('bench-customer-', 200)
+    seed_orders(customers, [], rows)
+    menuitems = list(MenuItems.objects.values_list('pk', 'price')[:3])
+    OrderItem.objects.bulk_create(
+        (OrderItem(order_id=pk, menuitem_id=menuitem_id, quantity=1, unit_price=price, price=price)
+         for pk in Order.objects.values_list('pk', flat=True) for menuitem_id, price in menuitems),
+        batch_size=1000,
+    )
+    manager = seed_users('bench-manager-', 1)[0]
+    Group.objects.create(name=MANAGER).user_set.add(manager)
+    order = Order.objects.filter(user_id=customers[0]).first()
+    factory = APIRequestFactory()
+    tokens = {user_id: Token.objects.create(user_id=user_id).key for user_id in (customers[0], manager)}
+    page = list(Order.objects.order_by('-date', '-id')[:50])
+
+    def serialize_page(orders):
+        return OrderDetailSerializer(orders, many=True).data
+
+    def request(view, path, user_id, **kwargs):
+        response = view(factory.get(path, HTTP_AUTHORIZATION=f'Token {tokens[user_id]}'), **kwargs)
+        response.render()
+        if response.status_code != 200:
+            raise AssertionError(response.content)
+
+    cases = [
+        ('50 orders, lines per order', lambda: serialize_page(Order.objects.filter(pk__in=[o.pk for o in page]))),
+        ('50 orders, with_items()', lambda: serialize_page(views.with_items(Order.objects.filter(pk__in=[o.pk for o in page])))),
+        ('GET /api/orders/<id>', lambda: request(views.OrderItemView.as_view(), f'/api/orders/{order.pk}', customers[0], pk=order.pk)),
+        ('GET /api/orders?perpage=50', lambda: request(views.OrdersView.as_view(), '/api/orders?perpage=50', manager)),
+        ('GET /api/orders?perpage=50&expand=items', lambda: request(views.OrdersView.as_view(), '/api/orders?perpage=50&expand=items', manager)),
+    ]
+    results = []
+    with unthrottled():
+        for label, run in cases:
+            run()
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                elapsed = timed(run, repeat)
+            results.append((label, 1000 * elapsed, 'ms'))
+            results.append((f'{label} queries', len(queries) / repeat, ''))
+    return results
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from collections import namedtuple
+from django.contrib.auth.models import Group
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from LittleLemonAPI.models import Category, MenuItems, Order
+from LittleLemonAPI.roles import DELIVERY_CREW, MANAGER
+from .benchmarks import seed_carts, seed_menu, seed_orders, seed_users
+
+Scenario = namedtuple('Scenario', 'name weight role method build')
+
+# each build(dataset, rnd) returns (path, data)
+SCENARIOS = [
+    Scenario('menu-items', 35, 'customer', 'GET',
+             lambda d, r: ('/api/menu-items', {'page': r.randint(1, d['menu_pages'])})),
+    Scenario('menu-items-search', 8, 'customer', 'GET',
+             lambda d, r: ('/api/menu-items', {'search': f'item {r.randint(1, 99)}'})),
+    Scenario('menu-items-filter', 5, 'customer', 'GET',
+             lambda d, r: ('/api/menu-items', {'price__lt': r.randint(5, 50), 'featured': 'true'})),
+    Scenario('menu-item', 12, 'customer', 'GET',
+             lambda d, r: (f'/api/menu-items/{r.choice(d["menuitems"])}', None)),
+    Scenario('category', 8, 'customer', 'GET',
+             lambda d, r: ('/api/category', None)),
+    Scenario('cart', 8, 'customer', 'GET',
+             lambda d, r: ('/api/cart', None)),
+    Scenario('cart-summary', 4, 'customer', 'GET',
+             lambda d, r: ('/api/cart/summary', None)),
+    Scenario('cart-add', 8, 'customer', 'POST',
+             lambda d, r: ('/api/cart', {'menuitem': r.choice(d['menuitems']), 'quantity': r.randint(1, 3)})),
+    Scenario('cart-batch', 2, 'customer', 'POST',
+             lambda d, r: ('/api/cart', [{'menuitem': pk, 'quantity': r.randint(1, 3)}
+                                         for pk in r.sample(d['menuitems'], 5)])),
+    Scenario('orders', 6, 'customer', 'GET',
+             lambda d, r: ('/api/orders', None)),
+    Scenario('orders-crew', 3, 'crew', 'GET',
+             lambda d, r: ('/api/orders', None)),
+    Scenario('orders-manager', 3, 'manager', 'GET',
+             lambda d, r: ('/api/orders', {'page': r.randint(1, d['order_pages'])})),
+    Scenario('checkout', 2, 'customer', 'POST',
+             lambda d, r: ('/api/orders', None)),
+    Scenario('order-status', 2, 'crew', 'PATCH',
+             lambda d, r: (f'/api/orders/{r.choice(d["orders"])}', {'status': 1})),
+]
+
+
+def seed_dataset(categories=10, items=200, customers=50, managers=2, crew=5, cart_lines=3, orders=1000):
+    seed_menu(categories=categories, items=items)
+    manager_group = Group.objects.create(name=MANAGER)
+    crew_group = Group.objects.create(name=DELIVERY_CREW)
+    users = {
+        'customer': seed_users('load-customer-', customers),
+        'manager': seed_users('load-manager-', managers),
+        'crew': seed_users('load-crew-', crew),
+    }
+    manager_group.user_set.add(*users['manager'])
+    crew_group.user_set.add(*users['crew'])
+    Token.objects.bulk_create(
+        Token(user_id=pk, key=Token.generate_key()) for ids in users.values() for pk in ids
+    )
+    seed_carts(users['customer'], lines=cart_lines)
+    seed_orders(users['customer'], users['crew'], orders)
+
+    tokens = dict(Token.objects.values_list('user_id', 'key'))
+    page_size = 4
+    return {
+        'tokens': {role: [tokens[pk] for pk in ids] for role, ids in users.items()},
+        'menuitems': list(MenuItems.objects.values_list('pk', flat=True)),
+        'categories': list(Category.objects.values_list('pk', flat=True)),
+        'orders': list(Order.objects.values_list('pk', flat=True)),
+        'menu_pages': max(items // page_size, 1),
+        'order_pages': max(orders // page_size, 1),
+    }
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _worker(dataset, plan, samples, lock):
+    client = APIClient(raise_request_exception=False)
+    counter = QueryCounter()
+    rnd = random.Random(id(plan))
+    local = []
+    try:
+        with connection.execute_wrapper(counter):
+            for scenario in plan:
+                path, data = scenario.build(dataset, rnd)
+                token = rnd.choice(dataset['tokens'][scenario.role])
+                request = getattr(client, scenario.method.lower())
+                counter.count = 0
+                start = time.perf_counter()
+                if scenario.method == 'GET':
+                    response = request(path, data, HTTP_AUTHORIZATION=f'Token {token}')
+                else:
+                    response = request(path, data, format='json', HTTP_AUTHORIZATION=f'Token {token}')
+                elapsed = time.perf_counter() - start
+                local.append((scenario.name, elapsed, counter.count, response.status_code >= 500))
+    finally:
+        connection.close()
+    with lock:
+        samples.extend(local)
+
+
+def run_load(dataset, requests=2000, threads=4, weights=None, seed=0):
+    scenarios = [s._replace(weight=weights.get(s.name, 0)) for s in SCENARIOS] if weights else SCENARIOS
+    scenarios = [s for s in scenarios if s.weight > 0]
+    rnd = random.Random(seed)
+    plan = rnd.choices(scenarios, weights=[s.weight for s in scenarios], k=requests)
+    samples, lock = [], threading.Lock()
+    workers = [
+        threading.Thread(target=_worker, args=(dataset, plan[i::threads], samples, lock))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - start
+    return summarize(samples, wall)
+
+
+def summarize(samples, wall):
+    by_name = {}
+    for name, elapsed, queries, error in samples:
+        by_name.setdefault(name, []).append((elapsed, queries, error))
+    by_name['total'] = [(elapsed, queries, error) for _, elapsed, queries, error in samples]
+
+    report = {}
+    for name, rows in sorted(by_name.items()):
+        latencies = sorted(elapsed * 1000 for elapsed, _, _ in rows)
+        report[name] = {
+            'requests': len(rows),
+            'errors': sum(error for _, _, error in rows),
+            'p50_ms': round(_percentile(latencies, 0.50), 3),
+            'p95_ms': round(_percentile(latencies, 0.95), 3),
+            'p99_ms': round(_percentile(latencies, 0.99), 3),
+            'requests_per_s': round(len(rows) / wall, 1),
+            'queries_per_request': round(sum(queries for _, queries, _ in rows) / len(rows), 2),
+        }
+    return report